@@ -0,0 +1,385 @@
+"""
+Agendador das chamadas à Claude API
+Fica entre o analisador e client.messages.create:
+- baldes de fichas para requisições/min e tokens de entrada/min (limites da conta)
+- fila por prioridade: análises interativas passam à frente do lote e da linha de comando
+- novas tentativas com espera exponencial e variação aleatória, respeitando retry-after;
+  um 429/529 pausa todas as chamadas do processo pelo tempo pedido pela API
+- falha definitiva vira ErroAPI (em vez de uma NotaFiscal vazia)
+
+Os limites são por processo: com vários workers do gunicorn, divida os limites da
+conta entre eles (NF_API_RPM / NF_API_TPM).
+"""
+
+import os
+import json
+import time
+import heapq
+import sys
+import random
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import metricas
+
+# Configuração padrão (pode ser sobrescrita pelo .env); valores do tier 1 da Anthropic
+API_RPM_PADRAO = 50
+API_TPM_PADRAO = 40000
+API_TENTATIVAS_PADRAO = 4
+API_ESPERA_BASE_PADRAO = 1.0
+API_ESPERA_MAX_PADRAO = 120.0
+
+# Prioridades (menor passa à frente)
+PRIORIDADE_INTERATIVA = 0
+PRIORIDADE_LOTE = 10
+
+# Estimativa de tokens de entrada antes da chamada; corrigida pelo usage da resposta
+CARACTERES_POR_TOKEN = 4
+TOKENS_POR_IMAGEM = 1600
+TOKENS_POR_DOCUMENTO = 3000
+
+# Status em que vale tentar de novo (529 = API sobrecarregada)
+STATUS_TRANSITORIOS = (408, 409, 429, 500, 502, 503, 504, 529)
+STATUS_LIMITE = (429, 529)
+
+_prioridade: contextvars.ContextVar[int] = contextvars.ContextVar('nf_prioridade', default=PRIORIDADE_INTERATIVA)
+
+
+class ErroAPI(Exception):
+    """Chamada à Claude API que falhou (após as novas tentativas, se transitória)"""
+
+    def __init__(self, mensagem: str, status: Optional[int] = None, tentativas: int = 1,
+                 temporario: bool = False, retry_after: Optional[float] = None):
+        super().__init__(mensagem)
+        self.status = status
+        self.tentativas = tentativas
+        self.temporario = temporario
+        self.retry_after = retry_after
+
+
+class LimiteTaxaExcedido(ErroAPI):
+    """429/529 persistente, ou espera na fila do agendador além de espera_maxima"""
+
+
+@contextmanager
+def prioridade(valor: int):
+    """Prioridade das chamadas feitas dentro do bloco (inclusive em threads e no loop assíncrono)"""
+    token = _prioridade.set(valor)
+    try:
+        yield
+    finally:
+        _prioridade.reset(token)
+
+
+def estimar_tokens(parametros: Dict[str, Any]) -> int:
+    """Tokens de entrada aproximados dos parâmetros de messages.create (sistema e ferramentas inclusos)"""
+    sistema = parametros.get('system') or ''
+    total = sum(len(bloco.get('text', '')) for bloco in sistema) if isinstance(sistema, list) else len(sistema)
+    total += sum(len(json.dumps(ferramenta)) for ferramenta in parametros.get('tools') or ())
+    total //= CARACTERES_POR_TOKEN
+    for mensagem in parametros.get('messages', []):
+        conteudo = mensagem.get('content')
+        if isinstance(conteudo, str):
+            total += len(conteudo) // CARACTERES_POR_TOKEN
+            continue
+        for bloco in conteudo or []:
+            tipo = bloco.get('type')
+            if tipo == 'text':
+                total += len(bloco.get('text', '')) // CARACTERES_POR_TOKEN
+            elif tipo == 'image':
+                total += TOKENS_POR_IMAGEM
+            elif tipo == 'document':
+                total += TOKENS_POR_DOCUMENTO
+    return max(total, 1)
+
+
+def _tokens_da_resposta(resposta: Any) -> Optional[int]:
+    uso = getattr(resposta, 'usage', None)
+    return getattr(uso, 'input_tokens', None) if uso is not None else None
+
+
+def _erros_conexao() -> tuple:
+    """Erros de rede do SDK; sem importar o anthropic (se ainda não foi importado, o erro não veio dele)"""
+    erro = getattr(sys.modules.get('anthropic'), 'APIConnectionError', None)
+    return (erro,) if erro is not None else ()
+
+
+def _retry_after(erro: Exception) -> Optional[float]:
+    """Segundos pedidos pela API (retry-after-ms ou retry-after) no erro, se houver"""
+    resposta = getattr(erro, 'response', None)
+    cabecalhos = getattr(resposta, 'headers', None)
+    if not cabecalhos:
+        return None
+    try:
+        if cabecalhos.get('retry-after-ms'):
+            return float(cabecalhos['retry-after-ms']) / 1000
+        if cabecalhos.get('retry-after'):
+            return float(cabecalhos['retry-after'])
+    except ValueError:
+        # retry-after em formato de data: usa a espera exponencial
+        return None
+    return None
+
+
+class BaldeFichas:
+    """Balde de fichas: até `por_minuto` de rajada, reposto continuamente (0 = sem limite)"""
+
+    def __init__(self, por_minuto: float):
+        self.capacidade = float(por_minuto)
+        self.fichas = self.capacidade
+        self._por_segundo = self.capacidade / 60.0
+        self._atualizado = time.monotonic()
+
+    def _repor(self, agora: float):
+        self.fichas = min(self.capacidade, self.fichas + (agora - self._atualizado) * self._por_segundo)
+        self._atualizado = agora
+
+    def espera(self, quantidade: float, agora: float) -> float:
+        """Segundos até haver `quantidade` fichas (pedidos maiores que o balde esperam o balde cheio)"""
+        if not self.capacidade:
+            return 0.0
+        self._repor(agora)
+        falta = min(quantidade, self.capacidade) - self.fichas
+        return falta / self._por_segundo if falta > 0 else 0.0
+
+    def consumir(self, quantidade: float):
+        if self.capacidade:
+            self.fichas -= quantidade
+
+
+@dataclass(order=True)
+class _Pedido:
+    prioridade: int
+    ordem: int
+    custo: int = field(compare=False)
+    acordar: Optional[Callable[[], None]] = field(compare=False, default=None)
+
+
+class Agendador:
+    """
+    Controla o ritmo e as novas tentativas das chamadas à API de um processo
+    Um único agendador deve atender todos os analisadores da mesma conta (obter_agendador)
+    """
+
+    def __init__(self, rpm: float = API_RPM_PADRAO, tpm: float = API_TPM_PADRAO,
+                 tentativas: int = API_TENTATIVAS_PADRAO, espera_base: float = API_ESPERA_BASE_PADRAO,
+                 espera_maxima: float = API_ESPERA_MAX_PADRAO):
+        """
+        rpm / tpm: requisições e tokens de entrada por minuto (0 = sem limite)
+        tentativas: total de tentativas por chamada com erro transitório
+        espera_base: primeira espera entre tentativas (dobra a cada nova tentativa)
+        espera_maxima: tempo máximo na fila antes de desistir com LimiteTaxaExcedido
+        """
+        self._requisicoes = BaldeFichas(rpm)
+        self._tokens = BaldeFichas(tpm)
+        self.tentativas = max(1, tentativas)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._fila: List[_Pedido] = []
+        self._ordem = itertools.count()
+        self._pausa_ate = 0.0
+        self._condicao = threading.Condition()
+
+    # Fila
+
+    def _entrar(self, custo: int, acordar: Optional[Callable[[], None]] = None) -> _Pedido:
+        pedido = _Pedido(_prioridade.get(), next(self._ordem), custo, acordar)
+        with self._condicao:
+            heapq.heappush(self._fila, pedido)
+        return pedido
+
+    def _sair(self, pedido: _Pedido):
+        """Remove o pedido desistente (erro, cancelamento) e avisa o próximo da fila"""
+        with self._condicao:
+            if pedido in self._fila:
+                self._fila.remove(pedido)
+                heapq.heapify(self._fila)
+            self._avisar_proximo()
+
+    def _avisar_proximo(self):
+        self._condicao.notify_all()
+        if self._fila and self._fila[0].acordar is not None:
+            self._fila[0].acordar()
+
+    def _tentar(self, pedido: _Pedido) -> Optional[float]:
+        """
+        Com _condicao adquirida: 0 se o pedido foi liberado; senão segundos até tentar de novo
+        (None = aguardar aviso, o pedido não é o primeiro da fila)
+        """
+        if self._fila[0] is not pedido:
+            return None
+        agora = time.monotonic()
+        espera = max(self._pausa_ate - agora,
+                     self._requisicoes.espera(1, agora),
+                     self._tokens.espera(pedido.custo, agora))
+        if espera > 0:
+            return espera
+        self._requisicoes.consumir(1)
+        self._tokens.consumir(pedido.custo)
+        heapq.heappop(self._fila)
+        self._avisar_proximo()
+        return 0.0
+
+    def _desistir(self, pedido: _Pedido):
+        self._sair(pedido)
+        raise LimiteTaxaExcedido(
+            f"Limite de chamadas à API: mais de {self.espera_maxima:g}s aguardando na fila",
+            temporario=True, retry_after=self.espera_base,
+        )
+
+    def _aguardar_vez(self, custo: int):
+        inicio = time.monotonic()
+        pedido = self._entrar(custo)
+        try:
+            with self._condicao:
+                while True:
+                    espera = self._tentar(pedido)
+                    if espera == 0:
+                        break
+                    restante = self.espera_maxima - (time.monotonic() - inicio)
+                    if restante <= 0:
+                        raise TimeoutError
+                    self._condicao.wait(restante if espera is None else min(espera, restante))
+        except TimeoutError:
+            self._desistir(pedido)
+        except BaseException:
+            self._sair(pedido)
+            raise
+        self._registrar_espera(pedido, inicio)
+
+    async def _aguardar_vez_async(self, custo: int):
+        """Como _aguardar_vez, sem bloquear o event loop"""
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        aviso = asyncio.Event()
+        pedido = self._entrar(custo, acordar=lambda: loop.call_soon_threadsafe(aviso.set))
+        try:
+            while True:
+                aviso.clear()
+                with self._condicao:
+                    espera = self._tentar(pedido)
+                if espera == 0:
+                    break
+                restante = self.espera_maxima - (time.monotonic() - inicio)
+                if restante <= 0:
+                    raise TimeoutError
+                try:
+                    await asyncio.wait_for(aviso.wait(), restante if espera is None else min(espera, restante))
+                except asyncio.TimeoutError:
+                    pass
+        except TimeoutError:
+            self._desistir(pedido)
+        except BaseException:
+            self._sair(pedido)
+            raise
+        self._registrar_espera(pedido, inicio)
+
+    @staticmethod
+    def _registrar_espera(pedido: _Pedido, inicio: float):
+        segundos = time.monotonic() - inicio
+        metricas.AGENDADOR_ESPERA.observar(segundos, prioridade=pedido.prioridade)
+        metricas.somar('espera_agendador_ms', segundos * 1000)
+
+    # Resultado de cada tentativa
+
+    def _ajustar_tokens(self, estimado: int, resposta: Any):
+        """Corrige o balde de tokens com o usage real (a diferença pode deixá-lo negativo)"""
+        real = _tokens_da_resposta(resposta)
+        if real is not None:
+            with self._condicao:
+                self._tokens.consumir(real - estimado)
+
+    def _espera_apos_erro(self, erro: Exception, tentativa: int) -> Optional[float]:
+        """Segundos antes da próxima tentativa, ou None se o erro não é transitório"""
+        status = getattr(erro, 'status_code', None)
+        if status not in STATUS_TRANSITORIOS and not isinstance(erro, _erros_conexao()):
+            return None
+        espera = _retry_after(erro)
+        if espera is None:
+            # Exponencial com metade aleatória: clientes que erraram juntos não voltam juntos
+            espera = self.espera_base * 2 ** (tentativa - 1)
+            espera = espera / 2 + random.uniform(0, espera / 2)
+        if status in STATUS_LIMITE:
+            # A conta está no limite: segura todas as chamadas do processo, não só esta
+            with self._condicao:
+                self._pausa_ate = max(self._pausa_ate, time.monotonic() + espera)
+        metricas.API_NOVAS_TENTATIVAS.inc(status=status or 'conexao')
+        return espera
+
+    def _erro_final(self, erro: Exception, tentativa: int) -> ErroAPI:
+        status = getattr(erro, 'status_code', None)
+        transitorio = status in STATUS_TRANSITORIOS or isinstance(erro, _erros_conexao())
+        classe = LimiteTaxaExcedido if status in STATUS_LIMITE else ErroAPI
+        return classe(f"{erro} (após {tentativa} tentativa(s))" if tentativa > 1 else str(erro),
+                      status=status, tentativas=tentativa, temporario=transitorio,
+                      retry_after=_retry_after(erro))
+
+    def executar(self, chamada: Callable[[], Any], custo: int = 1) -> Any:
+        """
+        Executa chamada() quando houver vez na fila e nos limites, com novas tentativas
+        custo: tokens de entrada estimados (estimar_tokens); levanta ErroAPI na falha definitiva
+        """
+        for tentativa in range(1, self.tentativas + 1):
+            self._aguardar_vez(custo)
+            try:
+                resposta = chamada()
+            except Exception as e:
+                espera = self._espera_apos_erro(e, tentativa) if tentativa < self.tentativas else None
+                if espera is None:
+                    raise self._erro_final(e, tentativa) from e
+                time.sleep(espera)
+                continue
+            self._ajustar_tokens(custo, resposta)
+            return resposta
+
+    async def executar_async(self, chamada: Callable[[], Awaitable[Any]], custo: int = 1) -> Any:
+        """Versão assíncrona de executar (chamada() devolve uma corrotina)"""
+        for tentativa in range(1, self.tentativas + 1):
+            await self._aguardar_vez_async(custo)
+            try:
+                resposta = await chamada()
+            except Exception as e:
+                espera = self._espera_apos_erro(e, tentativa) if tentativa < self.tentativas else None
+                if espera is None:
+                    raise self._erro_final(e, tentativa) from e
+                await asyncio.sleep(espera)
+                continue
+            self._ajustar_tokens(custo, resposta)
+            return resposta
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._condicao:
+            agora = time.monotonic()
+            return {
+                'na_fila': len(self._fila),
+                'requisicoes_disponiveis': round(self._requisicoes.fichas, 1) if self._requisicoes.capacidade else None,
+                'tokens_disponiveis': round(self._tokens.fichas) if self._tokens.capacidade else None,
+                'pausa_segundos': round(max(0.0, self._pausa_ate - agora), 1),
+            }
+
+
+# Instância compartilhada pelo processo
+_agendador_padrao: Optional[Agendador] = None
+_agendador_padrao_lock = threading.Lock()
+
+
+def obter_agendador() -> Agendador:
+    """
+    Agendador compartilhado pelo processo, configurado pelo ambiente:
+    NF_API_RPM, NF_API_TPM (0 = sem limite), NF_API_TENTATIVAS, NF_API_ESPERA_MAX
+    """
+    global _agendador_padrao
+    with _agendador_padrao_lock:
+        if _agendador_padrao is None:
+            _agendador_padrao = Agendador(
+                rpm=float(os.getenv('NF_API_RPM', API_RPM_PADRAO)),
+                tpm=float(os.getenv('NF_API_TPM', API_TPM_PADRAO)),
+                tentativas=int(os.getenv('NF_API_TENTATIVAS', API_TENTATIVAS_PADRAO)),
+                espera_maxima=float(os.getenv('NF_API_ESPERA_MAX', API_ESPERA_MAX_PADRAO)),
+            )
+        return _agendador_padrao
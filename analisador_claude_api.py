@@ -6,21 +6,192 @@ Sistema que usa a inteligência do Claude para analisar PDFs com 100% de precis
 import os
 import base64
 import json
-from typing import Dict, Optional, List, Any
-from dataclasses import dataclass, field
+import asyncio
+import functools
+import threading
+import importlib.util
+import contextvars
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Dict, Optional, List, Any, Union
+from dataclasses import dataclass, field, fields
 from decimal import Decimal
-from pathlib import Path
-from PIL import Image
-import io
 
-# Import anthropic no topo para evitar erros de referência
-try:
-    import anthropic
-    ANTHROPIC_AVAILABLE = True
-except ImportError:
-    ANTHROPIC_AVAILABLE = False
+# anthropic (e httpx) só são importados ao criar o primeiro cliente: importar este módulo
+# fica leve para o início do gunicorn e do serverless-wsgi (ver analisadores.py)
+ANTHROPIC_AVAILABLE = importlib.util.find_spec('anthropic') is not None
+if not ANTHROPIC_AVAILABLE:
     print("⚠️ Módulo anthropic não instalado. Instale com: pip install anthropic")
 
+import metricas
+from agendador import Agendador, ErroAPI, estimar_tokens, obter_agendador
+from armazem_notas import ArmazemNotas, obter_armazem
+from cache_resultados import CacheResultados, chave_do_digest, obter_cache_padrao
+from extrator_texto import CONFIANCA_MINIMA_PADRAO, extrair_campos, extrair_texto_pdf
+from documento_pdf import DocumentoPDF, EntradaPDF, usar_documento
+from lotes_api import LOTE_API_INTERVALO_PADRAO, EnvioLotes, aguardar_lotes, resultados_lotes
+from renderizador import Renderizador, contar_paginas, obter_renderizador
+
+# Modelo usado na extração
+MODELO_CLAUDE = "claude-3-5-sonnet-20241022"
+
+# Modos de extração:
+# - auto: lê a camada de texto (layouts conhecidos) e só chama o Claude se a confiança for baixa
+# - texto: apenas camada de texto, nunca chama a API
+# - claude: sempre chama a API
+MODOS_EXTRACAO = ('auto', 'texto', 'claude')
+
+# Formas de enviar a nota ao modelo:
+# - imagem: PNG da primeira página a 200 DPI (comportamento original, maior payload)
+# - imagem_compacta: tons de cinza com DPI reduzido (JPEG ou PNG, o menor) e qualidade configurável
+# - pdf: o próprio PDF como bloco "document" (sem renderização)
+# - texto: apenas o texto extraído do PDF (menor payload; PDFs escaneados usam imagem_compacta)
+ESTRATEGIAS_ENTRADA = ('imagem', 'imagem_compacta', 'pdf', 'texto')
+DPI_IMAGEM_COMPACTA_PADRAO = 110
+QUALIDADE_JPEG_PADRAO = 70
+
+# Pool HTTP do cliente Anthropic (compartilhado por todas as requisições do processo)
+HTTP_MAX_CONEXOES_PADRAO = 20
+HTTP_MAX_KEEPALIVE_PADRAO = 10
+HTTP_KEEPALIVE_EXPIRY_PADRAO = 60.0
+HTTP_TIMEOUT_PADRAO = 120.0
+HTTP_TIMEOUT_CONEXAO_PADRAO = 10.0
+
+# Documentos com várias páginas: páginas analisadas ao mesmo tempo e limite por documento
+PAGINAS_CONCORRENCIA_PADRAO = 4
+MAX_PAGINAS_PADRAO = 30
+
+# Incrementar sempre que o prompt ou o formato da resposta mudar: invalida o cache
+VERSAO_PROMPT = "3"
+
+# Instruções fixas, enviadas como bloco de sistema com cache_control: a partir da segunda
+# chamada em até 5 minutos o prefixo (ferramenta + sistema) é lido do cache de prompt da API
+PROMPT_SISTEMA = """Você extrai dados de notas fiscais de serviço eletrônicas brasileiras (NFS-e) e registra o resultado chamando a ferramenta indicada, sem texto fora da chamada.
+
+Regras gerais:
+- Valores monetários como números decimais com ponto (1234.56): converta "1.234,56" para 1234.56
+- Datas no formato DD/MM/AAAA
+- Se um campo não existir na nota, use null; nunca invente valores
+- Copie números, códigos e CNPJs exatamente como impressos (com pontuação)
+
+Identificação:
+- "numero" é o número da NFS-e (não o número do RPS, do recibo ou do lote)
+- "data_emissao" é a data de emissão da NFS-e; "vencimento" só se a nota trouxer data de vencimento ou de pagamento
+- "codigo_verificacao" é o código de verificação/autenticidade impresso para consulta da nota no site da prefeitura
+- Prestador é quem emite a nota e presta o serviço; tomador é o cliente. Use a razão social, não o nome fantasia, quando ambos aparecerem
+- CNPJ no formato 00.000.000/0000-00; se houver CPF no lugar do CNPJ, use o CPF
+
+Local:
+- "municipio" é o município da prefeitura que emitiu a NFS-e (cabeçalho da nota)
+- O estado deve ser um dos 27 estados brasileiros por extenso (São Paulo, Rio de Janeiro, Minas Gerais, etc) ou sigla (SP, RJ, MG, etc)
+- Se não conseguir identificar o estado, tente inferir pelo município ou use null
+
+Valores:
+- "valor_servicos" é o valor bruto dos serviços; "valor_total" é o valor total da nota (igual ao valor dos serviços quando a nota não mostrar outro total). Não use o valor líquido em nenhum dos dois
+- ISS: "valor" é o ISS devido/apurado, "aliquota" em percentual (5.0 para 5%), "base_calculo" a base de cálculo do ISS
+- Para retenções, sempre verifique PIS, COFINS, CSLL, IRRF, INSS e ISS: preencha só os valores efetivamente retidos na fonte (quadro de retenções ou deduções do valor líquido); imposto apenas informado, sem retenção, fica null
+- "iss_retido" é o ISS retido pelo tomador; quando a nota indicar "ISS retido: sim" sem valor separado, use o valor do ISS
+- Notas com serviço não tributado, isento ou imune: ISS com valor 0 ou null, conforme impresso"""
+
+# Acrescentado ao sistema quando os campos de texto livre não são pedidos
+PROMPT_SEM_TEXTO_LIVRE = """
+
+Não transcreva a discriminação dos serviços nem outros textos livres: registre apenas os campos da ferramenta."""
+
+# Pedido de cada chamada (o conteúdo da nota vem logo depois)
+PROMPT_EXTRACAO = "Extraia TODOS os dados desta nota fiscal (NFS-e)."
+
+# Acrescentado ao pedido quando cada página de um documento é enviada separadamente
+PROMPT_PAGINA = """
+
+ATENÇÃO: este conteúdo é a página {pagina} de {total} de um documento que pode conter uma ou mais notas fiscais.
+Extraia apenas o que aparece nesta página; campos que não estiverem nela devem ser null
+(inclusive "numero", se a página for continuação de uma nota sem repetir o número)."""
+
+# Acrescentado ao pedido quando o PDF inteiro (estratégia pdf) tem várias páginas
+PROMPT_DOCUMENTO = """
+
+ATENÇÃO: o documento pode conter mais de uma nota fiscal. Registre uma nota para cada uma, na ordem em que aparecem, com as páginas (a partir de 1) que ela ocupa."""
+
+# Resposta estruturada: a ferramenta recebe o JSON que nota_de_resposta converte em NotaFiscal
+FERRAMENTA_NOTA = "registrar_nota_fiscal"
+FERRAMENTA_NOTAS = "registrar_notas_fiscais"
+_TEXTO = {"type": ["string", "null"]}
+_VALOR = {"type": ["number", "null"]}
+ESQUEMA_NOTA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "numero": {"type": ["string", "null"], "description": "número da NFS-e"},
+        "data_emissao": {"type": ["string", "null"], "description": "DD/MM/AAAA"},
+        "vencimento": {"type": ["string", "null"], "description": "DD/MM/AAAA"},
+        "codigo_verificacao": _TEXTO,
+        "prestador": {"type": "object", "properties": {"nome": _TEXTO, "cnpj": _TEXTO}},
+        "tomador": {"type": "object", "properties": {"nome": _TEXTO, "cnpj": _TEXTO}},
+        "municipio": _TEXTO,
+        "estado": {"type": ["string", "null"], "description": "por extenso ou sigla"},
+        "valor_total": _VALOR,
+        "valor_servicos": _VALOR,
+        "discriminacao": {"type": ["string", "null"], "description": "descrição dos serviços"},
+        "impostos": {
+            "type": "object",
+            "properties": {
+                "iss": {"type": "object",
+                        "properties": {"valor": _VALOR, "aliquota": _VALOR, "base_calculo": _VALOR}},
+                "retencoes": {"type": "object",
+                              "properties": {imposto: _VALOR for imposto in
+                                             ('pis', 'cofins', 'csll', 'irrf', 'inss', 'iss_retido')}},
+            },
+        },
+    },
+    "required": ["numero", "valor_total"],
+}
+# Páginas de cada nota, na lista de notas do documento inteiro (estratégia pdf)
+PROPRIEDADE_PAGINAS = {"paginas": {"type": "array", "items": {"type": "integer"},
+                                   "description": "páginas do PDF ocupadas pela nota, a partir de 1"}}
+# Campos de texto livre, fora do esquema com omitir_texto_livre
+CAMPOS_TEXTO_LIVRE = ('discriminacao',)
+
+# Teto da resposta por nota: a chamada da ferramenta é compacta, e sem texto livre cabe em bem menos
+MAX_TOKENS_NOTA = 2000
+MAX_TOKENS_NOTA_SEM_TEXTO = 800
+
+# Betas da versão fixada do SDK
+BETA_PDF = "pdfs-2024-09-25"
+BETA_CACHE_PROMPT = "prompt-caching-2024-07-31"
+
+
+@functools.lru_cache(maxsize=None)
+def ferramenta_extracao(varias_notas: bool = False, texto_livre: bool = True) -> Dict[str, Any]:
+    """
+    Definição da ferramenta de extração (tools da Messages API)
+    varias_notas: lista de notas do documento inteiro (estratégia pdf com várias páginas)
+    texto_livre: False tira a discriminação do esquema
+    """
+    esquema = dict(ESQUEMA_NOTA)
+    if not texto_livre:
+        esquema['properties'] = {campo: valor for campo, valor in ESQUEMA_NOTA['properties'].items()
+                                 if campo not in CAMPOS_TEXTO_LIVRE}
+    if varias_notas:
+        esquema = {**esquema, 'properties': {**esquema['properties'], **PROPRIEDADE_PAGINAS}}
+        return {"name": FERRAMENTA_NOTAS, "description": "Registra as notas fiscais do documento, em ordem",
+                "input_schema": {"type": "object", "properties": {"notas": {"type": "array", "items": esquema}},
+                                 "required": ["notas"]}}
+    return {"name": FERRAMENTA_NOTA, "description": "Registra os dados extraídos da nota fiscal",
+            "input_schema": esquema}
+
+def _com_slots(cls):
+    """
+    Recria a dataclass com __slots__ dos campos, como @dataclass(slots=True)
+    (que só existe a partir do Python 3.10; o deploy usa o python3 da distribuição)
+    """
+    nomes = tuple(campo.name for campo in fields(cls))
+    atributos = {nome: valor for nome, valor in cls.__dict__.items()
+                 if nome not in nomes and nome not in ('__dict__', '__weakref__')}
+    atributos['__slots__'] = nomes
+    nova = type(cls)(cls.__name__, cls.__bases__, atributos)
+    nova.__qualname__ = cls.__qualname__
+    return nova
+
+@_com_slots
 @dataclass
 class DadosTributarios:
     """Estrutura para dados tributários"""
@@ -49,9 +220,10 @@ class DadosTributarios:
         ]
         return sum(r for r in retencoes if r is not None)
 
+@_com_slots
 @dataclass
 class NotaFiscal:
-    """Estrutura da Nota Fiscal"""
+    """Estrutura da Nota Fiscal (slots: sem __dict__ por instância, importa em lotes de milhares)"""
     numero: str = "DESCONHECIDO"
     estado: str = "DESCONHECIDO"
     municipio: str = "DESCONHECIDO"
@@ -64,6 +236,10 @@ class NotaFiscal:
     confianca_extracao: float = 100.0  # Sempre 100% com Claude!
     metodo_extracao: str = "Claude API"
     formato_detectado: str = "NFS-e"
+    estrategia_entrada: Optional[str] = None  # forma como a nota foi enviada ao modelo
+    bytes_payload: Optional[int] = None  # tamanho do conteúdo enviado à API
+    ms_renderizacao: Optional[float] = None  # tempo para gerar a imagem da página (0 se veio do cache)
+    paginas: List[int] = field(default_factory=list)  # páginas do PDF (a partir de 1) que formam a nota
     
     # Campos opcionais
     serie: Optional[str] = None
@@ -77,251 +253,1184 @@ class NotaFiscal:
     discriminacao: Optional[str] = None
     dados_bancarios: Optional[Dict] = None
 
+def _campo_decimal(f) -> bool:
+    """Indica se o campo do dataclass é Decimal ou Optional[Decimal]"""
+    return f.type is Decimal or Decimal in getattr(f.type, '__args__', ())
+
+@functools.lru_cache(maxsize=None)
+def campos_do_dataclass(cls) -> tuple:
+    """(nome, é Decimal) de cada campo; fields() refaz a lista a cada chamada"""
+    return tuple((f.name, _campo_decimal(f)) for f in fields(cls))
+
+def nota_para_dict(nota: NotaFiscal) -> Dict[str, Any]:
+    """Serializa NotaFiscal em dict compatível com JSON (Decimal vira string, sem perda)"""
+    def converter(obj):
+        resultado = {}
+        for nome, _ in campos_do_dataclass(type(obj)):
+            valor = getattr(obj, nome)
+            if isinstance(valor, Decimal):
+                valor = str(valor)
+            elif isinstance(valor, DadosTributarios):
+                valor = converter(valor)
+            elif isinstance(valor, list):
+                valor = list(valor)
+            resultado[nome] = valor
+        return resultado
+    return converter(nota)
+
+def nota_de_dict(dados: Dict[str, Any]) -> NotaFiscal:
+    """Reconstrói NotaFiscal a partir do dict gerado por nota_para_dict"""
+    def construir(cls, valores):
+        kwargs = {}
+        for nome, decimal in campos_do_dataclass(cls):
+            if nome not in valores:
+                continue
+            valor = valores[nome]
+            if valor is not None and decimal:
+                valor = Decimal(str(valor))
+            elif nome == 'dados_tributarios' and isinstance(valor, dict):
+                valor = construir(DadosTributarios, valor)
+            kwargs[nome] = valor
+        return cls(**kwargs)
+    return construir(NotaFiscal, dados)
+
+def nota_de_resposta(dados: Dict[str, Any]) -> NotaFiscal:
+    """
+    Converte o JSON de extração (formato de ESQUEMA_NOTA) em NotaFiscal
+    Usado tanto para a resposta do Claude quanto para o extrator de texto
+    """
+    # Converte para NotaFiscal
+    nota = NotaFiscal()
+    dados_trib = DadosTributarios()
+    
+    # Dados básicos (o esquema aceita null: ausente ou null vira DESCONHECIDO)
+    nota.numero = str(dados.get('numero') or 'DESCONHECIDO')
+    nota.data_emissao = dados.get('data_emissao') or 'DESCONHECIDO'
+    nota.vencimento = dados.get('vencimento')
+    nota.codigo_verificacao = dados.get('codigo_verificacao')
+    nota.municipio = dados.get('municipio') or 'DESCONHECIDO'
+    nota.estado = dados.get('estado') or 'DESCONHECIDO'
+    nota.discriminacao = dados.get('discriminacao')
+    
+    # Prestador
+    if dados.get('prestador'):
+        nota.prestador = dados['prestador'].get('nome') or 'DESCONHECIDO'
+        nota.prestador_cnpj = dados['prestador'].get('cnpj')
+    
+    # Tomador
+    if dados.get('tomador'):
+        nota.tomador = dados['tomador'].get('nome') or 'DESCONHECIDO'
+        nota.tomador_cnpj = dados['tomador'].get('cnpj')
+    
+    # Valores (trata vírgula como separador decimal)
+    def parse_decimal(value):
+        if value is None:
+            return Decimal('0')
+        if isinstance(value, (int, float)):
+            return Decimal(str(value))
+        if isinstance(value, str):
+            # Remove espaços e substitui vírgula por ponto
+            value = value.strip().replace(',', '.')
+            try:
+                return Decimal(value)
+            except:
+                return Decimal('0')
+        return Decimal('0')
+    
+    nota.valor_total = parse_decimal(dados.get('valor_total'))
+    nota.valor_servicos = parse_decimal(dados.get('valor_servicos'))
+    
+    # Impostos
+    if dados.get('impostos'):
+        impostos = dados['impostos']
+        
+        # ISS
+        if impostos.get('iss'):
+            iss_data = impostos['iss']
+            dados_trib.valor_iss = parse_decimal(iss_data.get('valor'))
+            dados_trib.aliquota_iss = parse_decimal(iss_data.get('aliquota'))
+            dados_trib.base_calculo = parse_decimal(iss_data.get('base_calculo'))
+            dados_trib.tributado = dados_trib.valor_iss > 0
+        
+        # Retenções
+        if impostos.get('retencoes'):
+            ret = impostos['retencoes']
+            dados_trib.retencao_pis = parse_decimal(ret.get('pis')) if ret.get('pis') else None
+            dados_trib.retencao_cofins = parse_decimal(ret.get('cofins')) if ret.get('cofins') else None
+            dados_trib.retencao_csll = parse_decimal(ret.get('csll')) if ret.get('csll') else None
+            dados_trib.retencao_irrf = parse_decimal(ret.get('irrf')) if ret.get('irrf') else None
+            dados_trib.retencao_inss = parse_decimal(ret.get('inss')) if ret.get('inss') else None
+            dados_trib.retencao_iss = parse_decimal(ret.get('iss_retido')) if ret.get('iss_retido') else None
+    
+    nota.dados_tributarios = dados_trib
+    nota.formato_detectado = f"NFS-e {nota.estado}" if nota.estado != "DESCONHECIDO" else "NFS-e"
+    
+    # Adiciona observações
+    if dados_trib.tributado:
+        dados_trib.observacoes.append(f"Tributado em {nota.municipio}")
+    
+    if dados_trib.total_retencoes() > 0:
+        total_ret = dados_trib.total_retencoes()
+        dados_trib.observacoes.append(f"Total de retenções: R$ {total_ret:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
+    
+    return nota
+
+def _json_da_resposta(texto: str) -> Any:
+    """Primeiro objeto ou lista JSON do texto da resposta"""
+    posicoes = [i for i in (texto.find('{'), texto.find('[')) if i >= 0]
+    if not posicoes:
+        raise ValueError("Resposta do modelo sem JSON")
+    dados, _ = json.JSONDecoder().raw_decode(texto, min(posicoes))
+    return dados
+
+def _numero_normalizado(numero: Any) -> Optional[str]:
+    """Número da nota sem zeros à esquerda e pontuação ('00004550' e '4550' são a mesma nota)"""
+    if numero in (None, '', 'null'):
+        return None
+    normalizado = ''.join(c for c in str(numero) if c.isalnum()).lstrip('0')
+    return normalizado or None
+
+def _paginas_informadas(dados: Any, total: int) -> List[int]:
+    """Páginas da nota informadas pelo modelo (a partir de 1), só as que existem no documento"""
+    paginas = dados.get('paginas') if isinstance(dados, dict) else None
+    if not isinstance(paginas, list):
+        return []
+    return sorted({p for p in paginas if isinstance(p, int) and 1 <= p <= total})
+
+def mesclar_dados(parciais: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Junta os JSONs parciais das páginas de uma mesma nota
+    Cada campo fica com o primeiro valor não nulo; a discriminação é concatenada
+    """
+    mesclado: Dict[str, Any] = {}
+    for dados in parciais:
+        for campo, valor in dados.items():
+            if valor in (None, '', 'null'):
+                continue
+            atual = mesclado.get(campo)
+            if isinstance(valor, dict):
+                mesclado[campo] = mesclar_dados([atual, valor]) if isinstance(atual, dict) else valor
+            elif campo == 'discriminacao' and atual and valor not in atual:
+                mesclado[campo] = f"{atual}\n{valor}"
+            elif atual is None:
+                mesclado[campo] = valor
+    return mesclado
+
+def agrupar_paginas(paginas: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Separa as páginas de um documento em notas
+    Uma página com número diferente do da nota atual começa uma nova nota;
+    páginas sem número (continuação) ficam com a nota anterior
+    Uma página sem dados (layout não reconhecido, resposta vazia) pode ser outra nota:
+    fica sozinha e a página seguinte começa uma nova nota
+    paginas: itens com 'dados' (JSON parcial ou None se a página falhou), em ordem
+    """
+    grupos: List[List[Dict[str, Any]]] = []
+    numero_atual = None
+    anterior_sem_dados = False
+    for pagina in paginas:
+        sem_dados = not pagina.get('dados')
+        numero = None if sem_dados else _numero_normalizado(pagina['dados'].get('numero'))
+        if (not grupos or sem_dados or anterior_sem_dados
+                or (numero is not None and numero_atual is not None and numero != numero_atual)):
+            grupos.append([])
+            numero_atual = None
+        if numero is not None:
+            numero_atual = numero
+        grupos[-1].append(pagina)
+        anterior_sem_dados = sem_dados
+    return grupos
+
+class ErroAnalise(Exception):
+    """
+    Falha ao analisar o PDF (API indisponível ou resposta ilegível), no lugar de uma NotaFiscal vazia
+    temporario: vale tentar de novo mais tarde (limite de taxa, sobrecarga, rede); retry_after em segundos
+    """
+
+    def __init__(self, mensagem: str, causa: Optional[BaseException] = None):
+        super().__init__(mensagem)
+        self.temporario = bool(getattr(causa, 'temporario', False))
+        self.retry_after = getattr(causa, 'retry_after', None)
+
+def criar_cliente_anthropic(api_key: Optional[str] = None, base_url: Optional[str] = None,
+                            assincrono: bool = False):
+    """
+    Cria cliente Anthropic com pool HTTP ajustável (keep-alive, conexões, timeouts)
+    Configuração: NF_HTTP_MAX_CONEXOES, NF_HTTP_MAX_KEEPALIVE, NF_HTTP_KEEPALIVE_EXPIRY,
+    NF_HTTP_TIMEOUT, NF_HTTP_TIMEOUT_CONEXAO
+    assincrono: True cria AsyncAnthropic (o pool fica preso ao event loop que o usar)
+    Sem novas tentativas no SDK: quem tenta de novo é o agendador (agendador.py)
+    """
+    if not ANTHROPIC_AVAILABLE:
+        raise ImportError("Módulo anthropic não está instalado. Execute: pip install anthropic")
+    
+    api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        raise ValueError(
+            "API Key do Claude não encontrada! "
+            "Configure a variável de ambiente ANTHROPIC_API_KEY ou passe como parâmetro"
+        )
+    
+    import anthropic
+    import httpx
+    limites = httpx.Limits(
+        max_connections=int(os.getenv('NF_HTTP_MAX_CONEXOES', HTTP_MAX_CONEXOES_PADRAO)),
+        max_keepalive_connections=int(os.getenv('NF_HTTP_MAX_KEEPALIVE', HTTP_MAX_KEEPALIVE_PADRAO)),
+        keepalive_expiry=float(os.getenv('NF_HTTP_KEEPALIVE_EXPIRY', HTTP_KEEPALIVE_EXPIRY_PADRAO)),
+    )
+    timeout = httpx.Timeout(
+        float(os.getenv('NF_HTTP_TIMEOUT', HTTP_TIMEOUT_PADRAO)),
+        connect=float(os.getenv('NF_HTTP_TIMEOUT_CONEXAO', HTTP_TIMEOUT_CONEXAO_PADRAO)),
+    )
+    # DefaultHttpxClient mantém os padrões do SDK (redirects, transporte)
+    if assincrono:
+        cliente_http = getattr(anthropic, 'DefaultAsyncHttpxClient', httpx.AsyncClient)(limits=limites, timeout=timeout)
+        return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=cliente_http,
+                                        timeout=timeout, max_retries=0)
+    cliente_http = getattr(anthropic, 'DefaultHttpxClient', httpx.Client)(limits=limites, timeout=timeout)
+    return anthropic.Anthropic(api_key=api_key, base_url=base_url, http_client=cliente_http,
+                               timeout=timeout, max_retries=0)
+
 class AnalisadorClaudeAPI:
     """
     Analisador que usa a API do Claude para processar PDFs
     Funciona EXATAMENTE como o Claude - 100% de precisão
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    _SEM_CACHE = object()
+
+    def __init__(self, api_key: Optional[str] = None, cache: Any = _SEM_CACHE, client: Any = None,
+                 modo_extracao: Optional[str] = None, confianca_minima_texto: Optional[float] = None,
+                 estrategia_entrada: Optional[str] = None, dpi_imagem: Optional[int] = None,
+                 qualidade_jpeg: Optional[int] = None, renderizador: Optional[Renderizador] = None,
+                 paginas_concorrencia: Optional[int] = None, max_paginas: Optional[int] = None,
+                 agendador: Optional[Agendador] = None, omitir_texto_livre: Optional[bool] = None,
+                 cache_prompt: Optional[bool] = None, armazem: Any = _SEM_CACHE):
         """
         Inicializa o analisador
         api_key: Chave da API Anthropic (ou usa ANTHROPIC_API_KEY do ambiente)
+        cache: CacheResultados a usar (padrão: cache do processo; None desativa)
+        client: cliente Anthropic já criado (padrão: criar_cliente_anthropic com pool próprio)
+        modo_extracao: 'auto', 'texto' ou 'claude' (padrão: NF_MODO_EXTRACAO ou 'auto')
+        confianca_minima_texto: confiança para aceitar a extração por texto (padrão: NF_TEXTO_CONFIANCA_MIN)
+        estrategia_entrada: 'imagem', 'imagem_compacta', 'pdf' ou 'texto' (padrão: NF_ESTRATEGIA_ENTRADA ou 'imagem')
+        dpi_imagem / qualidade_jpeg: ajustes da estratégia imagem_compacta (NF_IMAGEM_DPI / NF_IMAGEM_QUALIDADE)
+        renderizador: estágio de renderização das páginas (padrão: obter_renderizador())
+        paginas_concorrencia / max_paginas: análise de documentos com várias páginas
+        (NF_PAGINAS_CONCORRENCIA / NF_MAX_PAGINAS)
+        agendador: limites de taxa e novas tentativas das chamadas à API (padrão: obter_agendador())
+        omitir_texto_livre: não pede a discriminação dos serviços (menos tokens de saída;
+        padrão: NF_OMITIR_TEXTO_LIVRE)
+        cache_prompt: instruções e ferramenta no cache de prompt da API (padrão: ativo, exceto com
+        NF_CACHE_PROMPT_DESATIVADO)
+        armazem: ArmazemNotas onde as notas extraídas ficam guardadas (padrão: obter_armazem(); None desativa)
         """
-        if not ANTHROPIC_AVAILABLE:
-            raise ImportError("Módulo anthropic não está instalado. Execute: pip install anthropic")
-            
-        self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
-        if not self.api_key:
-            raise ValueError(
-                "API Key do Claude não encontrada! "
-                "Configure a variável de ambiente ANTHROPIC_API_KEY ou passe como parâmetro"
-            )
+        if client is None:
+            self.api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+            self.client = criar_cliente_anthropic(self.api_key)
+        else:
+            self.api_key = api_key
+            self.client = client
+        self.cache: Optional[CacheResultados] = obter_cache_padrao() if cache is self._SEM_CACHE else cache
+        self.armazem: Optional[ArmazemNotas] = obter_armazem() if armazem is self._SEM_CACHE else armazem
         
-        # Inicializa o cliente compatível com diferentes versões
-        os.environ['ANTHROPIC_API_KEY'] = self.api_key
-        self.client = anthropic.Anthropic()
+        self.modo_extracao = modo_extracao or os.getenv('NF_MODO_EXTRACAO', 'auto')
+        if self.modo_extracao not in MODOS_EXTRACAO:
+            raise ValueError(f"Modo de extração inválido: {self.modo_extracao} (use {', '.join(MODOS_EXTRACAO)})")
+        if confianca_minima_texto is None:
+            confianca_minima_texto = float(os.getenv('NF_TEXTO_CONFIANCA_MIN', CONFIANCA_MINIMA_PADRAO))
+        self.confianca_minima_texto = confianca_minima_texto
+        
+        self.estrategia_entrada = estrategia_entrada or os.getenv('NF_ESTRATEGIA_ENTRADA', 'imagem')
+        if self.estrategia_entrada not in ESTRATEGIAS_ENTRADA:
+            raise ValueError(f"Estratégia de entrada inválida: {self.estrategia_entrada} (use {', '.join(ESTRATEGIAS_ENTRADA)})")
+        self.dpi_imagem = dpi_imagem or int(os.getenv('NF_IMAGEM_DPI', DPI_IMAGEM_COMPACTA_PADRAO))
+        self.qualidade_jpeg = qualidade_jpeg or int(os.getenv('NF_IMAGEM_QUALIDADE', QUALIDADE_JPEG_PADRAO))
+        self.renderizador = renderizador or obter_renderizador()
+        self.agendador = agendador or obter_agendador()
+        self.paginas_concorrencia = paginas_concorrencia or int(os.getenv('NF_PAGINAS_CONCORRENCIA', PAGINAS_CONCORRENCIA_PADRAO))
+        self.max_paginas = max_paginas or int(os.getenv('NF_MAX_PAGINAS', MAX_PAGINAS_PADRAO))
+        self._pool_paginas: Optional[ThreadPoolExecutor] = None
+        self._pool_paginas_lock = threading.Lock()
+        
+        if omitir_texto_livre is None:
+            omitir_texto_livre = os.getenv('NF_OMITIR_TEXTO_LIVRE', '').lower() in ('1', 'true', 'sim')
+        self.omitir_texto_livre = omitir_texto_livre
+        if cache_prompt is None:
+            cache_prompt = os.getenv('NF_CACHE_PROMPT_DESATIVADO', '').lower() not in ('1', 'true', 'sim')
+        self.cache_prompt = cache_prompt
+        sistema = {"type": "text", "text": PROMPT_SISTEMA + (PROMPT_SEM_TEXTO_LIVRE if omitir_texto_livre else '')}
+        if cache_prompt:
+            # Ferramenta e sistema formam o prefixo em cache (ferramentas vêm antes do sistema)
+            sistema["cache_control"] = {"type": "ephemeral"}
+        self._sistema = [sistema]
     
-    def pdf_para_imagem_base64(self, pdf_path: str) -> str:
+    def pdf_para_imagem_base64(self, pdf: EntradaPDF) -> str:
         """Converte primeira página do PDF para imagem base64"""
+        return base64.b64encode(self.renderizador.renderizar(pdf, dpi=200).dados).decode('utf-8')
+    
+    def extrair_por_texto(self, pdf: EntradaPDF) -> Optional[NotaFiscal]:
+        """
+        Extração sem IA pela camada de texto (apenas layouts municipais conhecidos)
+        Retorna None se o PDF não tiver texto ou o layout não for reconhecido
+        """
+        resultado = self._campos_por_texto(pdf)
+        if resultado is None:
+            return None
+        
+        dados, confianca, layout = resultado
+        nota = nota_de_resposta(dados)
+        nota.confianca_extracao = confianca
+        nota.metodo_extracao = f"Texto do PDF (layout {layout.nome})"
+        nota.formato_detectado = f"NFS-e {layout.nome}"
+        return nota
+    
+    def _campos_por_texto(self, pdf: EntradaPDF, pagina: int = 0) -> Optional[tuple]:
+        """(dados, confiança, layout) da camada de texto da página, ou None"""
         try:
-            # Tenta usar pdfplumber para converter PDF em imagem
-            import pdfplumber
-            
-            with pdfplumber.open(pdf_path) as pdf:
-                # Pega apenas a primeira página (NFS-e geralmente tem apenas uma)
-                page = pdf.pages[0]
-                
-                # Converte página para imagem com boa resolução
-                im = page.to_image(resolution=200)
-                
-                # Converte para PNG em memória
-                img_buffer = io.BytesIO()
-                im.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                
-                # Converte para base64
-                img_base64 = base64.b64encode(img_buffer.read()).decode('utf-8')
-                return img_base64
-                
+            with metricas.cronometrar('texto'), usar_documento(pdf) as documento:
+                return extrair_campos(extrair_texto_pdf(documento.fluxo(), pagina))
         except Exception as e:
-            print(f"Erro ao converter PDF para imagem: {e}")
-            # Tenta método alternativo com pypdfium2
-            try:
-                import pypdfium2 as pdfium
-                
-                pdf = pdfium.PdfDocument(pdf_path)
-                page = pdf[0]
-                
-                # Renderiza página como imagem
-                bitmap = page.render(scale=2)  # 2x para melhor qualidade
-                pil_image = bitmap.to_pil()
-                
-                # Converte para PNG em memória
-                img_buffer = io.BytesIO()
-                pil_image.save(img_buffer, format='PNG')
-                img_buffer.seek(0)
-                
-                # Converte para base64
-                img_base64 = base64.b64encode(img_buffer.read()).decode('utf-8')
-                return img_base64
-                
-            except Exception as e2:
-                print(f"Erro no método alternativo: {e2}")
-                raise Exception(f"Não foi possível converter PDF para imagem: {e}")
-    
-    def analisar(self, pdf_path: str) -> NotaFiscal:
+            print(f"Erro na extração por texto: {e}")
+            return None
+    
+    def pdf_para_imagem_compacta_base64(self, pdf: EntradaPDF) -> tuple:
+        """
+        Converte primeira página do PDF para imagem em tons de cinza com DPI reduzido
+        Retorna (base64, media_type): JPEG ou PNG, o que for menor
+        """
+        pagina = self.renderizador.renderizar(pdf, dpi=self.dpi_imagem, formato='compacta',
+                                              qualidade=self.qualidade_jpeg)
+        return base64.b64encode(pagina.dados).decode('utf-8'), pagina.media_type
+    
+    def montar_conteudo(self, pdf: EntradaPDF, estrategia: str, pagina: int = 0) -> tuple:
+        """
+        Monta o bloco da nota (ou de uma página dela) para a mensagem conforme a estratégia
+        A estratégia pdf sempre envia o arquivo inteiro
+        Retorna (bloco de conteúdo, info) com a estratégia efetivamente usada,
+        os bytes do payload e o tempo de renderização (None se não renderizou)
+        """
+        with usar_documento(pdf) as documento:
+            return self._montar_conteudo(documento, estrategia, pagina)
+    
+    def _montar_conteudo(self, documento: DocumentoPDF, estrategia: str, pagina: int) -> tuple:
+        if estrategia == 'texto':
+            texto = extrair_texto_pdf(documento.fluxo(), pagina)
+            if texto.strip():
+                bloco = {"type": "text", "text": f"Texto extraído da nota fiscal:\n\n{texto}"}
+                return bloco, self._info_entrada(estrategia, len(bloco["text"].encode('utf-8')))
+            # PDF escaneado: sem texto, envia imagem compacta
+            metricas.FALLBACKS.inc(tipo='texto_sem_camada')
+            estrategia = 'imagem_compacta'
+        
+        if estrategia == 'pdf':
+            dados = base64.b64encode(documento.dados).decode('utf-8')
+            bloco = {
+                "type": "document",
+                "source": {"type": "base64", "media_type": "application/pdf", "data": dados}
+            }
+            return bloco, self._info_entrada(estrategia, len(dados))
+        
+        if estrategia == 'imagem_compacta':
+            imagem = self.renderizador.renderizar(documento, pagina, dpi=self.dpi_imagem, formato='compacta',
+                                                  qualidade=self.qualidade_jpeg)
+        else:
+            imagem = self.renderizador.renderizar(documento, pagina, dpi=200)
+        dados = base64.b64encode(imagem.dados).decode('utf-8')
+        bloco = {
+            "type": "image",
+            "source": {"type": "base64", "media_type": imagem.media_type, "data": dados}
+        }
+        ms = 0.0 if imagem.do_cache else round(imagem.ms_renderizacao, 1)
+        return bloco, self._info_entrada(estrategia, len(dados), ms)
+    
+    @staticmethod
+    def _info_entrada(estrategia: str, bytes_payload: int, ms_renderizacao: Optional[float] = None) -> Dict[str, Any]:
+        """Campos da NotaFiscal que descrevem como a nota foi enviada ao modelo"""
+        return {'estrategia_entrada': estrategia, 'bytes_payload': bytes_payload, 'ms_renderizacao': ms_renderizacao}
+    
+    def analisar(self, pdf: EntradaPDF, usar_cache: bool = True, modo: Optional[str] = None,
+                 estrategia: Optional[str] = None) -> NotaFiscal:
         """
         Analisa PDF usando Claude API
-        Retorna NotaFiscal com todos os dados extraídos
+        Retorna NotaFiscal com todos os dados extraídos; levanta ErroAnalise se a API falhar
+        pdf: caminho, bytes, objeto de arquivo (ex: upload do Flask) ou DocumentoPDF
+        usar_cache: False ignora o resultado armazenado (o novo resultado ainda é gravado)
+        modo: sobrescreve o modo de extração do analisador nesta chamada
+        estrategia: sobrescreve a estratégia de entrada nesta chamada
         """
-        try:
-            # Converte PDF para imagem base64
-            img_base64 = self.pdf_para_imagem_base64(pdf_path)
+        with usar_documento(pdf) as documento:
+            nota, chave, estrategia = self._resolver_sem_api(documento, usar_cache, modo, estrategia)
+            if nota is not None:
+                return nota
             
-            # Prompt otimizado para extração estruturada
-            prompt = """Analise esta nota fiscal brasileira (NFS-e) e extraia TODOS os dados em formato JSON.
-
-IMPORTANTE: 
-- Extraia valores monetários como números decimais (ex: 1234.56 ou 1234,56 - converta vírgula para ponto)
-- Datas no formato DD/MM/AAAA
-- Se um campo não existir, use null
-- Para retenções, sempre verifique PIS, COFINS, CSLL, IRRF, INSS e ISS
-- O estado deve ser um dos 27 estados brasileiros por extenso (São Paulo, Rio de Janeiro, Minas Gerais, etc) ou sigla (SP, RJ, MG, etc)
-- Se não conseguir identificar o estado, tente inferir pelo município ou use null
-
-Retorne APENAS o JSON com esta estrutura exata:
-{
-    "numero": "número da nota",
-    "data_emissao": "DD/MM/AAAA",
-    "vencimento": "DD/MM/AAAA ou null",
-    "codigo_verificacao": "código ou null",
-    "prestador": {
-        "nome": "nome da empresa",
-        "cnpj": "CNPJ ou null"
-    },
-    "tomador": {
-        "nome": "nome da empresa",
-        "cnpj": "CNPJ ou null"
-    },
-    "municipio": "município",
-    "estado": "estado por extenso",
-    "valor_total": 12345.67,
-    "valor_servicos": 12345.67,
-    "discriminacao": "descrição dos serviços",
-    "impostos": {
-        "iss": {
-            "valor": 123.45,
-            "aliquota": 5.0,
-            "base_calculo": 12345.67
-        },
-        "retencoes": {
-            "pis": 123.45,
-            "cofins": 123.45,
-            "csll": 123.45,
-            "irrf": 123.45,
-            "inss": 123.45,
-            "iss_retido": 123.45
-        }
-    }
-}"""
+            try:
+                nota = self._analisar_com_claude(documento, estrategia)
+            except Exception as e:
+                raise self._erro_analise(documento.nome, e) from e
             
-            # Chama Claude API
-            response = self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",  # Modelo mais recente e preciso
-                max_tokens=2000,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            },
-                            {
-                                "type": "image",
-                                "source": {
-                                    "type": "base64",
-                                    "media_type": "image/png",
-                                    "data": img_base64
-                                }
-                            }
-                        ]
-                    }
-                ]
+            metricas.registrar_caminho('claude')
+            self._guardar_no_cache(chave, nota)
+            self._arquivar(documento.sha256, documento.nome, [nota])
+        return nota
+    
+    def _resolver_sem_api(self, documento: DocumentoPDF, usar_cache: bool, modo: Optional[str],
+                          estrategia: Optional[str]) -> tuple:
+        """
+        Etapas anteriores à API: valida opções, tenta o cache, a camada de texto e o armazém
+        Retorna (nota já resolvida ou None, chave do cache ou None, estratégia)
+        """
+        modo, estrategia = self._validar_opcoes(modo, estrategia)
+        
+        # Cache pelo SHA-256 primeiro: um acerto dispensa até a leitura da camada de texto
+        # (o modo texto não usa o cache, que guarda resultados do Claude)
+        chave = None
+        if self.cache is not None:
+            chave = chave_do_digest(documento.sha256, self._assinatura(estrategia))
+            if usar_cache and modo != 'texto':
+                dados = self.cache.obter(chave)
+                metricas.anotar('cache', 'hit' if dados is not None else 'miss')
+                if dados is not None:
+                    metricas.registrar_caminho('cache')
+                    return nota_de_dict(dados), chave, estrategia
+        
+        # Caminho rápido: NFS-e digital de layout conhecido dispensa imagem e API
+        nota = None
+        if modo in ('auto', 'texto'):
+            nota = self.extrair_por_texto(documento)
+            if nota is not None and (modo == 'texto' or nota.confianca_extracao >= self.confianca_minima_texto):
+                metricas.registrar_caminho('texto')
+                self._arquivar(documento.sha256, documento.nome, [nota])
+                return nota, None, estrategia
+            if modo == 'texto':
+                metricas.registrar_caminho('texto')
+                nota = NotaFiscal(confianca_extracao=0.0, metodo_extracao="Texto do PDF (layout não reconhecido)")
+                return nota, None, estrategia
+            # Layout desconhecido ou confiança baixa: segue para o Claude
+            metricas.FALLBACKS.inc(tipo='texto_baixa_confianca' if nota is not None else 'texto_sem_layout')
+        
+        if usar_cache:
+            arquivada = self._nota_arquivada(documento, nota)
+            if arquivada is not None:
+                metricas.registrar_caminho('armazem')
+                return arquivada, chave, estrategia
+        return None, chave, estrategia
+    
+    def _nota_arquivada(self, documento: DocumentoPDF, nota_texto: Optional[NotaFiscal]) -> Optional[NotaFiscal]:
+        """
+        Nota de uma página já no armazém: pelo hash do PDF ou, se a camada de texto leu
+        CNPJ do prestador, número e código de verificação (ainda que com confiança baixa),
+        pela identidade da nota (mesma nota em outro arquivo)
+        """
+        notas = self._notas_arquivadas(documento)
+        if notas is not None and len(notas) == 1:
+            return notas[0]
+        if self.armazem is None or nota_texto is None or not nota_texto.codigo_verificacao:
+            return None
+        try:
+            dados = self.armazem.buscar_por_chave(nota_texto.prestador_cnpj, nota_texto.numero,
+                                                  nota_texto.codigo_verificacao)
+        except Exception as e:
+            print(f"⚠️ Falha ao consultar o armazém de notas: {e}")
+            return None
+        if dados is None:
+            return None
+        metricas.somar('notas_duplicadas', 1)
+        return nota_de_dict(dados)
+    
+    def _notas_arquivadas(self, documento: DocumentoPDF) -> Optional[List[NotaFiscal]]:
+        """Notas deste PDF (mesmo SHA-256) já guardadas no armazém, ou None"""
+        if self.armazem is None:
+            return None
+        try:
+            notas = self.armazem.notas_do_pdf(documento.sha256)
+        except Exception as e:
+            print(f"⚠️ Falha ao consultar o armazém de notas: {e}")
+            return None
+        return [nota_de_dict(dados) for dados in notas] if notas is not None else None
+    
+    def _arquivar(self, sha256: str, nome: str, notas: List[NotaFiscal]):
+        """Guarda as notas extraídas no armazém; falha do armazém não derruba a análise"""
+        notas = [nota for nota in notas if nota.confianca_extracao > 0]
+        if self.armazem is None or not notas:
+            return
+        try:
+            resultado = self.armazem.guardar(sha256, nome, [nota_para_dict(nota) for nota in notas])
+        except Exception as e:
+            print(f"⚠️ Falha ao guardar as notas de {nome} no armazém: {e}")
+            return
+        if resultado['duplicadas']:
+            metricas.somar('notas_duplicadas', resultado['duplicadas'])
+    
+    @staticmethod
+    def _erro_analise(nome: str, erro: Exception, paginas: Optional[List[int]] = None) -> ErroAnalise:
+        """Registra a falha (log e métricas) e devolve a ErroAnalise a levantar"""
+        onde = f" (página(s) {', '.join(str(p + 1) for p in paginas)})" if paginas else ''
+        print(f"Erro ao analisar {nome}{onde} com Claude API: {erro}")
+        metricas.registrar_caminho('erro')
+        return ErroAnalise(f"Falha ao analisar {nome}{onde}: {erro}", erro)
+    
+    def _validar_opcoes(self, modo: Optional[str], estrategia: Optional[str]) -> tuple:
+        """Aplica os padrões do analisador e valida modo/estratégia da chamada"""
+        modo = modo or self.modo_extracao
+        if modo not in MODOS_EXTRACAO:
+            raise ValueError(f"Modo de extração inválido: {modo} (use {', '.join(MODOS_EXTRACAO)})")
+        estrategia = estrategia or self.estrategia_entrada
+        if estrategia not in ESTRATEGIAS_ENTRADA:
+            raise ValueError(f"Estratégia de entrada inválida: {estrategia} (use {', '.join(ESTRATEGIAS_ENTRADA)})")
+        return modo, estrategia
+    
+    def _assinatura(self, estrategia: str) -> str:
+        """Modelo, prompt e opções que mudam a resposta: parte da chave do cache de resultados"""
+        return f"{MODELO_CLAUDE}:{VERSAO_PROMPT}:{estrategia}" + (':sem_texto' if self.omitir_texto_livre else '')
+    
+    def _guardar_no_cache(self, chave: Optional[str], nota: NotaFiscal):
+        if chave is not None and self.cache is not None:
+            self.cache.guardar(chave, nota_para_dict(nota))
+    
+    def montar_requisicao(self, pdf: EntradaPDF, estrategia: str, pagina: int = 0,
+                          total_paginas: int = 1) -> tuple:
+        """
+        Monta os parâmetros de messages.create (iguais para o cliente síncrono e o assíncrono)
+        total_paginas > 1: pede só os dados da página (ou a lista de notas, na estratégia pdf)
+        Retorna (parâmetros, info da entrada; ver montar_conteudo)
+        """
+        bloco, info = self.montar_conteudo(pdf, estrategia, pagina)
+        prompt = PROMPT_EXTRACAO
+        varias_notas = total_paginas > 1 and info['estrategia_entrada'] == 'pdf'
+        if varias_notas:
+            prompt += PROMPT_DOCUMENTO
+        elif total_paginas > 1:
+            prompt += PROMPT_PAGINA.format(pagina=pagina + 1, total=total_paginas)
+        ferramenta = ferramenta_extracao(varias_notas, not self.omitir_texto_livre)
+        max_tokens = MAX_TOKENS_NOTA_SEM_TEXTO if self.omitir_texto_livre else MAX_TOKENS_NOTA
+        betas = [BETA_PDF] if info['estrategia_entrada'] == 'pdf' else []
+        if self.cache_prompt:
+            betas.append(BETA_CACHE_PROMPT)
+        parametros = dict(
+            model=MODELO_CLAUDE,  # Modelo mais recente e preciso
+            # A lista de notas do documento inteiro precisa de mais espaço na resposta
+            max_tokens=min(max_tokens * total_paginas, 8192) if varias_notas else max_tokens,
+            system=self._sistema,
+            tools=[ferramenta],
+            tool_choice={"type": "tool", "name": ferramenta['name']},
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": prompt
+                        },
+                        bloco
+                    ]
+                }
+            ],
+            # PDF e cache de prompt ainda em beta na versão fixada do SDK
+            extra_headers={"anthropic-beta": ",".join(betas)} if betas else None
+        )
+        metricas.registrar_payload(info['estrategia_entrada'], info['bytes_payload'])
+        return parametros, info
+    
+    def interpretar_resposta(self, response: Any, info: Dict[str, Any]) -> NotaFiscal:
+        """Converte a mensagem devolvida pela API em NotaFiscal"""
+        with metricas.cronometrar('interpretacao'):
+            nota = nota_de_resposta(self._dados_da_resposta(response))
+        for campo, valor in info.items():
+            setattr(nota, campo, valor)
+        return nota
+    
+    @staticmethod
+    def _dados_da_resposta(response: Any) -> Any:
+        """
+        JSON da nota (ou lista de notas) passado à ferramenta de extração
+        Resposta só com texto (ex: gravações antigas) tem o primeiro JSON do texto lido
+        """
+        if getattr(response, 'stop_reason', None) == 'max_tokens':
+            raise ValueError("Resposta do modelo cortada por max_tokens")
+        for bloco in response.content:
+            if bloco.type == 'tool_use':
+                return bloco.input['notas'] if bloco.name == FERRAMENTA_NOTAS else bloco.input
+        return _json_da_resposta(''.join(bloco.text for bloco in response.content if bloco.type == 'text'))
+    
+    def _analisar_com_claude(self, documento: DocumentoPDF, estrategia: str) -> NotaFiscal:
+        """Monta o conteúdo da nota, chama a Claude API e converte a resposta em NotaFiscal"""
+        parametros, info = self.montar_requisicao(documento, estrategia)
+        
+        # Chama Claude API
+        response = self._chamar_api(parametros)
+        return self.interpretar_resposta(response, info)
+    
+    def _chamar_api(self, parametros: Dict[str, Any]) -> Any:
+        """
+        messages.create pelo agendador (fila, limites de taxa, novas tentativas)
+        Latência e resultado de cada tentativa e tokens da resposta vão para as métricas
+        """
+        def chamar():
+            with metricas.medir_chamada_api():
+                return self.client.messages.create(**parametros)
+        
+        response = self.agendador.executar(chamar, estimar_tokens(parametros))
+        metricas.registrar_uso(response)
+        return response
+    
+    def analisar_documento(self, pdf: EntradaPDF, usar_cache: bool = True, modo: Optional[str] = None,
+                           estrategia: Optional[str] = None) -> List[NotaFiscal]:
+        """
+        Analisa todas as páginas do PDF e retorna uma NotaFiscal por nota encontrada
+        As páginas são analisadas em paralelo (até paginas_concorrencia) e as partes
+        de uma mesma nota são mescladas; PDF de uma página equivale a [analisar(...)]
+        Levanta ErroAnalise se alguma página não pôde ser analisada
+        pdf: como em analisar (caminho, bytes, objeto de arquivo ou DocumentoPDF)
+        """
+        with usar_documento(pdf) as documento:
+            return self._analisar_documento(documento, usar_cache, modo, estrategia)
+    
+    def _analisar_documento(self, documento: DocumentoPDF, usar_cache: bool, modo: Optional[str],
+                            estrategia: Optional[str]) -> List[NotaFiscal]:
+        total = self._total_paginas(documento)
+        if total <= 1:
+            nota = self.analisar(documento, usar_cache=usar_cache, modo=modo, estrategia=estrategia)
+            nota.paginas = [1]
+            return [nota]
+        
+        modo, estrategia = self._validar_opcoes(modo, estrategia)
+        chave, notas = self._documento_do_cache(documento, usar_cache, estrategia)
+        if notas is not None:
+            metricas.registrar_caminho('cache')
+            return notas
+        notas = self._notas_arquivadas(documento) if usar_cache else None
+        if notas is not None:
+            metricas.registrar_caminho('armazem')
+            return notas
+        
+        if estrategia == 'pdf' and modo != 'texto':
+            # O PDF vai inteiro em uma chamada, a menos que a camada de texto resolva todas as páginas
+            paginas = self._mapear_paginas(lambda i: self._pagina_por_texto(documento, i, modo), total)
+            if any(pagina is None for pagina in paginas):
+                try:
+                    parametros, info = self.montar_requisicao(documento, estrategia, total_paginas=total)
+                    notas = self._notas_do_documento(self._chamar_api(parametros), info, total)
+                except Exception as e:
+                    raise self._erro_analise(documento.nome, e) from e
+                metricas.registrar_caminho('claude')
+                self._guardar_documento(chave, notas)
+                self._arquivar(documento.sha256, documento.nome, notas)
+                return notas
+        else:
+            paginas = self._mapear_paginas(
+                lambda i: self._analisar_pagina(documento, i, total, modo, estrategia), total
             )
+        
+        self._verificar_paginas(documento.nome, paginas)
+        notas = self._montar_notas(paginas)
+        metricas.registrar_caminho(self._caminho_das_paginas(paginas))
+        self._guardar_documento(chave, notas)
+        self._arquivar(documento.sha256, documento.nome, notas)
+        return notas
+    
+    def _mapear_paginas(self, funcao, total: int) -> List[Any]:
+        """funcao(i) para cada página no pool, no contexto (métricas) da requisição"""
+        contextos = [contextvars.copy_context() for _ in range(total)]
+        return list(self._obter_pool_paginas().map(lambda i: contextos[i].run(funcao, i), range(total)))
+    
+    def _verificar_paginas(self, nome: str, paginas: List[Dict[str, Any]]):
+        """Levanta ErroAnalise se alguma página falhou (o documento incompleto não vira nota)"""
+        falhas = [pagina for pagina in paginas if pagina.get('erro') is not None]
+        if falhas:
+            erro = falhas[0]['erro']
+            raise self._erro_analise(nome, erro, [pagina['pagina'] for pagina in falhas]) from erro
+    
+    @staticmethod
+    def _caminho_das_paginas(paginas: List[Dict[str, Any]]) -> str:
+        """Caminho do documento para as métricas: claude se alguma página usou a API"""
+        return 'claude' if any(pagina.get('info') for pagina in paginas) else 'texto'
+    
+    def _total_paginas(self, documento: DocumentoPDF) -> int:
+        total = contar_paginas(documento)
+        if total > self.max_paginas:
+            print(f"⚠️ {documento.nome}: {total} páginas, analisando apenas as {self.max_paginas} primeiras")
+            return self.max_paginas
+        return total
+    
+    def _obter_pool_paginas(self) -> ThreadPoolExecutor:
+        """Pool das páginas, separado do pool de lote para não haver espera circular"""
+        with self._pool_paginas_lock:
+            if self._pool_paginas is None:
+                self._pool_paginas = ThreadPoolExecutor(self.paginas_concorrencia, thread_name_prefix='nf-pagina')
+            return self._pool_paginas
+    
+    def _documento_do_cache(self, documento: DocumentoPDF, usar_cache: bool, estrategia: str) -> tuple:
+        """(chave, notas do cache ou None) para o documento inteiro"""
+        if self.cache is None:
+            return None, None
+        chave = chave_do_digest(documento.sha256, f"{self._assinatura(estrategia)}:documento")
+        if usar_cache:
+            dados = self.cache.obter(chave)
+            if dados is not None:
+                return chave, [nota_de_dict(nota) for nota in dados['notas']]
+        return chave, None
+    
+    def _guardar_documento(self, chave: Optional[str], notas: List[NotaFiscal]):
+        if chave is not None and self.cache is not None:
+            self.cache.guardar(chave, {'notas': [nota_para_dict(nota) for nota in notas]})
+    
+    def _pagina_por_texto(self, documento: DocumentoPDF, pagina: int, modo: str) -> Optional[Dict[str, Any]]:
+        """Resultado da página pela camada de texto, ou None se for preciso chamar a API"""
+        if modo not in ('auto', 'texto'):
+            return None
+        resultado = self._campos_por_texto(documento, pagina)
+        if resultado is None:
+            return None
+        dados, confianca, layout = resultado
+        if modo == 'auto' and confianca < self.confianca_minima_texto:
+            return None
+        return {'pagina': pagina, 'dados': dados, 'confianca': confianca,
+                'metodo': f"Texto do PDF (layout {layout.nome})", 'formato': f"NFS-e {layout.nome}"}
+    
+    def _analisar_pagina(self, documento: DocumentoPDF, pagina: int, total: int, modo: str,
+                         estrategia: str) -> Dict[str, Any]:
+        """JSON parcial de uma página: camada de texto ou Claude API (a exceção fica em 'erro')"""
+        resultado = self._pagina_por_texto(documento, pagina, modo)
+        if resultado is not None:
+            return resultado
+        if modo == 'texto':
+            return {'pagina': pagina, 'dados': None, 'metodo': "Texto do PDF (layout não reconhecido)"}
+        try:
+            parametros, info = self.montar_requisicao(documento, estrategia, pagina, total)
+            return self._pagina_da_resposta(pagina, self._chamar_api(parametros), info)
+        except Exception as e:
+            return {'pagina': pagina, 'dados': None, 'erro': e}
+    
+    def _pagina_da_resposta(self, pagina: int, response: Any, info: Dict[str, Any]) -> Dict[str, Any]:
+        with metricas.cronometrar('interpretacao'):
+            dados = self._dados_da_resposta(response)
+        if isinstance(dados, list):
+            dados = dados[0] if dados else {}
+        return {'pagina': pagina, 'dados': dados, 'info': info}
+    
+    def _notas_do_documento(self, response: Any, info: Dict[str, Any], total: int) -> List[NotaFiscal]:
+        """
+        Notas da resposta à estratégia pdf com várias páginas (lista de notas)
+        As páginas de cada nota vêm do modelo; sem elas (ou fora do documento), a nota fica
+        com todas as páginas enviadas
+        """
+        enviadas = list(range(1, total + 1))
+        with metricas.cronometrar('interpretacao'):
+            dados = self._dados_da_resposta(response)
+            notas = []
+            for item in (dados if isinstance(dados, list) else [dados]):
+                nota = nota_de_resposta(item)
+                for campo, valor in info.items():
+                    setattr(nota, campo, valor)
+                nota.paginas = _paginas_informadas(item, total) or enviadas
+                notas.append(nota)
+        return notas or [NotaFiscal(paginas=enviadas)]
+    
+    @staticmethod
+    def _montar_notas(paginas: List[Dict[str, Any]]) -> List[NotaFiscal]:
+        """Agrupa as páginas em notas e mescla os dados parciais de cada uma"""
+        notas = []
+        for grupo in agrupar_paginas(paginas):
+            com_dados = [pagina for pagina in grupo if pagina.get('dados')]
+            if com_dados:
+                nota = nota_de_resposta(mesclar_dados([pagina['dados'] for pagina in com_dados]))
+            else:
+                nota = NotaFiscal()
             
-            # Extrai JSON da resposta
-            resposta_texto = response.content[0].text
-            
-            # Limpa a resposta para pegar apenas o JSON
-            inicio = resposta_texto.find('{')
-            fim = resposta_texto.rfind('}') + 1
-            json_str = resposta_texto[inicio:fim]
-            
-            # Parse do JSON
-            dados = json.loads(json_str)
-            
-            # Converte para NotaFiscal
-            nota = NotaFiscal()
-            dados_trib = DadosTributarios()
-            
-            # Dados básicos
-            nota.numero = str(dados.get('numero', 'DESCONHECIDO'))
-            nota.data_emissao = dados.get('data_emissao', 'DESCONHECIDO')
-            nota.vencimento = dados.get('vencimento')
-            nota.codigo_verificacao = dados.get('codigo_verificacao')
-            nota.municipio = dados.get('municipio', 'DESCONHECIDO')
-            nota.estado = dados.get('estado', 'DESCONHECIDO')
-            nota.discriminacao = dados.get('discriminacao')
-            
-            # Prestador
-            if dados.get('prestador'):
-                nota.prestador = dados['prestador'].get('nome', 'DESCONHECIDO')
-                nota.prestador_cnpj = dados['prestador'].get('cnpj')
-            
-            # Tomador
-            if dados.get('tomador'):
-                nota.tomador = dados['tomador'].get('nome', 'DESCONHECIDO')
-                nota.tomador_cnpj = dados['tomador'].get('cnpj')
-            
-            # Valores (trata vírgula como separador decimal)
-            def parse_decimal(value):
-                if value is None:
-                    return Decimal('0')
-                if isinstance(value, (int, float)):
-                    return Decimal(str(value))
-                if isinstance(value, str):
-                    # Remove espaços e substitui vírgula por ponto
-                    value = value.strip().replace(',', '.')
-                    try:
-                        return Decimal(value)
-                    except:
-                        return Decimal('0')
-                return Decimal('0')
-            
-            nota.valor_total = parse_decimal(dados.get('valor_total'))
-            nota.valor_servicos = parse_decimal(dados.get('valor_servicos'))
-            
-            # Impostos
-            if dados.get('impostos'):
-                impostos = dados['impostos']
-                
-                # ISS
-                if impostos.get('iss'):
-                    iss_data = impostos['iss']
-                    dados_trib.valor_iss = parse_decimal(iss_data.get('valor'))
-                    dados_trib.aliquota_iss = parse_decimal(iss_data.get('aliquota'))
-                    dados_trib.base_calculo = parse_decimal(iss_data.get('base_calculo'))
-                    dados_trib.tributado = dados_trib.valor_iss > 0
-                
-                # Retenções
-                if impostos.get('retencoes'):
-                    ret = impostos['retencoes']
-                    dados_trib.retencao_pis = parse_decimal(ret.get('pis')) if ret.get('pis') else None
-                    dados_trib.retencao_cofins = parse_decimal(ret.get('cofins')) if ret.get('cofins') else None
-                    dados_trib.retencao_csll = parse_decimal(ret.get('csll')) if ret.get('csll') else None
-                    dados_trib.retencao_irrf = parse_decimal(ret.get('irrf')) if ret.get('irrf') else None
-                    dados_trib.retencao_inss = parse_decimal(ret.get('inss')) if ret.get('inss') else None
-                    dados_trib.retencao_iss = parse_decimal(ret.get('iss_retido')) if ret.get('iss_retido') else None
-            
-            nota.dados_tributarios = dados_trib
-            nota.formato_detectado = f"NFS-e {nota.estado}" if nota.estado != "DESCONHECIDO" else "NFS-e"
-            
-            # Adiciona observações
-            if dados_trib.tributado:
-                dados_trib.observacoes.append(f"Tributado em {nota.municipio}")
-            
-            if dados_trib.total_retencoes() > 0:
-                total_ret = dados_trib.total_retencoes()
-                dados_trib.observacoes.append(f"Total de retenções: R$ {total_ret:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
+            por_texto = [pagina for pagina in com_dados if 'confianca' in pagina]
+            if com_dados and len(por_texto) == len(com_dados):
+                nota.metodo_extracao = por_texto[0]['metodo']
+                nota.formato_detectado = por_texto[0]['formato']
+                nota.confianca_extracao = min(pagina['confianca'] for pagina in por_texto)
+            elif not com_dados:
+                nota.metodo_extracao = grupo[0].get('metodo') or nota.metodo_extracao
+                nota.confianca_extracao = 0.0
             
+            infos = [pagina['info'] for pagina in grupo if pagina.get('info')]
+            if infos:
+                nota.estrategia_entrada = infos[0]['estrategia_entrada']
+                nota.bytes_payload = sum(info['bytes_payload'] for info in infos)
+                tempos = [info['ms_renderizacao'] for info in infos if info['ms_renderizacao'] is not None]
+                nota.ms_renderizacao = round(sum(tempos), 1) if tempos else None
+            nota.paginas = [pagina['pagina'] + 1 for pagina in grupo]
+            notas.append(nota)
+        return notas
+    
+    def analisar_em_lote(self, pdfs: List[EntradaPDF], usar_cache: bool = True, modo: Optional[str] = None,
+                         estrategia: Optional[str] = None, intervalo: Optional[float] = None,
+                         espera_maxima: Optional[float] = None) -> List[Union[List[NotaFiscal], ErroAnalise]]:
+        """
+        Analisa vários PDFs pela Message Batches API (ver lotes_api): metade do preço por
+        token e sem disputar os limites de messages.create, em troca de minutos a horas de espera
+        Camada de texto, cache e armazém são resolvidos antes; o que sobra (uma requisição por página,
+        ou por documento na estratégia pdf) vai em lotes e volta pelo custom_id
+        Retorna, na ordem de pdfs, as notas de cada documento (como analisar_documento)
+        ou a ErroAnalise do documento que falhou
+        intervalo: segundos entre consultas aos lotes (padrão: NF_LOTE_API_INTERVALO)
+        espera_maxima: tempo máximo aguardando os lotes (padrão: sem limite; a API expira em 24h)
+        Só no analisador síncrono (o cliente assíncrono não é usado aqui)
+        """
+        modo, estrategia = self._validar_opcoes(modo, estrategia)
+        if intervalo is None:
+            intervalo = float(os.getenv('NF_LOTE_API_INTERVALO', LOTE_API_INTERVALO_PADRAO))
+        
+        envio = EnvioLotes(self.client, self.agendador)
+        estados = []
+        for i, pdf in enumerate(pdfs):
+            nome = os.fspath(pdf) if isinstance(pdf, (str, os.PathLike)) else f"documento {i + 1}"
+            try:
+                with usar_documento(pdf) as documento:
+                    nome = documento.nome
+                    estados.append(self._preparar_para_lote(documento, f"d{i}", usar_cache, modo, estrategia, envio))
+            except Exception as e:
+                estados.append({'nome': nome, 'resultado': self._erro_analise(nome, e)})
+        
+        # custom_id -> estado do documento que espera a resposta
+        pendentes = {custom_id: estado for estado in estados for custom_id in estado.get('respostas', ())}
+        falha = None
+        try:
+            envio.enviar()
+            aguardar_lotes(self.client, self.agendador, envio.ids, intervalo, espera_maxima)
+            for custom_id, response, erro in resultados_lotes(self.client, self.agendador, envio.ids):
+                if custom_id in pendentes:
+                    pendentes[custom_id]['respostas'][custom_id] = (response, erro)
+        except Exception as e:
+            # Consulta ou resultados falharam: o que não voltou fica com este erro
+            falha = e
+        
+        for custom_id, estado in pendentes.items():
+            if estado['respostas'][custom_id] is None:
+                erro = envio.falhas.get(custom_id) or falha or ErroAPI("Requisição sem resultado no lote", temporario=True)
+                estado['respostas'][custom_id] = (None, erro)
+        return [self._concluir_do_lote(estado) for estado in estados]
+    
+    def _preparar_para_lote(self, documento: DocumentoPDF, custom_id: str, usar_cache: bool, modo: str,
+                            estrategia: str, envio: EnvioLotes) -> Dict[str, Any]:
+        """
+        Resolve o documento sem a API quando possível ('resultado'); senão adiciona as requisições
+        ao envio e devolve o estado que _concluir_do_lote completa com as respostas
+        """
+        total = self._total_paginas(documento)
+        if total <= 1:
+            nota, chave, _ = self._resolver_sem_api(documento, usar_cache, modo, estrategia)
+            if nota is not None:
+                nota.paginas = [1]
+                return {'nome': documento.nome, 'resultado': [nota]}
+            parametros, info = self.montar_requisicao(documento, estrategia)
+            envio.adicionar(custom_id, parametros)
+            return {'nome': documento.nome, 'sha256': documento.sha256, 'tipo': 'nota', 'chave': chave,
+                    'info': info, 'respostas': {custom_id: None}}
+        
+        chave, notas = self._documento_do_cache(documento, usar_cache, estrategia)
+        if notas is not None:
+            metricas.registrar_caminho('cache')
+            return {'nome': documento.nome, 'resultado': notas}
+        notas = self._notas_arquivadas(documento) if usar_cache else None
+        if notas is not None:
+            metricas.registrar_caminho('armazem')
+            return {'nome': documento.nome, 'resultado': notas}
+        
+        estado = {'nome': documento.nome, 'sha256': documento.sha256, 'tipo': 'paginas', 'chave': chave,
+                  'respostas': {}, 'paginas_lote': {}}
+        paginas = self._mapear_paginas(lambda i: self._pagina_por_texto(documento, i, modo), total)
+        if modo == 'texto':
+            paginas = [pagina or {'pagina': i, 'dados': None, 'metodo': "Texto do PDF (layout não reconhecido)"}
+                       for i, pagina in enumerate(paginas)]
+        elif estrategia == 'pdf' and any(pagina is None for pagina in paginas):
+            parametros, info = self.montar_requisicao(documento, estrategia, total_paginas=total)
+            envio.adicionar(custom_id, parametros)
+            estado.update(tipo='documento', info=info, total=total, respostas={custom_id: None})
+        else:
+            for i, pagina in enumerate(paginas):
+                if pagina is None:
+                    parametros, info = self.montar_requisicao(documento, estrategia, i, total)
+                    envio.adicionar(f"{custom_id}-p{i}", parametros)
+                    estado['respostas'][f"{custom_id}-p{i}"] = None
+                    estado['paginas_lote'][f"{custom_id}-p{i}"] = (i, info)
+        estado['paginas'] = paginas
+        return estado
+    
+    def _concluir_do_lote(self, estado: Dict[str, Any]) -> Union[List[NotaFiscal], ErroAnalise]:
+        """Notas do documento a partir das respostas do lote (ou a ErroAnalise da falha)"""
+        if 'resultado' in estado:
+            return estado['resultado']
+        nome = estado['nome']
+        
+        if estado['tipo'] != 'paginas':
+            response, erro = next(iter(estado['respostas'].values()))
+            try:
+                if erro is not None:
+                    raise erro
+                metricas.registrar_uso(response)
+                if estado['tipo'] == 'nota':
+                    nota = self.interpretar_resposta(response, estado['info'])
+                    nota.paginas = [1]
+                    notas = [nota]
+                else:
+                    notas = self._notas_do_documento(response, estado['info'], estado['total'])
+            except Exception as e:
+                return self._erro_analise(nome, e)
+            metricas.registrar_caminho('claude')
+            if estado['tipo'] == 'nota':
+                self._guardar_no_cache(estado['chave'], notas[0])
+            else:
+                self._guardar_documento(estado['chave'], notas)
+            self._arquivar(estado['sha256'], nome, notas)
+            return notas
+        
+        paginas = estado['paginas']
+        for custom_id, (i, info) in estado['paginas_lote'].items():
+            response, erro = estado['respostas'][custom_id]
+            if erro is None:
+                metricas.registrar_uso(response)
+                try:
+                    paginas[i] = self._pagina_da_resposta(i, response, info)
+                    continue
+                except Exception as e:
+                    erro = e
+            paginas[i] = {'pagina': i, 'dados': None, 'erro': erro}
+        try:
+            self._verificar_paginas(nome, paginas)
+        except ErroAnalise as e:
+            return e
+        notas = self._montar_notas(paginas)
+        metricas.registrar_caminho(self._caminho_das_paginas(paginas))
+        self._guardar_documento(estado['chave'], notas)
+        self._arquivar(estado['sha256'], nome, notas)
+        return notas
+
+class AsyncAnalisadorClaudeAPI(AnalisadorClaudeAPI):
+    """
+    Versão asyncio do analisador, sobre anthropic.AsyncAnthropic
+    Renderização, camada de texto e cache (bloqueantes) rodam no executor;
+    a chamada à API fica no event loop, então um único processo mantém
+    dezenas de notas em andamento. Devolve a mesma NotaFiscal do síncrono.
+    """
+    
+    def __init__(self, api_key: Optional[str] = None, cache: Any = AnalisadorClaudeAPI._SEM_CACHE,
+                 client: Any = None, executor: Optional[Executor] = None, **opcoes):
+        """
+        client: AsyncAnthropic já criado (padrão: criar_cliente_anthropic(assincrono=True))
+        executor: onde rodar as etapas bloqueantes (padrão: executor padrão do event loop)
+        Demais opções iguais às do AnalisadorClaudeAPI
+        """
+        api_key = api_key or os.getenv('ANTHROPIC_API_KEY')
+        if client is None:
+            client = criar_cliente_anthropic(api_key, assincrono=True)
+        super().__init__(api_key=api_key, cache=cache, client=client, **opcoes)
+        self.executor = executor
+    
+    async def _no_executor(self, funcao, *args):
+        loop = asyncio.get_running_loop()
+        # run_in_executor não repassa o contexto (métricas da requisição) como asyncio.to_thread
+        contexto = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(contexto.run, funcao, *args))
+    
+    async def _chamar_api_async(self, parametros: Dict[str, Any]) -> Any:
+        """Versão assíncrona de _chamar_api (a espera na fila não bloqueia o loop)"""
+        async def chamar():
+            with metricas.medir_chamada_api():
+                return await self.client.messages.create(**parametros)
+        
+        response = await self.agendador.executar_async(chamar, estimar_tokens(parametros))
+        metricas.registrar_uso(response)
+        return response
+    
+    async def analisar(self, pdf: EntradaPDF, usar_cache: bool = True, modo: Optional[str] = None,
+                       estrategia: Optional[str] = None) -> NotaFiscal:
+        """Mesmo contrato de AnalisadorClaudeAPI.analisar, como corrotina"""
+        with usar_documento(pdf) as documento:
+            return await self._analisar_async(documento, usar_cache, modo, estrategia)
+    
+    async def _analisar_async(self, documento: DocumentoPDF, usar_cache: bool, modo: Optional[str],
+                              estrategia: Optional[str]) -> NotaFiscal:
+        nota, chave, estrategia = await self._no_executor(
+            self._resolver_sem_api, documento, usar_cache, modo, estrategia
+        )
+        if nota is not None:
             return nota
-            
+        
+        try:
+            parametros, info = await self._no_executor(self.montar_requisicao, documento, estrategia)
+            response = await self._chamar_api_async(parametros)
+            nota = self.interpretar_resposta(response, info)
         except Exception as e:
-            print(f"Erro ao analisar com Claude API: {e}")
-            # Retorna nota vazia em caso de erro
-            return NotaFiscal()
+            raise self._erro_analise(documento.nome, e) from e
+        
+        metricas.registrar_caminho('claude')
+        if chave is not None:
+            await self._no_executor(self._guardar_no_cache, chave, nota)
+        await self._no_executor(self._arquivar, documento.sha256, documento.nome, [nota])
+        return nota
+    
+    async def analisar_documento(self, pdf: EntradaPDF, usar_cache: bool = True, modo: Optional[str] = None,
+                                 estrategia: Optional[str] = None) -> List[NotaFiscal]:
+        """Mesmo contrato de AnalisadorClaudeAPI.analisar_documento, como corrotina"""
+        with usar_documento(pdf) as documento:
+            return await self._analisar_documento_async(documento, usar_cache, modo, estrategia)
+    
+    async def _analisar_documento_async(self, documento: DocumentoPDF, usar_cache: bool, modo: Optional[str],
+                                        estrategia: Optional[str]) -> List[NotaFiscal]:
+        total = await self._no_executor(self._total_paginas, documento)
+        if total <= 1:
+            nota = await self.analisar(documento, usar_cache=usar_cache, modo=modo, estrategia=estrategia)
+            nota.paginas = [1]
+            return [nota]
+        
+        modo, estrategia = self._validar_opcoes(modo, estrategia)
+        chave, notas = await self._no_executor(self._documento_do_cache, documento, usar_cache, estrategia)
+        if notas is not None:
+            metricas.registrar_caminho('cache')
+            return notas
+        notas = await self._no_executor(self._notas_arquivadas, documento) if usar_cache else None
+        if notas is not None:
+            metricas.registrar_caminho('armazem')
+            return notas
+        
+        semaforo = asyncio.Semaphore(self.paginas_concorrencia)
+        
+        async def analisar_pagina(pagina):
+            async with semaforo:
+                resultado = await self._no_executor(self._pagina_por_texto, documento, pagina, modo)
+                if resultado is not None or modo == 'texto' or estrategia == 'pdf':
+                    return resultado or {'pagina': pagina, 'dados': None,
+                                         'metodo': "Texto do PDF (layout não reconhecido)"}
+                try:
+                    parametros, info = await self._no_executor(
+                        self.montar_requisicao, documento, estrategia, pagina, total
+                    )
+                    return self._pagina_da_resposta(pagina, await self._chamar_api_async(parametros), info)
+                except Exception as e:
+                    return {'pagina': pagina, 'dados': None, 'erro': e}
+        
+        paginas = list(await asyncio.gather(*(analisar_pagina(i) for i in range(total))))
+        
+        if estrategia == 'pdf' and modo != 'texto' and any('confianca' not in pagina for pagina in paginas):
+            # O PDF vai inteiro em uma chamada, a menos que a camada de texto resolva todas as páginas
+            try:
+                parametros, info = await self._no_executor(self.montar_requisicao, documento, estrategia, 0, total)
+                notas = self._notas_do_documento(await self._chamar_api_async(parametros), info, total)
+            except Exception as e:
+                raise self._erro_analise(documento.nome, e) from e
+            metricas.registrar_caminho('claude')
+        else:
+            self._verificar_paginas(documento.nome, paginas)
+            notas = self._montar_notas(paginas)
+            metricas.registrar_caminho(self._caminho_das_paginas(paginas))
+        
+        await self._no_executor(self._guardar_documento, chave, notas)
+        await self._no_executor(self._arquivar, documento.sha256, documento.nome, notas)
+        return notas
+    
+    async def analisar_varios(self, pdfs: List[EntradaPDF], concorrencia: int = 20,
+                              **opcoes) -> List[Union[NotaFiscal, ErroAnalise]]:
+        """
+        Analisa vários PDFs com até `concorrencia` em andamento; mantém a ordem de entrada
+        Um PDF que falhou ocupa sua posição com a ErroAnalise, sem interromper os demais
+        """
+        semaforo = asyncio.Semaphore(concorrencia)
+        
+        async def analisar_um(pdf):
+            async with semaforo:
+                try:
+                    return await self.analisar(pdf, **opcoes)
+                except ErroAnalise as e:
+                    return e
+        
+        return list(await asyncio.gather(*(analisar_um(p) for p in pdfs)))
+    
+    async def fechar(self):
+        """Fecha o pool HTTP do cliente assíncrono"""
+        fechar = getattr(self.client, 'close', None)
+        if fechar:
+            await fechar()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.fechar()
+
+# Registro de analisadores compartilhados pelo processo
+_analisadores: Dict[tuple, AnalisadorClaudeAPI] = {}
+_analisadores_lock = threading.Lock()
+
+def obter_analisador(api_key: Optional[str] = None, **opcoes) -> AnalisadorClaudeAPI:
+    """
+    Retorna o analisador do processo para a chave/opções informadas, criando-o no primeiro uso
+    O cliente (e seu pool de conexões/sessões TLS) é reaproveitado entre requisições e threads
+    """
+    chave = (api_key or os.getenv('ANTHROPIC_API_KEY'), tuple(sorted(opcoes.items())))
+    with _analisadores_lock:
+        analisador = _analisadores.get(chave)
+        if analisador is None:
+            analisador = AnalisadorClaudeAPI(api_key=api_key, **opcoes)
+            _analisadores[chave] = analisador
+        return analisador
+
+def registrar_analisador(analisador: AnalisadorClaudeAPI, api_key: Optional[str] = None, **opcoes):
+    """Substitui o analisador do registro (ex: cliente falso em testes e benchmarks)"""
+    chave = (api_key or os.getenv('ANTHROPIC_API_KEY'), tuple(sorted(opcoes.items())))
+    with _analisadores_lock:
+        _analisadores[chave] = analisador
+
+def limpar_analisadores():
+    """Fecha os clientes e esvazia o registro"""
+    with _analisadores_lock:
+        for analisador in _analisadores.values():
+            fechar = getattr(analisador.client, 'close', None)
+            if fechar:
+                fechar()
+        _analisadores.clear()
+
+# Event loop do processo para o analisador assíncrono: o AsyncAnthropic (e seu pool)
+# fica preso ao loop em que é usado, então todas as chamadas passam por este
+_loop_async: Optional[asyncio.AbstractEventLoop] = None
+_loop_async_lock = threading.Lock()
+_analisadores_async: Dict[tuple, AsyncAnalisadorClaudeAPI] = {}
+
+def _obter_loop_async() -> asyncio.AbstractEventLoop:
+    """Cria, no primeiro uso (após o fork do gunicorn), o loop em uma thread dedicada"""
+    global _loop_async
+    with _loop_async_lock:
+        if _loop_async is None or _loop_async.is_closed():
+            _loop_async = asyncio.new_event_loop()
+            threading.Thread(target=_loop_async.run_forever, name='analisador-async', daemon=True).start()
+        return _loop_async
+
+def executar_async(corrotina) -> Future:
+    """
+    Agenda a corrotina no loop do processo; devolve concurrent.futures.Future
+    Em código síncrono: .result(); em outro event loop: await asyncio.wrap_future(...)
+    A corrotina enxerga as variáveis de contexto de quem a agendou (métricas da requisição)
+    """
+    return asyncio.run_coroutine_threadsafe(
+        metricas.com_contexto(corrotina, metricas.valores_contexto()), _obter_loop_async()
+    )
+
+def obter_analisador_async(api_key: Optional[str] = None, **opcoes) -> AsyncAnalisadorClaudeAPI:
+    """
+    Analisador assíncrono do processo, equivalente a obter_analisador()
+    Use-o apenas via executar_async (o cliente pertence ao loop do processo)
+    """
+    chave = (api_key or os.getenv('ANTHROPIC_API_KEY'), tuple(sorted(opcoes.items())))
+    with _loop_async_lock:
+        analisador = _analisadores_async.get(chave)
+        if analisador is None:
+            analisador = AsyncAnalisadorClaudeAPI(api_key=api_key, **opcoes)
+            _analisadores_async[chave] = analisador
+        return analisador
+
+def limpar_analisadores_async():
+    """Fecha os clientes assíncronos no loop do processo e esvazia o registro"""
+    with _loop_async_lock:
+        analisadores = list(_analisadores_async.values())
+        _analisadores_async.clear()
+        loop = _loop_async
+    if loop is not None and not loop.is_closed():
+        for analisador in analisadores:
+            asyncio.run_coroutine_threadsafe(analisador.fechar(), loop).result()
 
 # Função auxiliar para formatação
 def formatar_valor(valor):
@@ -331,4 +1440,10 @@ def formatar_valor(valor):
     return f"R$ {valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
 
 # Alias para compatibilidade
-AnalisadorClaudeAPI = AnalisadorClaudeAPI
\ No newline at end of file
+AnalisadorClaudeAPI = AnalisadorClaudeAPI
+
+if __name__ == '__main__':
+    # python -m analisador_claude_api analyze DIR ... (ver linha_comando.py)
+    import sys
+    from linha_comando import main
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Registro dos analisadores de NFS-e (backends)
+O backend é escolhido uma vez por processo pela configuração e o módulo só é importado
+no primeiro uso: importar app.py não carrega anthropic, httpx, pypdfium2, PIL nem pdfplumber.
+
+NF_ANALISADOR: claude_api, claude_ia, visual_ia, basico ou auto (padrão: o primeiro
+disponível, na ordem de BACKENDS)
+
+aquecer() faz antes da primeira requisição o que ela faria na hora: importa as dependências,
+cria o cliente da API, abre cache e armazém e sobe o pool de renderização (ver gunicorn.conf.py)
+
+Uso:
+    import analisadores
+    analisador = analisadores.obter_analisador()
+    formatar_valor = analisadores.carregar().formatar_valor
+"""
+
+import os
+import time
+import importlib
+import importlib.util
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from armazem_notas import obter_armazem
+from cache_resultados import obter_cache_padrao
+from renderizador import obter_renderizador
+
+ANALISADOR_PADRAO = 'auto'
+
+# Bibliotecas importadas por importar_dependencias() (as que estiverem instaladas)
+DEPENDENCIAS_PESADAS = ('anthropic', 'httpx', 'pypdfium2', 'PIL.Image', 'PIL.ImageOps', 'pdfplumber')
+
+
+@dataclass(frozen=True)
+class Backend:
+    """Analisador registrado: módulo, classe e dependências (verificadas sem importar)"""
+    nome: str
+    modulo: str
+    classe: str
+    descricao: str
+    dependencias: Tuple[str, ...] = ()
+
+    def disponivel(self) -> bool:
+        return all(importlib.util.find_spec(nome) is not None for nome in (self.modulo, *self.dependencias))
+
+
+# Em ordem de preferência (é a ordem do modo auto)
+BACKENDS: Dict[str, Backend] = {backend.nome: backend for backend in (
+    Backend('claude_api', 'analisador_claude_api', 'AnalisadorClaudeAPI',
+            "✅ Usando Claude API - 100% de precisão!", ('anthropic', 'httpx')),
+    Backend('claude_ia', 'analisador_claude_ia', 'AnalisadorClaudeIA',
+            "📊 Usando analisador local - ~70% de precisão"),
+    Backend('visual_ia', 'analisador_visual_ia', 'AnalisadorVisualIA',
+            "🔍 Usando analisador visual - ~60% de precisão"),
+    Backend('basico', 'analisador_ai', 'AnalisadorAI',
+            "⚠️ Usando analisador básico - precisão limitada"),
+)}
+
+
+@dataclass(frozen=True)
+class AnalisadorCarregado:
+    """Backend importado, com o mesmo contrato para todos os módulos"""
+    backend: Backend
+    classe: type
+    formatar_valor: Callable[[Any], str]
+    obter_analisador: Callable[..., Any]
+    # Versão assíncrona só existe no analisador da Claude API
+    obter_analisador_async: Optional[Callable[..., Any]] = None
+    executar_async: Optional[Callable[[Any], Any]] = None
+
+
+def candidatos(nome: Optional[str] = None) -> List[Backend]:
+    """
+    Backends a tentar, em ordem: o configurado (nome ou NF_ANALISADOR) ou, no modo auto,
+    os que têm módulo e dependências instalados
+    Levanta ValueError para nome desconhecido e ImportError se nenhum estiver disponível
+    """
+    nome = (nome or os.getenv('NF_ANALISADOR') or ANALISADOR_PADRAO).strip().lower()
+    if nome == 'auto':
+        backends = [backend for backend in BACKENDS.values() if backend.disponivel()]
+        if not backends:
+            raise ImportError("Nenhum analisador disponível (instale as dependências: pip install -r requirements.txt)")
+        return backends
+    backend = BACKENDS.get(nome)
+    if backend is None:
+        raise ValueError(f"Analisador inválido: {nome} (use auto, {', '.join(BACKENDS)})")
+    if not backend.disponivel():
+        faltando = [modulo for modulo in (backend.modulo, *backend.dependencias)
+                    if importlib.util.find_spec(modulo) is None]
+        raise ImportError(f"Analisador {nome} indisponível: módulo(s) {', '.join(faltando)} não encontrado(s)")
+    return [backend]
+
+
+def _importar(backend: Backend) -> AnalisadorCarregado:
+    modulo = importlib.import_module(backend.modulo)
+    classe = getattr(modulo, backend.classe)
+    return AnalisadorCarregado(
+        backend=backend, classe=classe, formatar_valor=modulo.formatar_valor,
+        # Módulos sem registro de instâncias: um analisador novo por chamada
+        obter_analisador=getattr(modulo, 'obter_analisador', classe),
+        obter_analisador_async=getattr(modulo, 'obter_analisador_async', None),
+        executar_async=getattr(modulo, 'executar_async', None),
+    )
+
+
+# Backend do processo
+_carregado: Optional[AnalisadorCarregado] = None
+_carregado_lock = threading.Lock()
+
+
+def carregar() -> AnalisadorCarregado:
+    """Backend do processo: escolhido e importado no primeiro uso, reaproveitado depois"""
+    global _carregado
+    if _carregado is not None:
+        return _carregado
+    with _carregado_lock:
+        if _carregado is None:
+            backends = candidatos()
+            for backend in backends:
+                inicio = time.perf_counter()
+                try:
+                    _carregado = _importar(backend)
+                except ImportError as e:
+                    print(f"⚠️ Analisador {backend.nome} não disponível: {e}")
+                    if backend is backends[-1]:
+                        raise
+                    continue
+                print(f"{backend.descricao} ({backend.nome}, {(time.perf_counter() - inicio) * 1000:.0f} ms)")
+                break
+        return _carregado
+
+
+def obter_analisador(*args, **opcoes):
+    """Analisador do backend configurado (ver carregar)"""
+    return carregar().obter_analisador(*args, **opcoes)
+
+
+def importar_dependencias() -> Dict[str, float]:
+    """
+    Importa as DEPENDENCIAS_PESADAS instaladas; devolve ms por módulo
+    Só importa: seguro antes do fork (preload_app do gunicorn), as páginas ficam compartilhadas
+    """
+    tempos = {}
+    for nome in DEPENDENCIAS_PESADAS:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(nome)
+        except ImportError:
+            continue
+        tempos[nome] = round((time.perf_counter() - inicio) * 1000, 1)
+    return tempos
+
+
+def aquecer() -> Dict[str, float]:
+    """
+    Prepara o processo para a primeira requisição; devolve ms por etapa
+    Cria conexões, threads e processos: chame depois do fork (post_fork do gunicorn)
+    Uma etapa que falha (ex: sem ANTHROPIC_API_KEY) fica para a primeira requisição
+    """
+    etapas = {}
+    for etapa, funcao in (
+        ('dependencias', importar_dependencias),
+        ('analisador', obter_analisador),
+        ('cache', obter_cache_padrao),
+        ('armazem', obter_armazem),
+        ('renderizador', lambda: obter_renderizador().aquecer()),
+    ):
+        inicio = time.perf_counter()
+        try:
+            funcao()
+        except Exception as e:
+            print(f"⚠️ Aquecimento ({etapa}) falhou: {e}")
+        etapas[etapa] = round((time.perf_counter() - inicio) * 1000, 1)
+    print(f"🔥 Processo {os.getpid()} aquecido em {sum(etapas.values()):.0f} ms: "
+          + ', '.join(f"{etapa} {ms:.0f}" for etapa, ms in etapas.items()))
+    return etapas
@@ -3,45 +3,63 @@ Aplicação Flask para análise de Notas Fiscais
 Interface web para upload e análise de NFS-e
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
-from werkzeug.utils import secure_filename
+from flask import Flask, Request, render_template, request, jsonify, send_file, Response, stream_with_context, g
+import io
 import os
+import math
+import itertools
+import asyncio
+import contextvars
 from pathlib import Path
 import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente do .env
 load_dotenv()
-try:
-    # Tenta usar Claude API primeiro - 100% de precisão!
-    from analisador_claude_api import AnalisadorClaudeAPI as AnalisadorAI, formatar_valor
-    print("✅ Usando Claude API - 100% de precisão!")
-except (ImportError, ValueError) as e:
-    print(f"⚠️ Claude API não disponível: {e}")
-    try:
-        # Fallback para o analisador Claude IA local
-        from analisador_claude_ia import AnalisadorClaudeIA as AnalisadorAI, formatar_valor
-        print("📊 Usando analisador local - ~70% de precisão")
-    except ImportError:
-        try:
-            # Fallback para o analisador visual IA
-            from analisador_visual_ia import AnalisadorVisualIA as AnalisadorAI, formatar_valor
-            print("🔍 Usando analisador visual - ~60% de precisão")
-        except ImportError:
-            # Fallback final
-            from analisador_ai import AnalisadorAI, formatar_valor
-            print("⚠️ Usando analisador básico - precisão limitada")
-from datetime import datetime
+# O analisador (NF_ANALISADOR) e suas dependências pesadas só são importados no primeiro uso
+import analisadores
+from analisadores import obter_analisador
+import metricas
+from agendador import PRIORIDADE_LOTE, obter_agendador, prioridade
+from documento_pdf import DocumentoPDF, abrir_documento, usar_documento
+from cache_resultados import obter_cache_padrao
+from armazem_notas import POR_PAGINA_PADRAO, obter_armazem
+import relatorios
+from renderizador import obter_renderizador
+from fila_jobs import obter_fila, CONCLUIDO, ERRO
 import json
 from decimal import Decimal
 
+# Uploads até NF_UPLOAD_MEMORIA_KB ficam em memória; maiores são gravados em partes em
+# um arquivo temporário privado (apagado ao fim da requisição) e lidos por mmap
+MAX_TAMANHO_ARQUIVO = int(os.getenv('NF_ARQUIVO_MAX_MB', 64)) * 1024 * 1024
+UPLOAD_MEMORIA_MAX = int(os.getenv('NF_UPLOAD_MEMORIA_KB', 1024)) * 1024
+
+
+class RequisicaoUpload(Request):
+    """Request do Flask que escolhe onde o upload é recebido (ver UPLOAD_MEMORIA_MAX)"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length <= UPLOAD_MEMORIA_MAX:
+            return io.BytesIO()
+        return tempfile.NamedTemporaryFile(prefix='nf_upload_', suffix='.pdf')
+
+
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+app.request_class = RequisicaoUpload
+LOTE_MAX_BYTES = int(os.getenv('NF_LOTE_MAX_MB', 200)) * 1024 * 1024  # limite do envio em lote
+app.config['MAX_CONTENT_LENGTH'] = max(LOTE_MAX_BYTES, MAX_TAMANHO_ARQUIVO)
 app.config['UPLOAD_EXTENSIONS'] = ['.pdf']
 
-# Criar diretório temporário para uploads se não existir
-UPLOAD_FOLDER = Path(tempfile.gettempdir()) / 'nf_analyzer'
-UPLOAD_FOLDER.mkdir(exist_ok=True)
+# Análise em lote: o pool é compartilhado por todas as requisições do processo,
+# então NF_LOTE_CONCORRENCIA limita as chamadas simultâneas à API por worker
+LOTE_CONCORRENCIA = int(os.getenv('NF_LOTE_CONCORRENCIA', 4))
+LOTE_MAX_ARQUIVOS = int(os.getenv('NF_LOTE_MAX_ARQUIVOS', 500))
+_pool_lote = None
+_pool_lote_lock = threading.Lock()
 
 class DecimalEncoder(json.JSONEncoder):
     """Encoder JSON customizado para lidar com Decimal"""
@@ -50,10 +68,111 @@ class DecimalEncoder(json.JSONEncoder):
             return float(o)
         return super(DecimalEncoder, self).default(o)
 
+def montar_dados_nota(nota) -> dict:
+    """Converte NotaFiscal no dicionário retornado pela API"""
+    formatar_valor = analisadores.carregar().formatar_valor
+    tributos = nota.dados_tributarios
+    irrf = formatar_valor(tributos.retencao_irrf)
+    dados = {
+        # Informações gerais
+        'numero': nota.numero,
+        'estado': nota.estado,
+        'municipio': nota.municipio,
+        'tipo_nf': nota.tipo_nf,
+        'data_emissao': nota.data_emissao,
+        'vencimento': nota.vencimento or 'Não informado',
+        'codigo_verificacao': nota.codigo_verificacao or 'Não informado',
+        
+        # Partes
+        'prestador': nota.prestador,
+        'tomador': nota.tomador,
+        
+        # Valores
+        'valor_total': formatar_valor(nota.valor_total),
+        'valor_total_raw': float(nota.valor_total),
+        
+        # Tributação
+        'tributado': tributos.tributado,
+        'valor_iss': formatar_valor(tributos.valor_iss),
+        'valor_iss_raw': float(tributos.valor_iss) if tributos.valor_iss else 0,
+        'aliquota_iss': float(tributos.aliquota_iss) if tributos.aliquota_iss else 0,
+        
+        # Retenções
+        'retencoes': {
+            'iss': formatar_valor(tributos.retencao_iss),
+            'pis': formatar_valor(tributos.retencao_pis),
+            'cofins': formatar_valor(tributos.retencao_cofins),
+            'csll': formatar_valor(tributos.retencao_csll),
+            'inss': formatar_valor(tributos.retencao_inss),
+            'ir': irrf,
+            'irrf': irrf,
+        },
+        
+        # Informações adicionais
+        'confianca_extracao': nota.confianca_extracao,
+        'metodo_extracao': nota.metodo_extracao,
+        'estrategia_entrada': nota.estrategia_entrada,
+        'bytes_payload': nota.bytes_payload,
+        'ms_renderizacao': nota.ms_renderizacao,
+        'paginas': getattr(nota, 'paginas', []),
+        'formato_detectado': nota.formato_detectado,
+        
+        # Observações
+        'observacoes': tributos.observacoes
+    }
+    
+    # Identificar estado para bandeira
+    estado_sigla = nota.estado.upper() if nota.estado not in ['DESCONHECIDO', 'ERRO_LEITURA'] else ''
+    dados['estado_sigla'] = estado_sigla
+    
+    # Adicionar informações extras se disponíveis
+    if tributos.codigo_servico:
+        dados['codigo_servico'] = tributos.codigo_servico
+    if tributos.base_calculo:
+        dados['base_calculo'] = formatar_valor(tributos.base_calculo)
+    if hasattr(nota, 'dados_bancarios') and nota.dados_bancarios:
+        dados['dados_bancarios'] = nota.dados_bancarios
+    
+    return dados
+
+def analisar_notas(analisador, pdf, **opcoes) -> list:
+    """
+    Todas as notas do PDF (caminho, bytes, upload ou DocumentoPDF)
+    Analisadores sem analisar_documento só leem a primeira página e só aceitam caminho
+    """
+    if hasattr(analisador, 'analisar_documento'):
+        return analisador.analisar_documento(pdf, **opcoes)
+    if isinstance(pdf, (str, Path)):
+        return [analisador.analisar(str(pdf), **opcoes)]
+    with tempfile.NamedTemporaryFile(prefix='nf_upload_', suffix='.pdf') as temporario, \
+            usar_documento(pdf) as documento:
+        temporario.write(documento.dados)
+        temporario.flush()
+        return [analisador.analisar(temporario.name, **opcoes)]
+
+def responder_erro_analise(e: Exception):
+    """
+    Resposta de erro da análise: falhas temporárias da API (limite de taxa, sobrecarga, rede)
+    viram 503 com Retry-After, para o cliente tentar de novo; as demais, 500
+    """
+    corpo = {'success': False, 'error': f'Erro ao processar arquivo: {str(e)}'}
+    if not getattr(e, 'temporario', False):
+        return jsonify(corpo), 500
+    resposta = jsonify({**corpo, 'temporario': True})
+    resposta.status_code = 503
+    if getattr(e, 'retry_after', None):
+        resposta.headers['Retry-After'] = str(math.ceil(e.retry_after))
+    return resposta
+
+def montar_resposta_notas(notas: list) -> dict:
+    """'data' traz a primeira nota (formato anterior); 'notas' traz todas as notas do PDF"""
+    dados = [montar_dados_nota(nota) for nota in notas]
+    return {'data': dados[0], 'notas': dados, 'total_notas': len(dados)}
+
 @app.route('/')
 def index():
     """Página principal com formulário de upload"""
-    return render_template('index.html')
+    return render_template('index.html', max_mb=MAX_TAMANHO_ARQUIVO // (1024 * 1024))
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
@@ -73,88 +192,436 @@ def analyze():
         if not file.filename.lower().endswith('.pdf'):
             return jsonify({'error': 'Apenas arquivos PDF são aceitos'}), 400
         
-        # Salvar arquivo temporariamente
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        temp_path = UPLOAD_FOLDER / f"{timestamp}_{filename}"
-        file.save(str(temp_path))
+        # sem_cache=1 força nova extração mesmo que o PDF já tenha sido analisado
+        sem_cache = request.values.get('sem_cache', '').lower() in ('1', 'true', 'sim')
+        # modo=auto|texto|claude escolhe o método de extração nesta requisição
+        modo = request.values.get('modo') or None
+        # estrategia=imagem|imagem_compacta|pdf|texto escolhe como a nota é enviada ao modelo
+        estrategia = request.values.get('estrategia') or None
         
-        try:
-            # Analisar PDF com analisador AI
-            analisador = AnalisadorAI()
-            nota = analisador.analisar(str(temp_path))
-            
-            # Preparar resposta
-            resultado = {
-                'success': True,
-                'data': {
-                    # Informações gerais
-                    'numero': nota.numero,
-                    'estado': nota.estado,
-                    'municipio': nota.municipio,
-                    'tipo_nf': nota.tipo_nf,
-                    'data_emissao': nota.data_emissao,
-                    'vencimento': nota.vencimento or 'Não informado',
-                    'codigo_verificacao': nota.codigo_verificacao or 'Não informado',
-                    
-                    # Partes
-                    'prestador': nota.prestador,
-                    'tomador': nota.tomador,
-                    
-                    # Valores
-                    'valor_total': formatar_valor(nota.valor_total),
-                    'valor_total_raw': float(nota.valor_total),
-                    
-                    # Tributação
-                    'tributado': nota.dados_tributarios.tributado,
-                    'valor_iss': formatar_valor(nota.dados_tributarios.valor_iss),
-                    'valor_iss_raw': float(nota.dados_tributarios.valor_iss) if nota.dados_tributarios.valor_iss else 0,
-                    'aliquota_iss': float(nota.dados_tributarios.aliquota_iss) if nota.dados_tributarios.aliquota_iss else 0,
-                    
-                    # Retenções
-                    'retencoes': {
-                        'iss': formatar_valor(nota.dados_tributarios.retencao_iss),
-                        'pis': formatar_valor(nota.dados_tributarios.retencao_pis),
-                        'cofins': formatar_valor(nota.dados_tributarios.retencao_cofins),
-                        'csll': formatar_valor(nota.dados_tributarios.retencao_csll),
-                        'inss': formatar_valor(nota.dados_tributarios.retencao_inss),
-                        'ir': formatar_valor(nota.dados_tributarios.retencao_irrf),
-                        'irrf': formatar_valor(nota.dados_tributarios.retencao_irrf),
-                    },
-                    
-                    # Informações adicionais
-                    'confianca_extracao': nota.confianca_extracao,
-                    'formato_detectado': nota.formato_detectado,
-                    
-                    # Observações
-                    'observacoes': nota.dados_tributarios.observacoes
-                }
-            }
-            
-            # Identificar estado para bandeira
-            estado_sigla = nota.estado.upper() if nota.estado not in ['DESCONHECIDO', 'ERRO_LEITURA'] else ''
-            resultado['data']['estado_sigla'] = estado_sigla
-            
-            # Adicionar informações extras se disponíveis
-            if nota.dados_tributarios.codigo_servico:
-                resultado['data']['codigo_servico'] = nota.dados_tributarios.codigo_servico
-            if nota.dados_tributarios.base_calculo:
-                resultado['data']['base_calculo'] = formatar_valor(nota.dados_tributarios.base_calculo)
-            if hasattr(nota, 'dados_bancarios') and nota.dados_bancarios:
-                resultado['data']['dados_bancarios'] = nota.dados_bancarios
-            
-            return jsonify(resultado)
-            
-        finally:
-            # Limpar arquivo temporário
-            if temp_path.exists():
-                temp_path.unlink()
+        # O upload vai direto ao analisador (memória ou mmap do arquivo recebido), sem cópia em disco
+        analisador = obter_analisador()
+        notas = analisar_notas(analisador, file, usar_cache=not sem_cache, modo=modo, estrategia=estrategia)
+        
+        # Preparar resposta
+        resultado = {
+            'success': True,
+            **montar_resposta_notas(notas)
+        }
+        
+        return jsonify(resultado)
     
     except Exception as e:
+        return responder_erro_analise(e)
+
+@app.route('/analyze/async', methods=['POST'])
+async def analyze_async():
+    """
+    Mesma entrada e resposta de /analyze, com o analisador assíncrono
+    A chamada à API roda no event loop do processo, que mantém várias notas em
+    andamento com um só cliente; esta view apenas aguarda o resultado
+    """
+    try:
+        if 'pdf' not in request.files:
+            return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+        
+        file = request.files['pdf']
+        
+        if file.filename == '':
+            return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+        
+        if not file.filename.lower().endswith('.pdf'):
+            return jsonify({'error': 'Apenas arquivos PDF são aceitos'}), 400
+        
+        sem_cache = request.values.get('sem_cache', '').lower() in ('1', 'true', 'sim')
+        opcoes = dict(
+            usar_cache=not sem_cache,
+            modo=request.values.get('modo') or None,
+            estrategia=request.values.get('estrategia') or None,
+        )
+        
+        backend = analisadores.carregar()
+        with usar_documento(file) as documento:
+            if backend.obter_analisador_async is not None:
+                corrotina = backend.obter_analisador_async().analisar_documento(documento, **opcoes)
+                notas = await asyncio.wrap_future(backend.executar_async(corrotina))
+            else:
+                # Analisadores locais não têm versão assíncrona
+                notas = await asyncio.to_thread(analisar_notas, obter_analisador(), documento, **opcoes)
+        
         return jsonify({
-            'success': False,
-            'error': f'Erro ao processar arquivo: {str(e)}'
-        }), 500
+            'success': True,
+            **montar_resposta_notas(notas)
+        })
+    
+    except Exception as e:
+        return responder_erro_analise(e)
+
+def obter_pool_lote() -> ThreadPoolExecutor:
+    """Pool de análise em lote, criado no primeiro uso (após o fork do gunicorn)"""
+    global _pool_lote
+    with _pool_lote_lock:
+        if _pool_lote is None:
+            _pool_lote = ThreadPoolExecutor(max_workers=LOTE_CONCORRENCIA, thread_name_prefix='nf-lote')
+        return _pool_lote
+
+def coletar_pdfs_enviados(arquivos) -> list:
+    """
+    Abre os arquivos do formulário e retorna lista de DocumentoPDF
+    PDFs enviados diretamente são usados sem cópia (memória ou mmap do upload);
+    arquivos ZIP são expandidos; apenas PDFs são considerados
+    """
+    pdfs = []
+    try:
+        for arquivo in arquivos:
+            nome = arquivo.filename or ''
+            if nome.lower().endswith('.zip'):
+                with zipfile.ZipFile(arquivo.stream) as zf:
+                    for info in zf.infolist():
+                        nome_interno = Path(info.filename).name
+                        if info.is_dir() or info.filename.startswith('__MACOSX') or not nome_interno.lower().endswith('.pdf'):
+                            continue
+                        if info.file_size > MAX_TAMANHO_ARQUIVO:
+                            raise ValueError(f'{nome_interno}: arquivo muito grande ({descrever_limite()})')
+                        pdfs.append(DocumentoPDF(zf.read(info), nome_interno))
+                        if len(pdfs) > LOTE_MAX_ARQUIVOS:
+                            raise ValueError(f'Máximo de {LOTE_MAX_ARQUIVOS} arquivos por lote')
+            elif nome.lower().endswith('.pdf'):
+                documento = abrir_documento(arquivo)
+                pdfs.append(documento)
+                if documento.tamanho > MAX_TAMANHO_ARQUIVO:
+                    raise ValueError(f'{nome}: arquivo muito grande ({descrever_limite()})')
+            if len(pdfs) > LOTE_MAX_ARQUIVOS:
+                raise ValueError(f'Máximo de {LOTE_MAX_ARQUIVOS} arquivos por lote')
+    except Exception:
+        for documento in pdfs:
+            documento.fechar()
+        raise
+    return pdfs
+
+def descrever_limite() -> str:
+    return f'máximo {MAX_TAMANHO_ARQUIVO // (1024 * 1024)}MB'
+
+def analisar_pdf_lote(indice: int, documento: DocumentoPDF, usar_cache: bool) -> dict:
+    """
+    Analisa um PDF do lote e retorna o item de resultado (nunca lança exceção)
+    As chamadas à API do lote ficam atrás das análises interativas na fila do agendador
+    """
+    try:
+        with prioridade(PRIORIDADE_LOTE):
+            notas = analisar_notas(obter_analisador(), documento, usar_cache=usar_cache)
+        return {'indice': indice, 'arquivo': documento.nome, 'success': True, **montar_resposta_notas(notas)}
+    except Exception as e:
+        item = {'indice': indice, 'arquivo': documento.nome, 'success': False,
+                'error': f'Erro ao processar arquivo: {str(e)}'}
+        if getattr(e, 'temporario', False):
+            item['temporario'] = True
+        return item
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Análise de vários PDFs (campo 'pdfs', aceita também ZIP)
+    Os resultados são enviados à medida que cada arquivo termina:
+    NDJSON (padrão) ou server-sent events com formato=sse
+    """
+    try:
+        pdfs = coletar_pdfs_enviados(request.files.getlist('pdfs'))
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not pdfs:
+        return jsonify({'success': False, 'error': 'Nenhum arquivo PDF enviado'}), 400
+    
+    sem_cache = request.values.get('sem_cache', '').lower() in ('1', 'true', 'sim')
+    sse = request.values.get('formato', 'ndjson').lower() == 'sse'
+    
+    def serializar(evento: str, item: dict) -> str:
+        corpo = json.dumps(item, cls=DecimalEncoder, ensure_ascii=False)
+        return f"event: {evento}\ndata: {corpo}\n\n" if sse else corpo + "\n"
+    
+    def gerar():
+        pool = obter_pool_lote()
+        # Cada arquivo roda em uma cópia do contexto: as métricas somam na linha de log do lote
+        futures = [
+            pool.submit(contextvars.copy_context().run, analisar_pdf_lote, indice, documento, not sem_cache)
+            for indice, documento in enumerate(pdfs)
+        ]
+        yield serializar('inicio', {'total': len(futures)})
+        sucesso = 0
+        try:
+            for future in as_completed(futures):
+                item = future.result()
+                sucesso += item['success']
+                yield serializar('resultado', item)
+        finally:
+            # Cliente desconectou: não processa o que ainda não começou
+            for future in futures:
+                future.cancel()
+            # Espera o que já começou antes de fechar os documentos (mmap)
+            for future, documento in zip(futures, pdfs):
+                if not future.cancelled():
+                    future.exception()
+                documento.fechar()
+        yield serializar('fim', {'total': len(futures), 'sucesso': sucesso, 'falhas': len(futures) - sucesso})
+    
+    return Response(
+        stream_with_context(gerar()),
+        mimetype='text/event-stream' if sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def processar_job(caminho: str, usar_cache: bool) -> dict:
+    """Executado pelas threads da fila de jobs"""
+    token = metricas.iniciar_contexto(rota='job', arquivo=Path(caminho).name)
+    status = 'erro'
+    try:
+        notas = analisar_notas(obter_analisador(), caminho, usar_cache=usar_cache)
+        status = 'ok'
+    finally:
+        metricas.finalizar_contexto(token, status=status)
+    return montar_resposta_notas(notas)
+
+@app.before_request
+def iniciar_fila_jobs():
+    """Garante as threads da fila no worker (retoma jobs pendentes após reinício)"""
+    obter_fila(processar_job)
+
+# Rotas sem linha de log por requisição
+ROTAS_SEM_LOG = ('/metrics', '/static/<path:filename>')
+
+def rota_da_requisicao() -> str:
+    """Regra da rota (ex: /jobs/<job_id>), para não criar uma série por URL"""
+    return request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+
+@app.before_request
+def iniciar_metricas_requisicao():
+    """Abre o registro de métricas da requisição (uma linha de log JSON ao final)"""
+    g.metricas_token = metricas.iniciar_contexto(
+        rota=rota_da_requisicao(), metodo=request.method, bytes_requisicao=request.content_length or 0
+    )
+
+# Rotas de um arquivo só: MAX_CONTENT_LENGTH é o limite do lote, estas usam NF_ARQUIVO_MAX_MB
+ROTAS_UM_ARQUIVO = ('/analyze', '/analyze/async', '/jobs')
+
+@app.before_request
+def limitar_tamanho_arquivo():
+    """Recusa o envio acima de NF_ARQUIVO_MAX_MB antes de request.files ler o corpo"""
+    if (request.method == 'POST' and rota_da_requisicao() in ROTAS_UM_ARQUIVO
+            and request.content_length and request.content_length > MAX_TAMANHO_ARQUIVO):
+        return too_large(None)
+
+@app.after_request
+def registrar_status_requisicao(response):
+    g.metricas_status = response.status_code
+    token = g.get('metricas_token')
+    if response.is_streamed and token is not None:
+        # Resposta em streaming (lote): a linha de log sai depois do último item
+        g.pop('metricas_token')
+        response.response = finalizar_ao_fim(
+            response.response, token, rota_da_requisicao(), request.method, response.status_code
+        )
+    return response
+
+@app.teardown_request
+def finalizar_metricas_requisicao(erro=None):
+    """Fecha o registro da requisição (exceto streaming, ver registrar_status_requisicao)"""
+    token = g.pop('metricas_token', None)
+    if token is not None:
+        finalizar_metricas(token, rota_da_requisicao(), request.method, g.pop('metricas_status', 500))
+
+def finalizar_ao_fim(corpo, token, rota: str, metodo: str, status: int):
+    try:
+        yield from corpo
+    finally:
+        finalizar_metricas(token, rota, metodo, status)
+
+def finalizar_metricas(token, rota: str, metodo: str, status: int):
+    """Linha de log JSON da requisição e contadores HTTP"""
+    registro = metricas.finalizar_contexto(token, log=rota not in ROTAS_SEM_LOG, status=status)
+    metricas.HTTP_REQUISICOES.inc(rota=rota, metodo=metodo, status=status)
+    metricas.HTTP_DURACAO.observar(registro['duracao_ms'] / 1000, rota=rota)
+
+@metricas.REGISTRO.coletor
+def coletar_caches():
+    """Contadores dos caches (resultados e páginas renderizadas) e fila do agendador"""
+    familias = []
+    cache = obter_cache_padrao()
+    if cache is not None:
+        estatisticas = cache.estatisticas()
+        familias.append(('nf_cache_resultados_total', 'counter', 'Consultas ao cache de resultados', [
+            ({'resultado': 'hit_memoria'}, estatisticas['hits_memoria']),
+            ({'resultado': 'hit_disco'}, estatisticas['hits_disco']),
+            ({'resultado': 'miss'}, estatisticas['misses']),
+        ]))
+    estatisticas = obter_renderizador().estatisticas()
+    familias.append(('nf_cache_paginas_total', 'counter', 'Consultas ao cache de páginas renderizadas', [
+        ({'resultado': 'hit'}, estatisticas['hits_cache']),
+        ({'resultado': 'miss'}, estatisticas['renderizacoes']),
+    ]))
+    familias.append(('nf_cache_paginas_bytes', 'gauge', 'Bytes de imagens no cache de páginas', [
+        ({}, estatisticas['bytes_em_cache']),
+    ]))
+    familias.append(('nf_agendador_fila', 'gauge', 'Chamadas à API aguardando na fila do agendador', [
+        ({}, obter_agendador().estatisticas()['na_fila']),
+    ]))
+    return familias
+
+@app.route('/metrics')
+def metrics():
+    """Métricas do worker no formato texto do Prometheus"""
+    return Response(metricas.REGISTRO.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs', methods=['POST'])
+def criar_job():
+    """Recebe o PDF e retorna imediatamente o ID do job; a análise roda em segundo plano"""
+    if 'pdf' not in request.files:
+        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+    
+    file = request.files['pdf']
+    
+    if file.filename == '':
+        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+    
+    if not file.filename.lower().endswith('.pdf'):
+        return jsonify({'error': 'Apenas arquivos PDF são aceitos'}), 400
+    
+    sem_cache = request.values.get('sem_cache', '').lower() in ('1', 'true', 'sim')
+    with usar_documento(file) as documento:
+        if documento.tamanho > MAX_TAMANHO_ARQUIVO:
+            return too_large(None)
+        job_id = obter_fila(processar_job).enfileirar(file.filename, documento.dados, usar_cache=not sem_cache)
+    
+    url = f'/jobs/{job_id}'
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'pendente', 'url': url}), 202, {'Location': url}
+
+@app.route('/jobs/<job_id>')
+def consultar_job(job_id):
+    """Status do job; quando concluído traz o mesmo 'data' de /analyze"""
+    job = obter_fila(processar_job).obter(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+    
+    resposta = {k: v for k, v in job.items() if k not in ('resultado', 'erro')}
+    if job['status'] == CONCLUIDO:
+        resposta['success'] = True
+        resultado = job['resultado']
+        if 'notas' in resultado:
+            resposta.update(resultado)
+        else:
+            # Job gravado antes do suporte a várias notas por PDF
+            resposta['data'] = resultado
+    elif job['status'] == ERRO:
+        resposta['success'] = False
+        resposta['error'] = f"Erro ao processar arquivo: {job.get('erro')}"
+    return jsonify(resposta)
+
+@app.route('/cache/estatisticas')
+def cache_estatisticas():
+    """Contadores de acerto/erro do cache de resultados"""
+    cache = obter_cache_padrao()
+    if cache is None:
+        return jsonify({'ativo': False})
+    return jsonify({'ativo': True, **cache.estatisticas()})
+
+@app.route('/agendador/estatisticas')
+def agendador_estatisticas():
+    """Fila e fichas disponíveis do agendador das chamadas à API"""
+    return jsonify(obter_agendador().estatisticas())
+
+@app.route('/renderizador/estatisticas')
+def renderizador_estatisticas():
+    """Tempo de renderização por página e acertos do cache de páginas"""
+    return jsonify(obter_renderizador().estatisticas())
+
+@app.route('/notas')
+def consultar_notas():
+    """
+    Notas já extraídas (armazém), paginadas da emissão mais recente para a mais antiga
+    Filtros na query string: prestador_cnpj, tomador_cnpj, numero, municipio, data_inicio,
+    data_fim, valor_min, valor_max, iss_retido (sim/nao), sha256; pagina e por_pagina
+    """
+    armazem = obter_armazem()
+    if armazem is None:
+        return armazem_desativado()
+    try:
+        resultado = armazem.consultar(pagina=int(request.args.get('pagina', 1)),
+                                      por_pagina=int(request.args.get('por_pagina', POR_PAGINA_PADRAO)),
+                                      **filtros_da_consulta())
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, **resultado})
+
+def filtros_da_consulta() -> dict:
+    """Filtros do armazém na query string (ver ArmazemNotas.consultar)"""
+    filtros = {campo: request.args.get(campo) for campo in (
+        'prestador_cnpj', 'tomador_cnpj', 'numero', 'municipio', 'data_inicio', 'data_fim',
+        'valor_min', 'valor_max', 'sha256')}
+    iss_retido = request.args.get('iss_retido', '').lower()
+    if iss_retido:
+        filtros['iss_retido'] = iss_retido in ('1', 'true', 'sim')
+    return filtros
+
+def armazem_desativado():
+    return jsonify({'success': False, 'error': 'Armazém de notas desativado (NF_ARMAZEM_DESATIVADO)'}), 404
+
+def transmitir_registros(registros, formato: str, nome: str) -> Response:
+    """Resposta transmitida linha a linha: CSV (download) ou NDJSON"""
+    if formato == 'csv':
+        return Response(stream_with_context(relatorios.linhas_csv(registros)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={nome}.csv'})
+    return Response(stream_with_context(relatorios.linhas_jsonl(registros)), mimetype='application/x-ndjson')
+
+@app.route('/relatorios/retencoes')
+def relatorio_retencoes():
+    """
+    Totais de ISS e retenções por prestador, tomador ou município (agrupar=), por mês de emissão
+    (por_mes=0 junta o período); aceita os filtros de /notas; formato=csv devolve planilha
+    """
+    armazem = obter_armazem()
+    if armazem is None:
+        return armazem_desativado()
+    agrupar = request.args.get('agrupar', 'prestador')
+    por_mes = request.args.get('por_mes', '1').lower() in ('1', 'true', 'sim')
+    try:
+        linhas = relatorios.totais_retencoes(armazem, agrupar, por_mes, **filtros_da_consulta())
+        primeira = next(linhas, None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    linhas = itertools.chain([primeira] if primeira is not None else [], linhas)
+    if request.args.get('formato', 'json').lower() == 'csv':
+        return transmitir_registros(linhas, 'csv', f'retencoes_{agrupar}')
+    # Uma linha por grupo: cabe em uma resposta JSON mesmo com histórico longo
+    return jsonify({'success': True, 'agrupar': agrupar, 'por_mes': por_mes, 'linhas': list(linhas)})
+
+@app.route('/relatorios/verificacoes')
+def relatorio_verificacoes():
+    """
+    Notas com valores inconsistentes (ISS × base × alíquota, ISS retido, valor líquido)
+    NDJSON: primeira linha com o resumo, depois uma linha por divergência; formato=csv só as divergências
+    tolerancia: diferença aceita em centavos; verificacao= limita a uma verificação; aceita os filtros de /notas
+    """
+    armazem = obter_armazem()
+    if armazem is None:
+        return armazem_desativado()
+    filtros = filtros_da_consulta()
+    verificacao = request.args.get('verificacao')
+    try:
+        tolerancia = int(request.args.get('tolerancia', relatorios.TOLERANCIA_CENTAVOS_PADRAO))
+        resumo = relatorios.resumo_verificacoes(armazem, tolerancia, **filtros)
+        registros = relatorios.divergencias(armazem, tolerancia, [verificacao] if verificacao else None, **filtros)
+        primeira = next(registros, None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    registros = itertools.chain([primeira] if primeira is not None else [], registros)
+    if request.args.get('formato', 'ndjson').lower() == 'csv':
+        return transmitir_registros(registros, 'csv', 'verificacoes')
+    return transmitir_registros(itertools.chain([{'resumo': resumo}], registros), 'ndjson', 'verificacoes')
+
+# Serverless (serverless-wsgi): a fase de inicialização importa o app antes da primeira requisição,
+# então o aquecimento entra aqui; no gunicorn ele roda em cada worker (gunicorn.conf.py)
+if os.getenv('NF_AQUECER_NA_IMPORTACAO', '').lower() in ('1', 'true', 'sim'):
+    analisadores.aquecer()
 
 # Sample route removed to avoid unnecessary API costs
 # This route was used for demo purposes only
@@ -162,7 +629,9 @@ def analyze():
 @app.errorhandler(413)
 def too_large(e):
     """Handler para arquivos muito grandes"""
-    return jsonify({'error': 'Arquivo muito grande. Máximo permitido: 16MB'}), 413
+    if request.path == '/analyze/batch':
+        return jsonify({'error': f"Lote muito grande. Máximo permitido: {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)}MB"}), 413
+    return jsonify({'error': f'Arquivo muito grande. Máximo permitido: {MAX_TAMANHO_ARQUIVO // (1024 * 1024)}MB'}), 413
 
 if __name__ == '__main__':
     print("\n🚀 Servidor Flask iniciando...")
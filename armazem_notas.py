@@ -0,0 +1,381 @@
+"""
+Armazém de notas fiscais extraídas
+Guarda cada NotaFiscal (como nota_para_dict) em SQLite, com índices para as buscas
+do dia a dia: CNPJ do prestador/tomador, número, data de emissão, município e valor.
+
+Diferente do cache de resultados, não expira: é o histórico das notas já pagas à API.
+Uma nota é identificada por (CNPJ do prestador, número, código de verificação), então
+o mesmo documento baixado de novo (outro PDF, outro hash) não é gravado duas vezes e,
+se a camada de texto já revelar esses campos, nem chega à API.
+
+Valores monetários ficam em centavos (INTEGER): comparação e soma exatas no SQLite,
+o que os relatórios tributários (relatorios.py) aproveitam para agregar sem sair do banco.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import metricas
+
+# Dados que precisam sobreviver a reinícios (armazém, fila de jobs): fora do /tmp,
+# que o sistema limpa; XDG_DATA_HOME ou ~/.local/share
+DADOS_DIR_PADRAO = Path(os.getenv('XDG_DATA_HOME') or Path.home() / '.local' / 'share') / 'nf_analyzer'
+
+# Configuração padrão (pode ser sobrescrita pelo .env)
+ARMAZEM_DIR_PADRAO = DADOS_DIR_PADRAO / 'notas'
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAX = 500
+
+# Valores que o analisador usa quando não encontra o campo
+_SEM_VALOR = (None, '', 'null', 'DESCONHECIDO')
+
+
+def _somente_digitos(valor: Any) -> Optional[str]:
+    if valor in _SEM_VALOR:
+        return None
+    digitos = ''.join(c for c in str(valor) if c.isdigit())
+    return digitos or None
+
+
+def _numero(valor: Any) -> Optional[str]:
+    """Número da nota sem pontuação e zeros à esquerda (como _numero_normalizado do analisador)"""
+    if valor in _SEM_VALOR:
+        return None
+    return ''.join(c for c in str(valor) if c.isalnum()).lstrip('0') or None
+
+
+def chave_da_nota(prestador_cnpj: Any, numero: Any, codigo_verificacao: Any = None) -> Optional[str]:
+    """
+    Identidade da nota: CNPJ do prestador + número (+ código de verificação, se houver)
+    None sem CNPJ ou número: a nota é gravada, mas sem detecção de duplicata
+    """
+    cnpj, numero = _somente_digitos(prestador_cnpj), _numero(numero)
+    if cnpj is None or numero is None:
+        return None
+    codigo = '' if codigo_verificacao in _SEM_VALOR else ''.join(
+        c for c in str(codigo_verificacao).upper() if c.isalnum())
+    return f"{cnpj}|{numero}|{codigo}"
+
+
+def centavos(valor: Any) -> Optional[int]:
+    """'1234.56' / Decimal / float -> 123456 (None se vazio ou inválido)"""
+    if valor in _SEM_VALOR:
+        return None
+    try:
+        return int((Decimal(str(valor).replace(',', '.')) * 100).quantize(Decimal('1')))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _aliquota(valor: Any) -> Optional[float]:
+    """Alíquota em % (5.0 para 5%), como em DadosTributarios"""
+    if valor in _SEM_VALOR:
+        return None
+    try:
+        return float(str(valor).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def data_iso(valor: Any) -> Optional[str]:
+    """'DD/MM/AAAA' (formato das notas) ou 'AAAA-MM-DD' -> 'AAAA-MM-DD', ordenável no SQLite"""
+    if valor in _SEM_VALOR:
+        return None
+    texto = str(valor).strip()
+    partes = texto.split('/')
+    if len(partes) == 3 and all(p.isdigit() for p in partes) and len(partes[2]) == 4:
+        return f"{partes[2]}-{int(partes[1]):02d}-{int(partes[0]):02d}"
+    partes = texto[:10].split('-')
+    if len(partes) == 3 and all(p.isdigit() for p in partes) and len(partes[0]) == 4:
+        return f"{partes[0]}-{int(partes[1]):02d}-{int(partes[2]):02d}"
+    return None
+
+
+class ArmazemNotas:
+    """
+    Notas extraídas em SQLite (compartilhado entre workers, persistente entre reinícios)
+    - documentos: SHA-256 do PDF -> ids das suas notas (PDF já visto não volta à API)
+    - notas: colunas indexadas para busca + o dict completo da nota em 'dados'
+    """
+
+    def __init__(self, diretorio: Optional[Path] = None):
+        self.diretorio = Path(diretorio or ARMAZEM_DIR_PADRAO)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.caminho_db = self.diretorio / 'notas.sqlite3'
+        self._local = threading.local()
+
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS notas (
+                    id INTEGER PRIMARY KEY,
+                    chave TEXT UNIQUE,
+                    sha256 TEXT NOT NULL,
+                    arquivo TEXT,
+                    numero TEXT,
+                    codigo_verificacao TEXT,
+                    prestador TEXT,
+                    prestador_cnpj TEXT,
+                    tomador TEXT,
+                    tomador_cnpj TEXT,
+                    municipio TEXT,
+                    estado TEXT,
+                    data_emissao TEXT,
+                    valor_total_centavos INTEGER,
+                    valor_iss_centavos INTEGER,
+                    retencao_iss_centavos INTEGER,
+                    base_calculo_centavos INTEGER,
+                    aliquota_iss REAL,
+                    retencao_pis_centavos INTEGER,
+                    retencao_cofins_centavos INTEGER,
+                    retencao_csll_centavos INTEGER,
+                    retencao_inss_centavos INTEGER,
+                    retencao_irrf_centavos INTEGER,
+                    valor_liquido_centavos INTEGER,
+                    dados TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    sha256 TEXT PRIMARY KEY,
+                    arquivo TEXT,
+                    notas TEXT NOT NULL,
+                    criado_em REAL NOT NULL
+                )
+            """)
+            # Buscas por CNPJ costumam vir com período: (cnpj, data) atende as duas condições
+            for indice in ("idx_notas_prestador ON notas(prestador_cnpj, data_emissao)",
+                           "idx_notas_tomador ON notas(tomador_cnpj, data_emissao)",
+                           "idx_notas_numero ON notas(numero)",
+                           "idx_notas_data ON notas(data_emissao)",
+                           "idx_notas_municipio ON notas(municipio COLLATE NOCASE, data_emissao)",
+                           "idx_notas_valor ON notas(valor_total_centavos)",
+                           "idx_notas_sha256 ON notas(sha256)"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {indice}")
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão SQLite por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.caminho_db), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def guardar(self, sha256: str, arquivo: Optional[str], notas: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Grava as notas do PDF (dicts de nota_para_dict); nota já conhecida pela chave é
+        atualizada, sem nova linha. O PDF só é registrado se todas as notas tiverem número
+        (extração incompleta não deve impedir uma nova tentativa)
+        Retorna {'novas': ..., 'duplicadas': ...}
+        """
+        agora = time.time()
+        novas = duplicadas = 0
+        ids = []
+        with self._conexao() as conn:
+            # Reanálise do mesmo PDF: notas sem chave seriam gravadas de novo
+            conn.execute("DELETE FROM notas WHERE sha256 = ? AND chave IS NULL", (sha256,))
+            for dados in notas:
+                colunas = self._colunas(dados)
+                existente = None
+                if colunas['chave'] is not None:
+                    existente = conn.execute("SELECT id, sha256 FROM notas WHERE chave = ?",
+                                             (colunas['chave'],)).fetchone()
+                if existente is None:
+                    cursor = conn.execute(
+                        f"INSERT INTO notas ({', '.join(colunas)}, sha256, arquivo, criado_em, atualizado_em) "
+                        f"VALUES ({', '.join('?' * len(colunas))}, ?, ?, ?, ?)",
+                        (*colunas.values(), sha256, arquivo, agora, agora)
+                    )
+                    ids.append(cursor.lastrowid)
+                    novas += 1
+                    continue
+                if existente['sha256'] != sha256:
+                    duplicadas += 1
+                conn.execute(
+                    f"UPDATE notas SET {', '.join(f'{coluna} = ?' for coluna in colunas)}, atualizado_em = ? "
+                    f"WHERE id = ?", (*colunas.values(), agora, existente['id'])
+                )
+                ids.append(existente['id'])
+            if notas and all(_numero(dados.get('numero')) is not None for dados in notas):
+                conn.execute("INSERT OR REPLACE INTO documentos (sha256, arquivo, notas, criado_em) VALUES (?, ?, ?, ?)",
+                             (sha256, arquivo, json.dumps(ids), agora))
+
+        if novas:
+            metricas.NOTAS_ARMAZENADAS.inc(novas, resultado='nova')
+        if duplicadas:
+            metricas.NOTAS_ARMAZENADAS.inc(duplicadas, resultado='duplicada')
+        return {'novas': novas, 'duplicadas': duplicadas}
+
+    @staticmethod
+    def _colunas(dados: Dict[str, Any]) -> Dict[str, Any]:
+        """Colunas indexadas a partir do dict da nota"""
+        tributos = dados.get('dados_tributarios') or {}
+        return {
+            'chave': chave_da_nota(dados.get('prestador_cnpj'), dados.get('numero'), dados.get('codigo_verificacao')),
+            'numero': _numero(dados.get('numero')),
+            'codigo_verificacao': dados.get('codigo_verificacao'),
+            'prestador': dados.get('prestador'),
+            'prestador_cnpj': _somente_digitos(dados.get('prestador_cnpj')),
+            'tomador': dados.get('tomador'),
+            'tomador_cnpj': _somente_digitos(dados.get('tomador_cnpj')),
+            'municipio': None if dados.get('municipio') in _SEM_VALOR else dados['municipio'],
+            'estado': None if dados.get('estado') in _SEM_VALOR else dados['estado'],
+            'data_emissao': data_iso(dados.get('data_emissao')),
+            'valor_total_centavos': centavos(dados.get('valor_total')),
+            'valor_iss_centavos': centavos(tributos.get('valor_iss')),
+            'retencao_iss_centavos': centavos(tributos.get('retencao_iss')),
+            'base_calculo_centavos': centavos(tributos.get('base_calculo')),
+            'aliquota_iss': _aliquota(tributos.get('aliquota_iss')),
+            'retencao_pis_centavos': centavos(tributos.get('retencao_pis')),
+            'retencao_cofins_centavos': centavos(tributos.get('retencao_cofins')),
+            'retencao_csll_centavos': centavos(tributos.get('retencao_csll')),
+            'retencao_inss_centavos': centavos(tributos.get('retencao_inss')),
+            'retencao_irrf_centavos': centavos(tributos.get('retencao_irrf')),
+            'valor_liquido_centavos': centavos(dados.get('valor_liquido')),
+            'dados': json.dumps(dados, ensure_ascii=False),
+        }
+
+    def notas_do_pdf(self, sha256: str) -> Optional[List[Dict[str, Any]]]:
+        """Notas já extraídas deste PDF, na ordem do documento, ou None se o PDF é novo"""
+        conn = self._conexao()
+        row = conn.execute("SELECT notas FROM documentos WHERE sha256 = ?", (sha256,)).fetchone()
+        if row is None:
+            return None
+        ids = json.loads(row['notas'])
+        dados = {linha['id']: json.loads(linha['dados']) for linha in conn.execute(
+            f"SELECT id, dados FROM notas WHERE id IN ({', '.join('?' * len(ids))})", ids)}
+        if len(dados) != len(set(ids)):
+            # Nota removida do armazém depois do registro do PDF
+            return None
+        return [dados[nota_id] for nota_id in ids]
+
+    def buscar_por_chave(self, prestador_cnpj: Any, numero: Any, codigo_verificacao: Any = None) -> Optional[Dict[str, Any]]:
+        """Nota já conhecida com esta identidade (ver chave_da_nota), ou None"""
+        chave = chave_da_nota(prestador_cnpj, numero, codigo_verificacao)
+        if chave is None:
+            return None
+        row = self._conexao().execute("SELECT dados FROM notas WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(row['dados']) if row is not None else None
+
+    def consultar(self, prestador_cnpj: Optional[str] = None, tomador_cnpj: Optional[str] = None,
+                  numero: Optional[str] = None, municipio: Optional[str] = None,
+                  data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                  valor_min: Any = None, valor_max: Any = None, iss_retido: Optional[bool] = None,
+                  sha256: Optional[str] = None, pagina: int = 1,
+                  por_pagina: int = POR_PAGINA_PADRAO) -> Dict[str, Any]:
+        """
+        Busca paginada, da emissão mais recente para a mais antiga
+        Datas em DD/MM/AAAA ou AAAA-MM-DD (período inclusivo); valores em reais
+        iss_retido: True só notas com ISS retido, False só sem retenção
+        Levanta ValueError para filtros inválidos
+        """
+        onde, parametros = self.filtros_sql(prestador_cnpj=prestador_cnpj, tomador_cnpj=tomador_cnpj,
+                                            numero=numero, municipio=municipio, data_inicio=data_inicio,
+                                            data_fim=data_fim, valor_min=valor_min, valor_max=valor_max,
+                                            iss_retido=iss_retido, sha256=sha256)
+        pagina = max(int(pagina), 1)
+        por_pagina = min(max(int(por_pagina), 1), POR_PAGINA_MAX)
+        conn = self._conexao()
+        total = conn.execute(f"SELECT COUNT(*) FROM notas {onde}", parametros).fetchone()[0]
+        linhas = conn.execute(
+            f"SELECT id, sha256, arquivo, dados, criado_em FROM notas {onde} "
+            f"ORDER BY data_emissao DESC, id DESC LIMIT ? OFFSET ?",
+            (*parametros, por_pagina, (pagina - 1) * por_pagina)
+        ).fetchall()
+        return {
+            'notas': [{'id': linha['id'], 'sha256': linha['sha256'], 'arquivo': linha['arquivo'],
+                       'armazenada_em': linha['criado_em'], **json.loads(linha['dados'])} for linha in linhas],
+            'total': total,
+            'pagina': pagina,
+            'por_pagina': por_pagina,
+            'paginas': (total + por_pagina - 1) // por_pagina,
+        }
+
+    @staticmethod
+    def filtros_sql(prestador_cnpj: Optional[str] = None, tomador_cnpj: Optional[str] = None,
+                    numero: Optional[str] = None, municipio: Optional[str] = None,
+                    data_inicio: Optional[str] = None, data_fim: Optional[str] = None,
+                    valor_min: Any = None, valor_max: Any = None, iss_retido: Optional[bool] = None,
+                    sha256: Optional[str] = None) -> tuple:
+        """
+        Cláusula WHERE (ou '') e parâmetros dos filtros de consultar, para consultas sobre a tabela notas
+        Levanta ValueError para filtros inválidos
+        """
+        condicoes, parametros = [], []
+
+        def filtrar(condicao: str, valor: Any):
+            condicoes.append(condicao)
+            parametros.append(valor)
+
+        for coluna, valor in (('prestador_cnpj', prestador_cnpj), ('tomador_cnpj', tomador_cnpj)):
+            if valor:
+                digitos = _somente_digitos(valor)
+                if digitos is None:
+                    raise ValueError(f"CNPJ inválido: {valor}")
+                filtrar(f"{coluna} = ?", digitos)
+        if numero:
+            filtrar("numero = ?", _numero(numero))
+        if municipio:
+            filtrar("municipio = ? COLLATE NOCASE", municipio.strip())
+        for operador, valor in (('>=', data_inicio), ('<=', data_fim)):
+            if valor:
+                data = data_iso(valor)
+                if data is None:
+                    raise ValueError(f"Data inválida: {valor} (use DD/MM/AAAA ou AAAA-MM-DD)")
+                filtrar(f"data_emissao {operador} ?", data)
+        for operador, valor in (('>=', valor_min), ('<=', valor_max)):
+            if valor not in (None, ''):
+                valor_centavos = centavos(valor)
+                if valor_centavos is None:
+                    raise ValueError(f"Valor inválido: {valor}")
+                filtrar(f"valor_total_centavos {operador} ?", valor_centavos)
+        if iss_retido is not None:
+            condicoes.append("retencao_iss_centavos > 0" if iss_retido
+                             else "(retencao_iss_centavos IS NULL OR retencao_iss_centavos = 0)")
+        if sha256:
+            filtrar("sha256 = ?", sha256)
+        return (f"WHERE {' AND '.join(condicoes)}" if condicoes else ''), parametros
+
+    def executar(self, sql: str, parametros: Iterable[Any] = ()) -> Iterator[sqlite3.Row]:
+        """Linhas de uma consulta de leitura, lidas sob demanda (a memória não cresce com o resultado)"""
+        cursor = self._conexao().execute(sql, tuple(parametros))
+        try:
+            while True:
+                linhas = cursor.fetchmany(500)
+                if not linhas:
+                    return
+                yield from linhas
+        finally:
+            cursor.close()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        conn = self._conexao()
+        return {
+            'notas': conn.execute("SELECT COUNT(*) FROM notas").fetchone()[0],
+            'documentos': conn.execute("SELECT COUNT(*) FROM documentos").fetchone()[0],
+        }
+
+
+_armazem_padrao: Optional[ArmazemNotas] = None
+_armazem_padrao_lock = threading.Lock()
+
+
+def obter_armazem() -> Optional[ArmazemNotas]:
+    """Armazém compartilhado pelo processo: NF_ARMAZEM_DIR; NF_ARMAZEM_DESATIVADO desliga"""
+    global _armazem_padrao
+    if os.getenv('NF_ARMAZEM_DESATIVADO', '').lower() in ('1', 'true', 'sim'):
+        return None
+
+    with _armazem_padrao_lock:
+        if _armazem_padrao is None:
+            _armazem_padrao = ArmazemNotas(diretorio=os.getenv('NF_ARMAZEM_DIR') or None)
+        return _armazem_padrao
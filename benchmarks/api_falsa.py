@@ -0,0 +1,226 @@
+"""
+Servidor local que imita a Messages API da Anthropic
+Responde sempre com a mesma nota fiscal (ou com o que uma função devolver para
+cada pedido), com latência configurável, e conta requisições e conexões TCP.
+Pedidos com cache_control no sistema recebem em usage os tokens gravados/lidos
+de um cache de prompt simulado. input_tokens segue a contagem da API: o texto não
+cacheado mais ~TOKENS_POR_PAGINA por imagem ou página de PDF (não o tamanho do base64).
+Serve para benchmarks e testes sem custo de API.
+
+Uso isolado:
+    python benchmarks/api_falsa.py --porta 8765 --latencia 0.8
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=falsa python app.py
+"""
+
+import re
+import json
+import time
+import base64
+import binascii
+import uuid
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Union
+
+# Resposta gravada (formato de ESQUEMA_NOTA, o que a ferramenta de extração recebe)
+RESPOSTA_PADRAO: Dict[str, Any] = {
+    "numero": "4550",
+    "data_emissao": "01/08/2024",
+    "vencimento": "11/08/2024",
+    "codigo_verificacao": "AB12-CD34",
+    "prestador": {"nome": "WEWORK SERVICOS DE ESCRITORIO LTDA", "cnpj": "12.345.678/0001-90"},
+    "tomador": {"nome": "ALFA ENTRETENIMENTO S.A.", "cnpj": "98.765.432/0001-10"},
+    "municipio": "São Paulo",
+    "estado": "São Paulo",
+    "valor_total": 96616.00,
+    "valor_servicos": 96616.00,
+    "discriminacao": "Locação de espaço de trabalho compartilhado",
+    "impostos": {
+        "iss": {"valor": 4830.80, "aliquota": 5.0, "base_calculo": 96616.00},
+        "retencoes": {"pis": None, "cofins": None, "csll": None, "irrf": None, "inss": None, "iss_retido": None}
+    }
+}
+
+
+# Tokens de entrada por imagem (ou página de PDF) em resolução de documento, e caracteres por token de texto
+TOKENS_POR_PAGINA = 1600
+CARACTERES_POR_TOKEN = 4
+_RE_PAGINA_PDF = re.compile(rb'/Type\s*/Page(?!s)')
+
+
+class ServidorFalso(ThreadingHTTPServer):
+    """HTTP/1.1 com keep-alive; guarda contadores para os benchmarks"""
+    daemon_threads = True
+
+    def __init__(self, endereco, latencia: float = 0.0, variacao: float = 0.0,
+                 resposta: Union[Dict[str, Any], Callable[[Dict[str, Any]], Any], None] = None):
+        super().__init__(endereco, _Handler)
+        self.latencia = latencia
+        self.variacao = variacao
+        self.resposta = resposta or RESPOSTA_PADRAO
+        self.requisicoes = 0
+        self.conexoes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def contar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+    def parar(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # cabeçalho e corpo saem em escritas separadas
+
+    def setup(self):
+        super().setup()
+        self.server.contar('conexoes')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _responder(self, status: int, corpo: Dict[str, Any]):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length', 0))
+        corpo = self.rfile.read(tamanho)
+        self.server.contar('requisicoes')
+
+        if self.path.rstrip('/') != '/v1/messages':
+            self._responder(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+            return
+
+        pedido = json.loads(corpo or b'{}')
+        atraso = self.server.latencia + random.uniform(0, self.server.variacao)
+        if atraso > 0:
+            time.sleep(atraso)
+        resposta = self.server.resposta
+        if callable(resposta):
+            resposta = resposta(pedido)
+        self._responder(200, montar_mensagem(pedido, resposta))
+
+
+# Prefixos (ferramentas + sistema) com cache_control já recebidos: simula o cache de prompt
+_prefixos_em_cache = set()
+_lock_cache = threading.Lock()
+
+
+def _prefixo(pedido: Dict[str, Any]) -> str:
+    """Ferramentas + sistema, a parte do pedido que o cache de prompt cobre"""
+    return json.dumps([pedido.get('tools'), pedido.get('system')], sort_keys=True)
+
+
+def _prefixo_em_cache(pedido: Dict[str, Any]) -> bool:
+    sistema = pedido.get('system')
+    return isinstance(sistema, list) and any(bloco.get('cache_control') for bloco in sistema)
+
+
+def _uso_do_cache(pedido: Dict[str, Any]) -> Dict[str, int]:
+    """Tokens gravados no cache de prompt (primeira vez do prefixo) ou lidos dele (demais vezes)"""
+    if not _prefixo_em_cache(pedido):
+        return {}
+    prefixo = _prefixo(pedido)
+    with _lock_cache:
+        novo = prefixo not in _prefixos_em_cache
+        _prefixos_em_cache.add(prefixo)
+    tokens = len(prefixo) // CARACTERES_POR_TOKEN
+    return {"cache_creation_input_tokens": tokens if novo else 0, "cache_read_input_tokens": 0 if novo else tokens}
+
+
+def _paginas_pdf(dados_base64: str) -> int:
+    """Páginas do PDF em base64 (objetos /Type /Page); 1 se não der para contar"""
+    try:
+        pdf = base64.b64decode(dados_base64)
+    except (binascii.Error, ValueError):
+        return 1
+    return max(len(_RE_PAGINA_PDF.findall(pdf)), 1)
+
+
+def tokens_de_entrada(pedido: Dict[str, Any]) -> int:
+    """
+    input_tokens do pedido como a API conta: texto (~CARACTERES_POR_TOKEN por token) e
+    TOKENS_POR_PAGINA por imagem ou página de PDF; o prefixo em cache fica de fora (vai para
+    cache_creation/cache_read_input_tokens)
+    """
+    caracteres = 0 if _prefixo_em_cache(pedido) else len(_prefixo(pedido))
+    tokens = 0
+    for mensagem in pedido.get('messages', []):
+        conteudo = mensagem.get('content')
+        for bloco in conteudo if isinstance(conteudo, list) else [{'type': 'text', 'text': conteudo or ''}]:
+            if bloco.get('type') == 'image':
+                tokens += TOKENS_POR_PAGINA
+            elif bloco.get('type') == 'document':
+                tokens += TOKENS_POR_PAGINA * _paginas_pdf(bloco.get('source', {}).get('data', ''))
+            else:
+                caracteres += len(bloco.get('text') or '')
+    return max(tokens + caracteres // CARACTERES_POR_TOKEN, 1)
+
+
+def montar_mensagem(pedido: Dict[str, Any], resposta: Any) -> Dict[str, Any]:
+    """Mensagem no formato da Messages API (texto JSON, ou tool_use se o pedido definir tools)"""
+    if pedido.get('tools'):
+        ferramenta = pedido['tools'][0]
+        varias_notas = 'notas' in ferramenta['input_schema'].get('properties', {})
+        if varias_notas and not (isinstance(resposta, dict) and 'notas' in resposta):
+            # Ferramenta de várias notas (documento inteiro): a gravação vira a lista
+            resposta = {"notas": resposta if isinstance(resposta, list) else [resposta]}
+        conteudo = [{"type": "tool_use", "id": f"toolu_{uuid.uuid4().hex[:24]}",
+                     "name": ferramenta['name'], "input": resposta}]
+        texto_saida = json.dumps(resposta)
+    else:
+        texto_saida = json.dumps(resposta, ensure_ascii=False, indent=2)
+        conteudo = [{"type": "text", "text": texto_saida}]
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}",
+        "type": "message",
+        "role": "assistant",
+        "model": pedido.get('model', 'modelo-falso'),
+        "content": conteudo,
+        "stop_reason": "tool_use" if pedido.get('tools') else "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": tokens_de_entrada(pedido),
+                  "output_tokens": max(len(texto_saida) // CARACTERES_POR_TOKEN, 1),
+                  **_uso_do_cache(pedido)},
+    }
+
+
+def iniciar_servidor(porta: int = 0, latencia: float = 0.0, variacao: float = 0.0,
+                     resposta: Union[Dict[str, Any], Callable[[Dict[str, Any]], Any], None] = None) -> ServidorFalso:
+    """
+    Sobe o servidor em uma thread; porta 0 escolhe uma porta livre
+    resposta: JSON da nota, ou função que recebe o pedido e devolve o JSON
+    """
+    servidor = ServidorFalso(('127.0.0.1', porta), latencia=latencia, variacao=variacao, resposta=resposta)
+    threading.Thread(target=servidor.serve_forever, name='api-falsa', daemon=True).start()
+    return servidor
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--porta', type=int, default=8765)
+    parser.add_argument('--latencia', type=float, default=0.0, help='segundos por resposta')
+    parser.add_argument('--variacao', type=float, default=0.0, help='segundos aleatórios somados à latência')
+    args = parser.parse_args()
+
+    servidor = ServidorFalso(('127.0.0.1', args.porta), latencia=args.latencia, variacao=args.variacao)
+    print(f"API falsa em {servidor.url} (Ctrl+C para sair)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        servidor.server_close()
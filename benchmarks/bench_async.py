@@ -0,0 +1,82 @@
+"""
+Benchmark do analisador assíncrono contra o síncrono
+Analisa o mesmo conjunto de PDFs com:
+  - AnalisadorClaudeAPI em um pool de threads (como /analyze/batch)
+  - AsyncAnalisadorClaudeAPI.analisar_varios em um único event loop
+e confere que as duas versões devolvem a mesma NotaFiscal.
+
+Por padrão usa a API falsa local (benchmarks/api_falsa.py) com latência
+simulada, o que mede quantas notas ficam em andamento por processo.
+
+Uso:
+    python benchmarks/bench_async.py notas/*.pdf --notas 200 --latencia 0.5 --concorrencia 50
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import AnalisadorClaudeAPI, AsyncAnalisadorClaudeAPI, ErroAnalise, nota_para_dict
+from benchmarks.api_falsa import iniciar_servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='+', help='PDFs de notas fiscais (repetidos até --notas)')
+    parser.add_argument('--notas', type=int, default=100)
+    parser.add_argument('--latencia', type=float, default=0.5, help='segundos por resposta da API falsa')
+    parser.add_argument('--threads', type=int, default=4, help='threads do pool síncrono (NF_LOTE_CONCORRENCIA)')
+    parser.add_argument('--concorrencia', type=int, default=50, help='notas em andamento no analisador assíncrono')
+    parser.add_argument('--estrategia', default='pdf', help='estratégia de entrada (padrão: pdf, sem renderização)')
+    args = parser.parse_args()
+
+    servidor = iniciar_servidor(latencia=args.latencia)
+    os.environ['ANTHROPIC_BASE_URL'] = servidor.url
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'chave-falsa')
+
+    # Sem limites de taxa do agendador: o benchmark mede o cliente, não a fila
+    os.environ.setdefault('NF_API_RPM', '0')
+    os.environ.setdefault('NF_API_TPM', '0')
+
+    pdfs = [args.pdfs[i % len(args.pdfs)] for i in range(args.notas)]
+    opcoes = dict(cache=None, armazem=None, modo_extracao='claude', estrategia_entrada=args.estrategia)
+    print(f"{args.notas} notas, API falsa com {args.latencia * 1000:.0f} ms de latência\n")
+
+    analisador = AnalisadorClaudeAPI(**opcoes)
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        notas_sync = list(pool.map(analisador.analisar, pdfs))
+    tempo_sync = time.perf_counter() - inicio
+    rotulo = f"síncrono, {args.threads} threads"
+    print(f"  {rotulo:<28} {tempo_sync:7.2f} s   {args.notas / tempo_sync:7.1f} notas/s")
+
+    async def rodar_async():
+        async with AsyncAnalisadorClaudeAPI(**opcoes) as analisador_async:
+            return await analisador_async.analisar_varios(pdfs, concorrencia=args.concorrencia)
+
+    inicio = time.perf_counter()
+    notas_async = asyncio.run(rodar_async())
+    tempo_async = time.perf_counter() - inicio
+    rotulo = f"assíncrono, {args.concorrencia} em andamento"
+    print(f"  {rotulo:<28} {tempo_async:7.2f} s   {args.notas / tempo_async:7.1f} notas/s")
+
+    # analisar_varios devolve a ErroAnalise na posição do PDF que falhou
+    falhas = sum(1 for nota in notas_async if isinstance(nota, ErroAnalise))
+    iguais = not falhas and all(nota_para_dict(a) == nota_para_dict(b) for a, b in zip(notas_sync, notas_async))
+    vazias = sum(1 for nota in notas_async if not isinstance(nota, ErroAnalise) and nota.numero == "DESCONHECIDO")
+    print(f"\n  Resultados idênticos: {'sim' if iguais else 'NÃO'}   notas vazias: {vazias}   falhas: {falhas}")
+    print(f"  Ganho: {tempo_sync / tempo_async:.1f}x   conexões TCP abertas: {servidor.conexoes}")
+
+    servidor.parar()
+    if not iguais or vazias or falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Microbenchmark do custo por requisição do cliente Anthropic
+Compara o comportamento antigo (um AnalisadorClaudeAPI, e portanto um cliente
+HTTP novo, por upload) com o registro compartilhado (obter_analisador), que
+reaproveita conexões keep-alive e sessões TLS.
+
+Por padrão usa a API falsa local (benchmarks/api_falsa.py), o que mede só o
+custo de criação do cliente + conexão TCP. Para incluir o handshake TLS real,
+aponte --url para um endpoint HTTPS compatível.
+
+Uso:
+    python benchmarks/bench_cliente.py --requisicoes 200
+    python benchmarks/bench_cliente.py --url https://api.anthropic.com --requisicoes 20   # gera custo
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import AnalisadorClaudeAPI, MODELO_CLAUDE, obter_analisador, limpar_analisadores
+from benchmarks.api_falsa import iniciar_servidor
+
+
+def chamada_minima(analisador: AnalisadorClaudeAPI):
+    """Menor chamada possível: isola o custo do cliente/conexão do custo do modelo"""
+    analisador.client.messages.create(
+        model=MODELO_CLAUDE,
+        max_tokens=1,
+        messages=[{"role": "user", "content": "ping"}],
+    )
+
+
+def medir(descricao: str, obter, requisicoes: int):
+    tempos = []
+    for _ in range(requisicoes):
+        inicio = time.perf_counter()
+        chamada_minima(obter())
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    p95 = tempos[int(len(tempos) * 0.95) - 1]
+    print(f"  {descricao:<38} média {statistics.mean(tempos):7.2f} ms   "
+          f"p50 {statistics.median(tempos):7.2f} ms   p95 {p95:7.2f} ms")
+    return statistics.mean(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requisicoes', type=int, default=200)
+    parser.add_argument('--url', default=None, help='endpoint da API (padrão: API falsa local)')
+    args = parser.parse_args()
+
+    servidor = None
+    if args.url is None:
+        servidor = iniciar_servidor()
+        os.environ['ANTHROPIC_BASE_URL'] = servidor.url
+        os.environ.setdefault('ANTHROPIC_API_KEY', 'chave-falsa')
+    else:
+        os.environ['ANTHROPIC_BASE_URL'] = args.url
+
+    # Sem limites de taxa do agendador: o benchmark mede o cliente, não a fila
+    os.environ.setdefault('NF_API_RPM', '0')
+    os.environ.setdefault('NF_API_TPM', '0')
+
+    opcoes = dict(cache=None, armazem=None, modo_extracao='claude')
+    print(f"{args.requisicoes} requisições sequenciais contra {os.environ['ANTHROPIC_BASE_URL']}")
+
+    conexoes_antes = servidor.conexoes if servidor else 0
+    antes = medir('antes: analisador novo por requisição', lambda: AnalisadorClaudeAPI(**opcoes), args.requisicoes)
+    if servidor:
+        print(f"    conexões TCP abertas: {servidor.conexoes - conexoes_antes}")
+
+    limpar_analisadores()
+    conexoes_antes = servidor.conexoes if servidor else 0
+    depois = medir('depois: obter_analisador()', lambda: obter_analisador(**opcoes), args.requisicoes)
+    if servidor:
+        print(f"    conexões TCP abertas: {servidor.conexoes - conexoes_antes}")
+
+    print(f"\n  Economia por requisição: {antes - depois:.2f} ms ({(1 - depois / antes) * 100:.0f}%)")
+
+    limpar_analisadores()
+    if servidor:
+        servidor.parar()
+
+
+if __name__ == '__main__':
+    main()
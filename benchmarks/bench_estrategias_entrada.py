@@ -0,0 +1,95 @@
+"""
+Benchmark das estratégias de entrada do AnalisadorClaudeAPI
+Compara, para cada PDF, o tamanho do payload enviado e o tempo de preparo
+(renderização/codificação) de cada estratégia. Com --api também mede a
+latência ponta a ponta chamando a Claude API de verdade (gera custo!).
+
+Uso:
+    python benchmarks/bench_estrategias_entrada.py notas/*.pdf
+    python benchmarks/bench_estrategias_entrada.py notas/*.pdf --api --repeticoes 3
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import AnalisadorClaudeAPI, ESTRATEGIAS_ENTRADA
+from renderizador import Renderizador
+
+
+def medir(funcao, repeticoes: int):
+    """Executa funcao() repeticoes vezes; retorna (último resultado, mediana em ms)"""
+    tempos = []
+    resultado = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return resultado, statistics.median(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pdfs', nargs='+', help='PDFs de notas fiscais')
+    parser.add_argument('--estrategias', default=','.join(ESTRATEGIAS_ENTRADA),
+                        help='estratégias separadas por vírgula (padrão: todas)')
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--dpi', type=int, default=None, help='DPI da imagem_compacta')
+    parser.add_argument('--qualidade', type=int, default=None, help='qualidade JPEG da imagem_compacta')
+    parser.add_argument('--api', action='store_true', help='mede também a latência real da API (gera custo)')
+    args = parser.parse_args()
+
+    if args.api and not os.getenv('ANTHROPIC_API_KEY'):
+        parser.error('--api exige ANTHROPIC_API_KEY')
+
+    # Sem --api a chave não é usada: só o preparo do payload é medido
+    analisador = AnalisadorClaudeAPI(
+        api_key=os.getenv('ANTHROPIC_API_KEY') or 'benchmark-sem-api',
+        cache=None,
+        armazem=None,
+        modo_extracao='claude',
+        dpi_imagem=args.dpi,
+        qualidade_jpeg=args.qualidade,
+        # Sem cache de páginas: cada repetição mede a renderização completa
+        renderizador=Renderizador(processos=0, max_cache_bytes=0),
+    )
+    estrategias = [e.strip() for e in args.estrategias.split(',') if e.strip()]
+
+    cabecalho = f"{'arquivo':<30} {'estratégia':<16} {'usada':<16} {'payload':>12} {'preparo ms':>11}"
+    if args.api:
+        cabecalho += f" {'ponta a ponta ms':>17}"
+    print(cabecalho)
+    print('-' * len(cabecalho))
+
+    totais = {e: [] for e in estrategias}
+    for pdf in args.pdfs:
+        for estrategia in estrategias:
+            (bloco, info), ms_preparo = medir(
+                lambda: analisador.montar_conteudo(pdf, estrategia), args.repeticoes
+            )
+            usada, bytes_payload = info['estrategia_entrada'], info['bytes_payload']
+            linha = f"{Path(pdf).name[:30]:<30} {estrategia:<16} {usada:<16} {bytes_payload:>12,} {ms_preparo:>11.1f}"
+            ms_total = None
+            if args.api:
+                _, ms_total = medir(lambda: analisador.analisar(pdf, estrategia=estrategia), args.repeticoes)
+                linha += f" {ms_total:>17.0f}"
+            totais[estrategia].append((bytes_payload, ms_preparo, ms_total))
+            print(linha)
+
+    print()
+    print('Mediana por estratégia')
+    for estrategia, valores in totais.items():
+        resumo = (f"  {estrategia:<16} payload {statistics.median(v[0] for v in valores):>12,.0f} B"
+                  f"  preparo {statistics.median(v[1] for v in valores):>8.1f} ms")
+        if args.api:
+            resumo += f"  ponta a ponta {statistics.median(v[2] for v in valores):>8.0f} ms"
+        print(resumo)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Benchmark de memória por nota e vazão de exportação
+Gera N notas sintéticas (padrão 100.000) e mede:
+
+  memória     bytes por NotaFiscal (com DadosTributarios) com slots e sem slots
+  exportação  notas/s e tamanho do arquivo, caminho antigo (um dict por linha,
+              DictWriter / json.dumps por linha) contra exportacao.py (colunas)
+
+Arrow e Parquet só entram com pyarrow instalado.
+
+Uso:
+    python benchmarks/bench_exportacao.py
+    python benchmarks/bench_exportacao.py --notas 20000 --repeticoes 5
+"""
+
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import dataclasses
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import DadosTributarios, NotaFiscal
+from exportacao import COLUNAS, exportar
+
+MUNICIPIOS = ('São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'Curitiba', 'Porto Alegre', 'Recife')
+
+
+def sem_slots(cls):
+    """Cópia do dataclass sem slots (como as classes eram antes)"""
+    campos = [(f.name, f.type, dataclasses.field(default=f.default, default_factory=f.default_factory))
+              for f in dataclasses.fields(cls)]
+    return dataclasses.make_dataclass(f"{cls.__name__}SemSlots", campos)
+
+
+def nota_sintetica(i: int, aleatorio: random.Random, cls_nota=NotaFiscal, cls_tributos=DadosTributarios):
+    valor = Decimal(aleatorio.randint(10000, 10000000)) / 100
+    iss = (valor * Decimal('0.05')).quantize(Decimal('0.01'))
+    tributos = cls_tributos(
+        tributado=True, valor_iss=iss, aliquota_iss=Decimal('5.00'), base_calculo=valor,
+        retencao_iss=iss if i % 3 == 0 else None, retencao_irrf=(valor * Decimal('0.015')).quantize(Decimal('0.01')),
+        codigo_servico='01.07', observacoes=['Tributado no município'],
+    )
+    return cls_nota(
+        numero=str(100000 + i), estado='SP', municipio=MUNICIPIOS[i % len(MUNICIPIOS)],
+        prestador=f"PRESTADOR {i % 500:03d} SERVICOS LTDA", tomador='ALFA ENTRETENIMENTO S.A.',
+        data_emissao=f"{i % 28 + 1:02d}/{i % 12 + 1:02d}/2024", valor_total=valor, dados_tributarios=tributos,
+        paginas=[1], codigo_verificacao=f"{i:08X}", prestador_cnpj=f"{i % 500:02d}.345.678/0001-90",
+        tomador_cnpj='98.765.432/0001-10', valor_servicos=valor, valor_liquido=valor - iss,
+        discriminacao='Licenciamento de software e suporte técnico mensal',
+    )
+
+
+def memoria_por_nota(quantidade: int, cls_nota, cls_tributos) -> float:
+    aleatorio = random.Random(1)
+    tracemalloc.start()
+    inicio = tracemalloc.take_snapshot()
+    notas = [nota_sintetica(i, aleatorio, cls_nota, cls_tributos) for i in range(quantidade)]
+    fim = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(estatistica.size_diff for estatistica in fim.compare_to(inicio, 'filename'))
+    del notas
+    return total / quantidade
+
+
+# Caminho de exportação anterior a exportacao.py: um dict por nota, conversão valor a valor
+def _nota_para_dict_antigo(obj):
+    resultado = {}
+    for f in dataclasses.fields(obj):
+        valor = getattr(obj, f.name)
+        if isinstance(valor, Decimal):
+            valor = str(valor)
+        elif dataclasses.is_dataclass(valor):
+            valor = _nota_para_dict_antigo(valor)
+        elif isinstance(valor, list):
+            valor = list(valor)
+        resultado[f.name] = valor
+    return resultado
+
+
+def _linha_tabular_antiga(registro):
+    linha = {chave: valor for chave, valor in registro.items() if chave != 'dados_tributarios'}
+    linha.update(registro.get('dados_tributarios') or {})
+    for chave, valor in linha.items():
+        if isinstance(valor, (list, dict)):
+            linha[chave] = json.dumps(valor, ensure_ascii=False)
+    return linha
+
+
+def exportar_antigo(notas, destino: Path, formato: str):
+    registros = ({'arquivo': 'lote.pdf', 'sha256': '0' * 64, 'nota_indice': i, **_nota_para_dict_antigo(nota)}
+                 for i, nota in enumerate(notas))
+    if formato == 'csv':
+        with open(destino, 'w', encoding='utf-8', newline='') as arquivo:
+            escritor = csv.DictWriter(arquivo, fieldnames=COLUNAS, extrasaction='ignore')
+            escritor.writeheader()
+            escritor.writerows(_linha_tabular_antiga(registro) for registro in registros)
+    elif formato == 'jsonl':
+        with open(destino, 'w', encoding='utf-8') as arquivo:
+            for registro in registros:
+                arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+    else:
+        import pyarrow
+        import pyarrow.parquet
+        from exportacao import esquema_arrow
+        tabela = pyarrow.Table.from_pylist([_linha_tabular_antiga(registro) for registro in registros],
+                                           schema=esquema_arrow(COLUNAS))
+        pyarrow.parquet.write_table(tabela, destino)
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Melhor tempo (s) entre as repetições"""
+    melhor = float('inf')
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notas', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--amostra-memoria', type=int, default=20000, help='notas usadas na medição de memória')
+    args = parser.parse_args()
+
+    print(f"Memória por nota ({args.amostra_memoria} notas, tracemalloc):")
+    sem = memoria_por_nota(args.amostra_memoria, sem_slots(NotaFiscal), sem_slots(DadosTributarios))
+    com = memoria_por_nota(args.amostra_memoria, NotaFiscal, DadosTributarios)
+    print(f"  {'sem slots':<12} {sem:8.0f} bytes")
+    print(f"  {'com slots':<12} {com:8.0f} bytes  ({1 - com / sem:.0%} menos)")
+
+    aleatorio = random.Random(1)
+    notas = [nota_sintetica(i, aleatorio) for i in range(args.notas)]
+    extras = {'arquivo': ['lote.pdf'] * len(notas), 'sha256': ['0' * 64] * len(notas),
+              'nota_indice': range(len(notas))}
+    formatos = ['csv', 'jsonl']
+    try:
+        import pyarrow  # noqa: F401
+        formatos += ['arrow', 'parquet']
+    except ImportError:
+        print("\npyarrow não instalado: Arrow e Parquet ficam de fora")
+
+    print(f"\nExportação de {args.notas} notas (melhor de {args.repeticoes}):")
+    print(f"  {'formato':<9} {'caminho':<10} {'segundos':>9} {'notas/s':>10} {'MB':>8}")
+    with tempfile.TemporaryDirectory() as diretorio:
+        for formato in formatos:
+            destino = Path(diretorio) / f"notas.{formato}"
+            caminhos = [('colunas', lambda: exportar(notas, destino, formato, **extras))]
+            if formato != 'arrow':
+                caminhos.insert(0, ('por linha', lambda: exportar_antigo(notas, destino, formato)))
+            for caminho, funcao in caminhos:
+                segundos = medir(funcao, args.repeticoes)
+                megabytes = destino.stat().st_size / 1024 / 1024
+                print(f"  {formato:<9} {caminho:<10} {segundos:9.2f} {args.notas / segundos:10.0f} {megabytes:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark de inicialização do app (cold start do gunicorn e do serverless-wsgi)
+Cada rodada é um processo Python novo que mede:
+
+  importacao  import app (o analisador e as dependências pesadas não devem entrar aqui)
+  aquecimento analisadores.aquecer(), só no cenário aquecido (o post_fork do gunicorn.conf.py)
+  primeira    primeiro POST /analyze (Flask test client, modo claude, sem cache)
+  segunda     segundo POST /analyze, já com tudo carregado
+
+A API é a falsa de benchmarks/api_falsa.py (SDK anthropic real, sem custo); o PDF sai de
+benchmarks/corpus.py. Com --limite-importacao-ms o script sai com erro se a importação
+passar do limite ou se alguma dependência pesada for importada junto com o app.
+
+Uso:
+    python benchmarks/bench_inicio.py
+    python benchmarks/bench_inicio.py --rodadas 10 --limite-importacao-ms 400
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+CENARIOS = ('frio', 'aquecido')
+ETAPAS = ('importacao', 'aquecimento', 'primeira', 'segunda')
+MARCA = 'bench_inicio:'
+
+
+def medir_processo(cenario: str, pdf: Path) -> dict:
+    """Roda no processo filho: importa o app do zero e faz duas requisições"""
+    inicio = time.perf_counter()
+    import app
+    tempos = {'importacao': (time.perf_counter() - inicio) * 1000}
+
+    import analisadores
+    carregados = [nome for nome in analisadores.DEPENDENCIAS_PESADAS if nome in sys.modules]
+    if cenario == 'aquecido':
+        inicio = time.perf_counter()
+        analisadores.aquecer()
+        tempos['aquecimento'] = (time.perf_counter() - inicio) * 1000
+
+    cliente = app.app.test_client()
+    for etapa in ('primeira', 'segunda'):
+        inicio = time.perf_counter()
+        with open(pdf, 'rb') as arquivo:
+            resposta = cliente.post('/analyze', data={'pdf': (arquivo, pdf.name), 'sem_cache': '1', 'modo': 'claude'},
+                                    content_type='multipart/form-data')
+        tempos[etapa] = (time.perf_counter() - inicio) * 1000
+        if resposta.status_code != 200:
+            raise RuntimeError(f"POST /analyze: {resposta.status_code} {resposta.get_data(as_text=True)[:300]}")
+
+    from renderizador import obter_renderizador
+    obter_renderizador().encerrar()
+    return {'tempos': tempos, 'pesados_na_importacao': carregados}
+
+
+def rodar_filho(cenario: str, pdf: Path, ambiente: dict) -> dict:
+    processo = subprocess.run([sys.executable, __file__, '--filho', cenario, '--pdf', str(pdf)],
+                              env=ambiente, capture_output=True, text=True, cwd=RAIZ)
+    for linha in reversed(processo.stdout.splitlines()):
+        if linha.startswith(MARCA):
+            return json.loads(linha[len(MARCA):])
+    raise RuntimeError(f"Rodada {cenario} falhou:\n{processo.stdout[-2000:]}\n{processo.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rodadas', type=int, default=5, help='processos por cenário')
+    parser.add_argument('--latencia', type=float, default=0.0, help='latência da API falsa (s)')
+    parser.add_argument('--limite-importacao-ms', type=float, default=None,
+                        help='falha se a mediana de import app passar disto')
+    parser.add_argument('--filho', choices=CENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(MARCA + json.dumps(medir_processo(args.filho, Path(args.pdf))))
+        return 0
+
+    from benchmarks.api_falsa import iniciar_servidor
+    from benchmarks.corpus import gerar_corpus
+
+    servidor = iniciar_servidor(latencia=args.latencia)
+    with tempfile.TemporaryDirectory() as diretorio:
+        pdf, _ = gerar_corpus(Path(diretorio) / 'corpus', 1)[0]
+        ambiente = {**os.environ, 'ANTHROPIC_API_KEY': 'chave-falsa', 'ANTHROPIC_BASE_URL': servidor.url,
+                    'NF_CACHE_DIR': str(Path(diretorio) / 'cache'), 'NF_ARMAZEM_DIR': str(Path(diretorio) / 'armazem'),
+                    'NF_AQUECER_NA_IMPORTACAO': '0'}
+
+        print(f"Inicialização do app, mediana de {args.rodadas} processo(s) por cenário (ms):")
+        print(f"  {'cenário':<10}" + ''.join(f"{etapa:>13}" for etapa in ETAPAS))
+        importacao, pesados = {}, set()
+        for cenario in CENARIOS:
+            rodadas = [rodar_filho(cenario, pdf, ambiente) for _ in range(args.rodadas)]
+            medianas = {etapa: statistics.median(rodada['tempos'][etapa] for rodada in rodadas)
+                        for etapa in ETAPAS if etapa in rodadas[0]['tempos']}
+            importacao[cenario] = medianas['importacao']
+            pesados.update(nome for rodada in rodadas for nome in rodada['pesados_na_importacao'])
+            print(f"  {cenario:<10}" + ''.join(f"{medianas[etapa]:13.0f}" if etapa in medianas else f"{'-':>13}"
+                                               for etapa in ETAPAS))
+    servidor.parar()
+
+    print(f"\nDependências pesadas importadas com o app: {', '.join(sorted(pesados)) or 'nenhuma'}")
+    if args.limite_importacao_ms is not None:
+        lenta = max(importacao.values()) > args.limite_importacao_ms
+        if lenta or pesados:
+            print(f"❌ Regressão: import app acima de {args.limite_importacao_ms:.0f} ms ou com dependências pesadas")
+            return 1
+        print(f"✅ import app abaixo de {args.limite_importacao_ms:.0f} ms, sem dependências pesadas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Benchmark do pipeline de análise por etapa
+Passa um corpus de NFS-e sintéticas (benchmarks/corpus.py) pelo
+AnalisadorClaudeAPI com um backend Claude falso e mede, por etapa:
+
+  renderizacao  página -> imagem (Renderizador, inclui hash e cache de páginas)
+  codificacao   base64 e montagem do bloco (ou leitura do texto, estratégia texto)
+  texto         tentativa pela camada de texto (modos auto/texto)
+  rede          client.messages.create (latência simulada + SDK/HTTP no backend http)
+  json          leitura da resposta (entrada da ferramenta de extração)
+  nota_fiscal   construção da NotaFiscal
+  total         analisar() completo
+
+Reporta vazão e p50/p95/p99 de cada etapa; com --flask repete o corpus como
+carga concorrente contra POST /analyze (servidor local, ou --url de um já no ar).
+
+Backends:
+  memoria  ClienteFalso em memória (só o nosso código)
+  http     SDK anthropic real contra a API falsa local (inclui SDK + HTTP)
+
+Uso:
+    python benchmarks/bench_pipeline.py --notas 200 --latencia 0.5 --concorrencia 8
+    python benchmarks/bench_pipeline.py --corpus /tmp/corpus --backend http --flask --requisicoes 300
+    python benchmarks/bench_pipeline.py --respostas gravadas.jsonl --estrategia imagem_compacta
+"""
+
+import os
+import sys
+import time
+import uuid
+import tempfile
+import argparse
+import itertools
+import threading
+import http.client
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import (AnalisadorClaudeAPI, ESTRATEGIAS_ENTRADA, MODOS_EXTRACAO, ErroAnalise,
+                                   criar_cliente_anthropic, registrar_analisador)
+from renderizador import Renderizador
+from benchmarks.api_falsa import RESPOSTA_PADRAO, iniciar_servidor
+from benchmarks.cliente_falso import ClienteFalso, carregar_respostas
+from benchmarks.corpus import carregar_corpus, gerar_corpus
+
+ETAPAS = ('renderizacao', 'codificacao', 'texto', 'rede', 'json', 'nota_fiscal', 'total')
+
+
+class Cronometro:
+    """Tempos por etapa (ms), de várias threads; acumula também por thread para etapas derivadas"""
+
+    def __init__(self):
+        self.tempos: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def registrar(self, etapa: str, ms: float):
+        with self._lock:
+            self.tempos[etapa].append(ms)
+        acumulado = getattr(self._local, 'acumulado', None)
+        if acumulado is None:
+            acumulado = self._local.acumulado = defaultdict(float)
+        acumulado[etapa] += ms
+
+    def acumulado(self, etapa: str) -> float:
+        return getattr(self._local, 'acumulado', {}).get(etapa, 0.0)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(etapa, (time.perf_counter() - inicio) * 1000)
+
+    def limpar(self):
+        with self._lock:
+            self.tempos.clear()
+
+
+class RenderizadorCronometrado(Renderizador):
+    def __init__(self, cronometro: Cronometro, **kwargs):
+        super().__init__(**kwargs)
+        self.cronometro = cronometro
+
+    def renderizar(self, *args, **kwargs):
+        with self.cronometro.medir('renderizacao'):
+            return super().renderizar(*args, **kwargs)
+
+
+class AnalisadorCronometrado(AnalisadorClaudeAPI):
+    """AnalisadorClaudeAPI com as etapas cronometradas (mesmo código, só envolvido)"""
+
+    def __init__(self, cronometro: Cronometro, **kwargs):
+        super().__init__(**kwargs)
+        self.cronometro = cronometro
+        cliente = self.client
+        self.client = SimpleNamespace(messages=SimpleNamespace(create=self._criar_mensagem),
+                                      close=getattr(cliente, 'close', lambda: None))
+        self._cliente_real = cliente
+
+    def _criar_mensagem(self, **parametros):
+        with self.cronometro.medir('rede'):
+            return self._cliente_real.messages.create(**parametros)
+
+    def analisar(self, *args, **kwargs):
+        with self.cronometro.medir('total'):
+            return super().analisar(*args, **kwargs)
+
+    def _campos_por_texto(self, *args, **kwargs):
+        with self.cronometro.medir('texto'):
+            return super()._campos_por_texto(*args, **kwargs)
+
+    def montar_conteudo(self, *args, **kwargs):
+        renderizacao_antes = self.cronometro.acumulado('renderizacao')
+        inicio = time.perf_counter()
+        resultado = super().montar_conteudo(*args, **kwargs)
+        ms = (time.perf_counter() - inicio) * 1000
+        self.cronometro.registrar('codificacao', ms - (self.cronometro.acumulado('renderizacao') - renderizacao_antes))
+        return resultado
+
+    def interpretar_resposta(self, *args, **kwargs):
+        json_antes = self.cronometro.acumulado('json')
+        inicio = time.perf_counter()
+        nota = super().interpretar_resposta(*args, **kwargs)
+        ms = (time.perf_counter() - inicio) * 1000
+        self.cronometro.registrar('nota_fiscal', ms - (self.cronometro.acumulado('json') - json_antes))
+        return nota
+
+    def _dados_da_resposta(self, response):
+        with self.cronometro.medir('json'):
+            return super()._dados_da_resposta(response)
+
+
+def percentil(valores: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo (valores já ordenados)"""
+    if not valores:
+        return 0.0
+    posto = max(int(round(p / 100 * len(valores) + 0.5)) - 1, 0)
+    return valores[min(posto, len(valores) - 1)]
+
+
+def imprimir_tempos(titulo: str, tempos: Dict[str, List[float]], etapas=ETAPAS):
+    print(f"\n{titulo}")
+    cabecalho = f"  {'etapa':<14} {'n':>6} {'média ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}"
+    print(cabecalho)
+    print('  ' + '-' * (len(cabecalho) - 2))
+    for etapa in etapas:
+        valores = sorted(tempos.get(etapa, []))
+        if not valores:
+            continue
+        print(f"  {etapa:<14} {len(valores):>6} {sum(valores) / len(valores):>10.2f} "
+              f"{percentil(valores, 50):>10.2f} {percentil(valores, 95):>10.2f} {percentil(valores, 99):>10.2f}")
+
+
+def criar_cliente(args, respostas) -> tuple:
+    """(cliente, servidor da API falsa ou None) conforme --backend"""
+    if args.backend == 'memoria':
+        return ClienteFalso(respostas, latencia=args.latencia, variacao=args.variacao), None
+
+    respostas = respostas or [RESPOSTA_PADRAO]
+    indices = itertools.count()
+    servidor = iniciar_servidor(latencia=args.latencia, variacao=args.variacao,
+                                resposta=lambda pedido: respostas[next(indices) % len(respostas)])
+    return criar_cliente_anthropic(api_key='chave-falsa', base_url=servidor.url), servidor
+
+
+def rodar_pipeline(analisador: AnalisadorCronometrado, pdfs: List[Path], concorrencia: int) -> float:
+    """Analisa todos os PDFs com `concorrencia` threads; retorna o tempo total em segundos"""
+    def analisar(pdf):
+        try:
+            return analisador.analisar(str(pdf))
+        except ErroAnalise:
+            return None
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(concorrencia) as pool:
+        notas = list(pool.map(analisar, pdfs))
+    duracao = time.perf_counter() - inicio
+    falhas = sum(1 for nota in notas if nota is None)
+    vazias = sum(1 for nota in notas if nota is not None and nota.numero == "DESCONHECIDO")
+    print(f"\nPipeline: {len(pdfs)} notas, {concorrencia} threads: {duracao:.2f} s, "
+          f"{len(pdfs) / duracao:.1f} notas/s, {falhas} falhas, {vazias} notas vazias")
+    return duracao
+
+
+def corpo_multipart(pdf: Path) -> tuple:
+    """(corpo, content-type) de um upload no campo 'pdf'"""
+    fronteira = uuid.uuid4().hex
+    corpo = (f"--{fronteira}\r\nContent-Disposition: form-data; name=\"pdf\"; filename=\"{pdf.name}\"\r\n"
+             f"Content-Type: application/pdf\r\n\r\n").encode() + pdf.read_bytes() + f"\r\n--{fronteira}--\r\n".encode()
+    return corpo, f"multipart/form-data; boundary={fronteira}"
+
+
+def carga_flask(url: str, pdfs: List[Path], requisicoes: int, concorrencia: int, rota: str):
+    """POSTs concorrentes em `rota` (uma conexão keep-alive por thread)"""
+    destino = urlsplit(url)
+    corpos = [corpo_multipart(pdf) for pdf in pdfs]
+    proxima = itertools.count()
+    latencias: List[float] = []
+    erros = []
+    lock = threading.Lock()
+
+    def trabalhador():
+        conexao = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=300)
+        while True:
+            indice = next(proxima)
+            if indice >= requisicoes:
+                break
+            corpo, tipo = corpos[indice % len(corpos)]
+            inicio = time.perf_counter()
+            try:
+                conexao.request('POST', rota, body=corpo, headers={'Content-Type': tipo})
+                resposta = conexao.getresponse()
+                conteudo = resposta.read()
+                ok = resposta.status == 200 and b'"success":true' in conteudo.replace(b' ', b'')
+            except Exception as e:
+                ok, conteudo = False, str(e).encode()
+                conexao.close()
+                conexao = http.client.HTTPConnection(destino.hostname, destino.port or 80, timeout=300)
+            ms = (time.perf_counter() - inicio) * 1000
+            with lock:
+                latencias.append(ms)
+                if not ok:
+                    erros.append(conteudo[:200])
+        conexao.close()
+
+    inicio = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador) for _ in range(concorrencia)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+
+    print(f"\nCarga em {url}{rota}: {requisicoes} requisições, {concorrencia} clientes: {duracao:.2f} s, "
+          f"{requisicoes / duracao:.1f} req/s, {len(erros)} erros")
+    if erros:
+        print(f"  primeiro erro: {erros[0]!r}")
+    imprimir_tempos('Latência HTTP', {'requisicao': latencias}, etapas=('requisicao',))
+
+
+def servidor_flask_local(analisador: AnalisadorClaudeAPI) -> tuple:
+    """Sobe app.app em um servidor werkzeug com threads, usando o analisador informado"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    import app as aplicacao
+
+    class SemLog(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    registrar_analisador(analisador)
+    servidor = make_server('127.0.0.1', 0, aplicacao.app, threaded=True, request_handler=SemLog)
+    threading.Thread(target=servidor.serve_forever, name='flask-bench', daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=None, help='diretório de PDFs (padrão: gera um corpus temporário)')
+    parser.add_argument('--notas', type=int, default=100, help='tamanho do corpus gerado')
+    parser.add_argument('--respostas', default=None,
+                        help='respostas gravadas (.jsonl/.json/diretório; padrão: respostas.jsonl do corpus)')
+    parser.add_argument('--backend', choices=('memoria', 'http'), default='memoria')
+    parser.add_argument('--latencia', type=float, default=0.5, help='segundos por resposta do Claude falso')
+    parser.add_argument('--variacao', type=float, default=0.2, help='segundos aleatórios somados à latência')
+    parser.add_argument('--modo', choices=MODOS_EXTRACAO, default='claude')
+    parser.add_argument('--estrategia', choices=ESTRATEGIAS_ENTRADA, default='imagem')
+    parser.add_argument('--concorrencia', type=int, default=4, help='threads do pipeline / clientes da carga')
+    parser.add_argument('--render-processos', type=int, default=2, help='NF_RENDER_PROCESSOS (0 = na thread)')
+    parser.add_argument('--flask', action='store_true', help='também mede carga concorrente em POST /analyze')
+    parser.add_argument('--url', default=None, help='servidor já no ar para a carga (padrão: sobe app.py local)')
+    parser.add_argument('--rota', default='/analyze', help='rota da carga (ex: /analyze/async)')
+    parser.add_argument('--requisicoes', type=int, default=None, help='requisições da carga (padrão: tamanho do corpus)')
+    args = parser.parse_args()
+
+    if args.corpus:
+        pdfs = carregar_corpus(Path(args.corpus))
+        diretorio = Path(args.corpus)
+    else:
+        diretorio = Path(tempfile.mkdtemp(prefix='nf_corpus_'))
+        pdfs = [caminho for caminho, _ in gerar_corpus(diretorio, args.notas)]
+    if not pdfs:
+        parser.error('corpus sem PDFs')
+
+    origem_respostas = args.respostas or (diretorio / 'respostas.jsonl')
+    respostas = carregar_respostas(str(origem_respostas)) if Path(origem_respostas).exists() else None
+
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'chave-falsa')
+    # Sem limites de taxa do agendador: o benchmark mede o pipeline, não a fila
+    os.environ.setdefault('NF_API_RPM', '0')
+    os.environ.setdefault('NF_API_TPM', '0')
+
+    cliente, servidor_api = criar_cliente(args, respostas)
+    cronometro = Cronometro()
+    # Cache de páginas desligado: cada nota mede a renderização completa
+    renderizador = RenderizadorCronometrado(cronometro, processos=args.render_processos, max_cache_bytes=0)
+    analisador = AnalisadorCronometrado(
+        cronometro, client=cliente, cache=None, armazem=None, modo_extracao=args.modo,
+        estrategia_entrada=args.estrategia, renderizador=renderizador,
+    )
+
+    print(f"Corpus: {len(pdfs)} PDFs em {diretorio} | backend {args.backend} | "
+          f"latência {args.latencia * 1000:.0f}±{args.variacao * 1000:.0f} ms | "
+          f"modo {args.modo} | estratégia {args.estrategia} | render em {args.render_processos} processos")
+
+    # Aquece o pool de processos e imports antes de medir
+    analisador.analisar(str(pdfs[0]))
+    cronometro.limpar()
+
+    rodar_pipeline(analisador, pdfs, args.concorrencia)
+    imprimir_tempos('Tempo por etapa (pipeline)', cronometro.tempos)
+
+    if args.flask or args.url:
+        cronometro.limpar()
+        servidor_flask = None
+        url = args.url
+        if url is None:
+            servidor_flask, url = servidor_flask_local(analisador)
+        carga_flask(url, pdfs, args.requisicoes or len(pdfs), args.concorrencia, args.rota)
+        if servidor_flask is not None:
+            imprimir_tempos('Tempo por etapa (dentro do servidor, sob carga)', cronometro.tempos)
+            servidor_flask.shutdown()
+
+    renderizador.encerrar()
+    if servidor_api is not None:
+        servidor_api.parar()
+
+
+if __name__ == '__main__':
+    main()
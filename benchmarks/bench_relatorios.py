@@ -0,0 +1,95 @@
+"""
+Benchmark dos relatórios de retenções sobre o armazém de notas
+Grava N notas sintéticas (padrão 100.000) em um armazém temporário e compara, para os
+totais mensais por prestador:
+
+  por nota  lê o JSON de cada nota, monta a NotaFiscal e soma em Decimal no Python
+            (o que daria para fazer com nota_de_dict + total_retencoes)
+  SQL       relatorios.totais_retencoes: GROUP BY sobre as colunas em centavos
+
+Também mede relatorios.resumo_verificacoes (uma passada com as três verificações)
+e o pico de memória Python de cada caminho (tracemalloc).
+
+Uso:
+    python benchmarks/bench_relatorios.py
+    python benchmarks/bench_relatorios.py --notas 20000 --repeticoes 5
+"""
+
+import sys
+import json
+import random
+import argparse
+import tempfile
+import tracemalloc
+from collections import defaultdict
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analisador_claude_api import nota_de_dict, nota_para_dict
+from armazem_notas import ArmazemNotas
+from bench_exportacao import medir, nota_sintetica
+import relatorios
+
+NOTAS_POR_PDF = 50
+SOMAS = ['notas', 'valor_total', 'valor_iss', *relatorios.RETENCOES]
+
+
+def totais_por_nota(armazem: ArmazemNotas) -> dict:
+    """Mesmos totais de totais_retencoes(agrupar='prestador'), nota a nota no Python"""
+    totais = defaultdict(lambda: defaultdict(Decimal))
+    for linha in armazem.executar("SELECT prestador_cnpj, data_emissao, dados FROM notas"):
+        nota = nota_de_dict(json.loads(linha['dados']))
+        grupo = totais[(linha['data_emissao'][:7], linha['prestador_cnpj'])]
+        grupo['notas'] += 1
+        grupo['valor_total'] += nota.valor_total or 0
+        for nome in SOMAS[2:]:
+            grupo[nome] += getattr(nota.dados_tributarios, nome) or 0
+    return totais
+
+
+def pico_de_memoria(funcao) -> float:
+    tracemalloc.start()
+    funcao()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notas', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        armazem = ArmazemNotas(diretorio)
+        aleatorio = random.Random(1)
+        for inicio in range(0, args.notas, NOTAS_POR_PDF):
+            notas = [nota_para_dict(nota_sintetica(i, aleatorio))
+                     for i in range(inicio, min(inicio + NOTAS_POR_PDF, args.notas))]
+            armazem.guardar(f"{inicio:064x}", f"lote_{inicio}.pdf", notas)
+
+        caminhos = [
+            ('por nota', lambda: totais_por_nota(armazem)),
+            ('SQL', lambda: list(relatorios.totais_retencoes(armazem))),
+            ('verificações', lambda: relatorios.resumo_verificacoes(armazem)),
+        ]
+        print(f"Relatórios sobre {args.notas} notas (melhor de {args.repeticoes}):")
+        print(f"  {'caminho':<13} {'segundos':>9} {'notas/s':>11} {'pico MB':>8}")
+        for caminho, funcao in caminhos:
+            segundos = medir(funcao, args.repeticoes)
+            print(f"  {caminho:<13} {segundos:9.3f} {args.notas / segundos:11.0f} {pico_de_memoria(funcao):8.1f}")
+
+        # Os dois caminhos têm de dar as mesmas somas, ao centavo
+        por_nota = {grupo: {nome: f"{valor:.2f}" if nome != 'notas' else valor for nome, valor in somas.items()}
+                    for grupo, somas in totais_por_nota(armazem).items()}
+        por_sql = {(linha['mes'], linha['prestador_cnpj']): {nome: linha[nome] for nome in SOMAS}
+                   for linha in relatorios.totais_retencoes(armazem)}
+        print(f"\n{len(por_sql)} grupos (mês × prestador); conferência: "
+              f"{'ok' if por_nota == por_sql else 'DIFERENTE'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Cliente Anthropic falso, em memória, para benchmarks
+Implementa client.messages.create (síncrono e assíncrono) devolvendo respostas
+gravadas em rodízio, com latência configurável. Diferente de api_falsa.py não
+passa por HTTP/SDK: mede só o nosso código.
+
+Também substitui client.beta.messages.batches (Message Batches API, ver lotes_api):
+o lote fica "in_progress" por duracao_lote segundos e cada requisição pode voltar
+como errored (overloaded_error) com probabilidade taxa_erro_lote.
+
+Respostas gravadas: arquivo .jsonl (uma por linha) ou diretório de .json; cada
+item pode ser o JSON da nota ou a mensagem completa da Messages API.
+"""
+
+import json
+import time
+import random
+import asyncio
+import itertools
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from benchmarks.api_falsa import RESPOSTA_PADRAO, montar_mensagem
+
+
+def carregar_respostas(origem: str) -> List[Dict[str, Any]]:
+    """Lê respostas gravadas de um .jsonl, de um .json ou de um diretório de .json"""
+    caminho = Path(origem)
+    if caminho.is_dir():
+        itens = [json.loads(arquivo.read_text(encoding='utf-8')) for arquivo in sorted(caminho.glob('*.json'))]
+    elif caminho.suffix == '.jsonl':
+        with open(caminho, encoding='utf-8') as arquivo:
+            itens = [json.loads(linha) for linha in arquivo if linha.strip()]
+    else:
+        itens = [json.loads(caminho.read_text(encoding='utf-8'))]
+    return [_nota_da_gravacao(item) for item in itens]
+
+
+def _nota_da_gravacao(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Mensagem completa gravada -> JSON da nota (texto ou tool_use)"""
+    if item.get('type') != 'message':
+        return item
+    for bloco in item.get('content', []):
+        if bloco.get('type') == 'tool_use':
+            return bloco['input']
+        if bloco.get('type') == 'text':
+            texto = bloco['text']
+            return json.loads(texto[texto.find('{'):texto.rfind('}') + 1])
+    raise ValueError("Mensagem gravada sem conteúdo de nota")
+
+
+def _objeto(valor: Any) -> Any:
+    """dict -> SimpleNamespace (recursivo), como os modelos do SDK expõem os campos"""
+    if isinstance(valor, dict):
+        # 'input' do tool_use continua dict, como no SDK
+        return SimpleNamespace(**{chave: v if chave == 'input' else _objeto(v) for chave, v in valor.items()})
+    if isinstance(valor, list):
+        return [_objeto(v) for v in valor]
+    return valor
+
+
+class _Mensagens:
+    def __init__(self, cliente: 'ClienteFalso'):
+        self._cliente = cliente
+
+    def create(self, **parametros):
+        atraso = self._cliente.sortear_latencia()
+        if atraso > 0:
+            time.sleep(atraso)
+        return self._cliente.responder(parametros)
+
+
+class _MensagensAsync(_Mensagens):
+    async def create(self, **parametros):
+        atraso = self._cliente.sortear_latencia()
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+        return self._cliente.responder(parametros)
+
+
+class _LotesFalsos:
+    """client.beta.messages.batches: create, retrieve, results e cancel"""
+
+    def __init__(self, cliente: 'ClienteFalso'):
+        self._cliente = cliente
+        self._lotes: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    def create(self, requests: List[Dict[str, Any]], betas: Optional[List[str]] = None, **_):
+        lote_id = f"msgbatch_falso_{next(self._ids):04d}"
+        self._lotes[lote_id] = {'requisicoes': list(requests), 'inicio': time.monotonic(), 'cancelado': False}
+        return self.retrieve(lote_id)
+
+    def _terminou(self, lote: Dict[str, Any]) -> bool:
+        return lote['cancelado'] or time.monotonic() - lote['inicio'] >= self._cliente.duracao_lote
+
+    def retrieve(self, lote_id: str):
+        lote = self._lotes[lote_id]
+        total = len(lote['requisicoes'])
+        terminou = self._terminou(lote)
+        contagem = SimpleNamespace(processing=0 if terminou else total, succeeded=total if terminou else 0,
+                                   errored=0, canceled=0, expired=0)
+        return SimpleNamespace(id=lote_id, type='message_batch', processing_status='ended' if terminou else 'in_progress',
+                               request_counts=contagem)
+
+    def cancel(self, lote_id: str):
+        self._lotes[lote_id]['cancelado'] = True
+        return self.retrieve(lote_id)
+
+    def results(self, lote_id: str):
+        lote = self._lotes[lote_id]
+        if not self._terminou(lote):
+            raise RuntimeError(f"Lote {lote_id} ainda em processamento")
+        for requisicao in lote['requisicoes']:
+            if lote['cancelado']:
+                resultado = SimpleNamespace(type='canceled')
+            elif random.random() < self._cliente.taxa_erro_lote:
+                erro = SimpleNamespace(type='overloaded_error', message='Overloaded')
+                resultado = SimpleNamespace(type='errored', error=SimpleNamespace(type='error', error=erro))
+            else:
+                resultado = SimpleNamespace(type='succeeded', message=self._cliente.responder(requisicao['params']))
+            yield SimpleNamespace(custom_id=requisicao['custom_id'], result=resultado)
+
+
+class ClienteFalso:
+    """Substitui anthropic.Anthropic no AnalisadorClaudeAPI(client=...)"""
+
+    def __init__(self, respostas: Optional[List[Dict[str, Any]]] = None,
+                 latencia: float = 0.0, variacao: float = 0.0, duracao_lote: float = 0.0,
+                 taxa_erro_lote: float = 0.0):
+        self.respostas = list(respostas or [RESPOSTA_PADRAO])
+        self.latencia = latencia
+        self.variacao = variacao
+        self.duracao_lote = duracao_lote
+        self.taxa_erro_lote = taxa_erro_lote
+        self.requisicoes = 0
+        self._proxima = itertools.count()
+        self._lock = threading.Lock()
+        self.messages = _Mensagens(self)
+        self.beta = SimpleNamespace(messages=SimpleNamespace(batches=_LotesFalsos(self)))
+
+    def sortear_latencia(self) -> float:
+        return self.latencia + random.uniform(0, self.variacao)
+
+    def responder(self, parametros: Dict[str, Any]) -> Any:
+        with self._lock:
+            self.requisicoes += 1
+            resposta = self.respostas[next(self._proxima) % len(self.respostas)]
+        return _objeto(montar_mensagem(parametros, resposta))
+
+    def close(self):
+        pass
+
+
+class ClienteFalsoAsync(ClienteFalso):
+    """Substitui anthropic.AsyncAnthropic no AsyncAnalisadorClaudeAPI(client=...)"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.messages = _MensagensAsync(self)
+
+    async def close(self):
+        pass
@@ -0,0 +1,184 @@
+"""
+Gerador de corpus sintético de NFS-e para benchmarks
+Cria PDFs com camada de texto nos layouts conhecidos (São Paulo, Rio de Janeiro),
+em um layout desconhecido (vai para o Claude no modo auto) e escaneados (só
+imagem, sem texto). Junto grava respostas.jsonl com o JSON esperado de cada
+nota, que serve de resposta gravada para o cliente falso.
+
+Uso:
+    python benchmarks/corpus.py /tmp/corpus --notas 200 --semente 7
+"""
+
+import io
+import json
+import random
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+TIPOS_NOTA = ('sao_paulo', 'rio_de_janeiro', 'desconhecido', 'escaneado')
+
+PRESTADORES = [
+    ('WEWORK SERVICOS DE ESCRITORIO LTDA', '12.345.678/0001-90'),
+    ('BETA CONSULTORIA EMPRESARIAL LTDA', '23.456.789/0001-01'),
+    ('GAMA TECNOLOGIA DA INFORMACAO S.A.', '34.567.890/0001-12'),
+    ('DELTA PRODUCOES ARTISTICAS EIRELI', '45.678.901/0001-23'),
+]
+TOMADOR = ('ALFA ENTRETENIMENTO S.A.', '98.765.432/0001-10')
+SERVICOS = [
+    'Locação de espaço de trabalho compartilhado',
+    'Consultoria em gestão empresarial',
+    'Licenciamento de software e suporte técnico',
+    'Produção de conteúdo audiovisual',
+]
+
+
+def valor_br(valor: float) -> str:
+    """96616.0 -> '96.616,00'"""
+    return f"{valor:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
+
+
+def pdf_texto(paginas: List[List[str]]) -> bytes:
+    """PDF mínimo (Helvetica, uma linha por item) com camada de texto"""
+    def escapar(texto):
+        return texto.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+    fonte = 3 + 2 * len(paginas)
+    objetos: List[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>", b""]
+    filhos = []
+    for linhas in paginas:
+        operacoes = ["BT /F1 9 Tf 40 800 Td 12 TL"] + [f"({escapar(l)}) '" for l in linhas] + ["ET"]
+        stream = "\n".join(operacoes).encode('cp1252')
+        numero = len(objetos) + 1
+        filhos.append(numero)
+        objetos.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                       b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (numero + 1, fonte))
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objetos.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+    objetos[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % f for f in filhos), len(filhos))
+
+    saida = bytearray(b"%PDF-1.4\n")
+    posicoes = []
+    for indice, objeto in enumerate(objetos, 1):
+        posicoes.append(len(saida))
+        saida += b"%d 0 obj\n" % indice + objeto + b"\nendobj\n"
+    xref = len(saida)
+    saida += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    saida += b"".join(b"%010d 00000 n \n" % p for p in posicoes)
+    saida += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(saida)
+
+
+def pdf_escaneado(linhas: List[str]) -> bytes:
+    """Página só com imagem (como um documento escaneado), sem camada de texto"""
+    from PIL import Image, ImageDraw
+
+    imagem = Image.new('L', (1240, 1754), 255)  # A4 a 150 DPI
+    desenho = ImageDraw.Draw(imagem)
+    for indice, linha in enumerate(linhas):
+        desenho.text((80, 80 + indice * 28), linha, fill=0)
+    buffer = io.BytesIO()
+    imagem.save(buffer, format='PDF', resolution=150)
+    return buffer.getvalue()
+
+
+def dados_nota(rng: random.Random, tipo: str) -> Dict[str, Any]:
+    """JSON da nota no formato de ESQUEMA_NOTA"""
+    prestador, cnpj = rng.choice(PRESTADORES)
+    valor = round(rng.uniform(500, 150000), 2)
+    aliquota = rng.choice([2.0, 3.0, 5.0])
+    municipio, estado = {
+        'sao_paulo': ('São Paulo', 'São Paulo'),
+        'rio_de_janeiro': ('Rio de Janeiro', 'Rio de Janeiro'),
+    }.get(tipo, ('Campinas', 'São Paulo'))
+    dia, mes = rng.randint(1, 28), rng.randint(1, 12)
+    return {
+        "numero": str(rng.randint(1000, 99999)),
+        "data_emissao": f"{dia:02d}/{mes:02d}/2024",
+        "vencimento": None,
+        "codigo_verificacao": f"{rng.randrange(16**4):04X}-{rng.randrange(16**4):04X}",
+        "prestador": {"nome": prestador, "cnpj": cnpj},
+        "tomador": {"nome": TOMADOR[0], "cnpj": TOMADOR[1]},
+        "municipio": municipio,
+        "estado": estado,
+        "valor_total": valor,
+        "valor_servicos": valor,
+        "discriminacao": rng.choice(SERVICOS),
+        "impostos": {
+            "iss": {"valor": round(valor * aliquota / 100, 2), "aliquota": aliquota, "base_calculo": valor},
+            "retencoes": {"pis": None, "cofins": None, "csll": None, "irrf": None, "inss": None, "iss_retido": None}
+        }
+    }
+
+
+def linhas_nota(dados: Dict[str, Any], tipo: str) -> List[str]:
+    """Texto da nota no layout da prefeitura"""
+    iss = dados['impostos']['iss']
+    cabecalho = {
+        'sao_paulo': ["PREFEITURA DO MUNICÍPIO DE SÃO PAULO", "SECRETARIA MUNICIPAL DA FAZENDA"],
+        'rio_de_janeiro': ["PREFEITURA DA CIDADE DO RIO DE JANEIRO", "NOTA CARIOCA"],
+    }.get(tipo, [f"PREFEITURA MUNICIPAL DE {dados['municipio'].upper()}"])
+    rotulo_total = "VALOR DA NOTA" if tipo == 'rio_de_janeiro' else "VALOR TOTAL DO SERVIÇO"
+    if tipo == 'desconhecido':
+        rotulo_total = "TOTAL GERAL DOS SERVIÇOS"
+    return cabecalho + [
+        "NOTA FISCAL ELETRÔNICA DE SERVIÇOS - NFS-e",
+        "Número da Nota", dados['numero'].zfill(8),
+        "Data e Hora de Emissão", f"{dados['data_emissao']} 10:20:30",
+        "Código de Verificação", dados['codigo_verificacao'],
+        "PRESTADOR DE SERVIÇOS",
+        f"CPF/CNPJ: {dados['prestador']['cnpj']} Inscrição Municipal: 1.234.567-8",
+        f"Nome/Razão Social: {dados['prestador']['nome']}",
+        f"Município: {dados['municipio']} UF: SP",
+        "TOMADOR DE SERVIÇOS",
+        f"Nome/Razão Social: {dados['tomador']['nome']}",
+        f"CPF/CNPJ: {dados['tomador']['cnpj']}",
+        "DISCRIMINAÇÃO DOS SERVIÇOS",
+        dados['discriminacao'],
+        f"{rotulo_total} = R$ {valor_br(dados['valor_total'])}",
+        "INSS (R$) IRRF (R$) CSLL (R$) COFINS (R$) PIS/PASEP (R$)", "- - - - -",
+        "Valor Total das Deduções (R$) Base de Cálculo (R$) Alíquota (%) Valor do ISS (R$) Crédito (R$)",
+        f"0,00 {valor_br(iss['base_calculo'])} {valor_br(iss['aliquota'])}% {valor_br(iss['valor'])} 0,00",
+    ]
+
+
+def gerar_corpus(diretorio: Path, quantidade: int, semente: int = 7,
+                 tipos: Tuple[str, ...] = TIPOS_NOTA) -> List[Tuple[Path, Dict[str, Any]]]:
+    """
+    Grava `quantidade` PDFs em diretorio (tipos alternados) e respostas.jsonl
+    Retorna [(caminho do PDF, JSON esperado)]
+    """
+    diretorio = Path(diretorio)
+    diretorio.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(semente)
+    corpus = []
+    with open(diretorio / 'respostas.jsonl', 'w', encoding='utf-8') as respostas:
+        for indice in range(quantidade):
+            tipo = tipos[indice % len(tipos)]
+            dados = dados_nota(rng, tipo)
+            linhas = linhas_nota(dados, tipo)
+            conteudo = pdf_escaneado(linhas) if tipo == 'escaneado' else pdf_texto([linhas])
+            caminho = diretorio / f"{indice:05d}_{tipo}.pdf"
+            caminho.write_bytes(conteudo)
+            respostas.write(json.dumps(dados, ensure_ascii=False) + "\n")
+            corpus.append((caminho, dados))
+    return corpus
+
+
+def carregar_corpus(diretorio: Path) -> List[Path]:
+    """PDFs de um corpus já gerado, em ordem"""
+    return sorted(Path(diretorio).glob('*.pdf'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('diretorio')
+    parser.add_argument('--notas', type=int, default=100)
+    parser.add_argument('--semente', type=int, default=7)
+    parser.add_argument('--tipos', default=','.join(TIPOS_NOTA), help='tipos separados por vírgula')
+    args = parser.parse_args()
+
+    tipos = tuple(t.strip() for t in args.tipos.split(',') if t.strip())
+    corpus = gerar_corpus(Path(args.diretorio), args.notas, args.semente, tipos)
+    print(f"{len(corpus)} PDFs gravados em {args.diretorio}")
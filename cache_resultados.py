@@ -0,0 +1,203 @@
+"""
+Cache de resultados de análise de NFS-e
+Evita chamar a Claude API de novo quando o mesmo PDF é reenviado
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+# Configuração padrão (pode ser sobrescrita pelo .env)
+CACHE_DIR_PADRAO = Path(tempfile.gettempdir()) / 'nf_analyzer_cache'
+CACHE_TTL_PADRAO = 30 * 24 * 3600  # 30 dias
+CACHE_MAX_ENTRADAS_PADRAO = 50000
+CACHE_MAX_MEMORIA_PADRAO = 512
+
+
+def calcular_chave(pdf_bytes: bytes, versao: str) -> str:
+    """
+    Gera a chave do cache: SHA-256 do conteúdo do PDF + versão do prompt/modelo
+    Dois uploads do mesmo arquivo geram a mesma chave, independente do nome
+    """
+    return chave_do_digest(hashlib.sha256(pdf_bytes).hexdigest(), versao)
+
+
+def chave_do_digest(digest: str, versao: str) -> str:
+    """Mesma chave de calcular_chave, a partir do SHA-256 já calculado"""
+    return f"{digest}:{versao}"
+
+
+class CacheResultados:
+    """
+    Cache em dois níveis:
+    - LRU em memória (por processo) para acertos instantâneos
+    - SQLite em disco, compartilhado entre workers e persistente entre reinícios
+
+    Entradas expiram por TTL e o disco é limitado a max_entradas (remove as menos acessadas)
+    """
+
+    def __init__(self, diretorio: Optional[Path] = None, ttl: int = CACHE_TTL_PADRAO,
+                 max_entradas: int = CACHE_MAX_ENTRADAS_PADRAO,
+                 max_memoria: int = CACHE_MAX_MEMORIA_PADRAO):
+        self.diretorio = Path(diretorio or CACHE_DIR_PADRAO)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.caminho_db = self.diretorio / 'resultados.sqlite3'
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.max_memoria = max_memoria
+
+        self._memoria: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # Contadores de uso
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+        self.gravacoes = 0
+        self.remocoes = 0
+
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS resultados (
+                    chave TEXT PRIMARY KEY,
+                    valor TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    acessado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_resultados_acessado ON resultados(acessado_em)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão SQLite por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.caminho_db), timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        """Retorna o resultado armazenado ou None"""
+        agora = time.time()
+
+        with self._lock:
+            item = self._memoria.get(chave)
+            if item is not None:
+                criado_em, valor = item
+                if agora - criado_em <= self.ttl:
+                    self._memoria.move_to_end(chave)
+                    self.hits_memoria += 1
+                    return json.loads(valor)
+                del self._memoria[chave]
+
+        with self._conexao() as conn:
+            row = conn.execute(
+                "SELECT valor, criado_em FROM resultados WHERE chave = ?", (chave,)
+            ).fetchone()
+            if row is not None and agora - row[1] > self.ttl:
+                conn.execute("DELETE FROM resultados WHERE chave = ?", (chave,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE resultados SET acessado_em = ? WHERE chave = ?", (agora, chave))
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits_disco += 1
+            self._guardar_memoria(chave, row[1], row[0])
+        return json.loads(row[0])
+
+    def guardar(self, chave: str, valor: Dict[str, Any]):
+        """Armazena um resultado (deve ser serializável em JSON)"""
+        agora = time.time()
+        valor_json = json.dumps(valor, ensure_ascii=False)
+
+        with self._conexao() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO resultados (chave, valor, criado_em, acessado_em) VALUES (?, ?, ?, ?)",
+                (chave, valor_json, agora, agora)
+            )
+            removidos = self._aplicar_limites(conn, agora)
+
+        with self._lock:
+            self.gravacoes += 1
+            self.remocoes += removidos
+            self._guardar_memoria(chave, agora, valor_json)
+
+    def _guardar_memoria(self, chave: str, criado_em: float, valor_json: str):
+        """Insere no LRU em memória (chamar com o lock adquirido)"""
+        self._memoria[chave] = (criado_em, valor_json)
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def _aplicar_limites(self, conn: sqlite3.Connection, agora: float) -> int:
+        """Remove entradas expiradas e as menos acessadas acima do limite"""
+        removidos = conn.execute(
+            "DELETE FROM resultados WHERE criado_em < ?", (agora - self.ttl,)
+        ).rowcount
+        total = conn.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+        excesso = total - self.max_entradas
+        if excesso > 0:
+            removidos += conn.execute(
+                "DELETE FROM resultados WHERE chave IN "
+                "(SELECT chave FROM resultados ORDER BY acessado_em ASC LIMIT ?)",
+                (excesso,)
+            ).rowcount
+        return removidos
+
+    def limpar(self):
+        """Remove todas as entradas (memória e disco)"""
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM resultados")
+        with self._lock:
+            self._memoria.clear()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores de uso do cache"""
+        with self._lock:
+            hits = self.hits_memoria + self.hits_disco
+            total = hits + self.misses
+            return {
+                'hits': hits,
+                'hits_memoria': self.hits_memoria,
+                'hits_disco': self.hits_disco,
+                'misses': self.misses,
+                'taxa_acerto': round(hits / total, 4) if total else 0.0,
+                'gravacoes': self.gravacoes,
+                'remocoes': self.remocoes,
+                'entradas_memoria': len(self._memoria),
+            }
+
+
+_cache_padrao: Optional[CacheResultados] = None
+_cache_padrao_lock = threading.Lock()
+
+
+def obter_cache_padrao() -> Optional[CacheResultados]:
+    """
+    Cache compartilhado pelo processo, configurado pelo ambiente:
+    NF_CACHE_DESATIVADO, NF_CACHE_DIR, NF_CACHE_TTL, NF_CACHE_MAX_ENTRADAS, NF_CACHE_MAX_MEMORIA
+    """
+    global _cache_padrao
+    if os.getenv('NF_CACHE_DESATIVADO', '').lower() in ('1', 'true', 'sim'):
+        return None
+
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CacheResultados(
+                diretorio=os.getenv('NF_CACHE_DIR') or None,
+                ttl=int(os.getenv('NF_CACHE_TTL', CACHE_TTL_PADRAO)),
+                max_entradas=int(os.getenv('NF_CACHE_MAX_ENTRADAS', CACHE_MAX_ENTRADAS_PADRAO)),
+                max_memoria=int(os.getenv('NF_CACHE_MAX_MEMORIA', CACHE_MAX_MEMORIA_PADRAO)),
+            )
+        return _cache_padrao
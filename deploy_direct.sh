@@ -30,7 +30,7 @@ tar -czf ${PROJECT_NAME}.tar.gz \
     --exclude='*.pyc' \
     --exclude='backup' \
     --exclude='.DS_Store' \
-    app.py analisador_claude_api.py \
+    app.py analisador_claude_api.py cache_resultados.py fila_jobs.py extrator_texto.py renderizador.py metricas.py documento_pdf.py linha_comando.py agendador.py lotes_api.py armazem_notas.py exportacao.py relatorios.py analisadores.py gunicorn.conf.py \
     requirements.txt templates static CLAUDE.md .env.example
 
 echo -e "${GREEN}Package created: ${PROJECT_NAME}.tar.gz${NC}"
@@ -100,7 +100,7 @@ After=network.target
 User=ubuntu
 WorkingDirectory=/home/ubuntu
 Environment="PATH=/home/ubuntu/venv/bin"
-ExecStart=/home/ubuntu/venv/bin/gunicorn --workers 2 --bind 0.0.0.0:8000 --timeout 120 app:app
+ExecStart=/home/ubuntu/venv/bin/gunicorn -c gunicorn.conf.py app:app
 Restart=always
 
 [Install]
@@ -116,7 +116,7 @@ server {
     listen 80;
     server_name _;
     
-    client_max_body_size 20M;
+    client_max_body_size 200M;
     
     location / {
         proxy_pass http://127.0.0.1:8000;
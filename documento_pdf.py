@@ -0,0 +1,143 @@
+"""
+Entrada de PDF para o analisador e o renderizador
+Aceita caminho, bytes, objeto de arquivo (inclusive o upload do Flask) ou um
+DocumentoPDF já aberto. Arquivos em disco são mapeados em memória (mmap): hash
+e base64 leem direto do arquivo, sem copiá-lo para o heap do Python, e
+renderização/camada de texto abrem o próprio caminho.
+
+Upload recebido em arquivo temporário é mapeado pelo descritor (o arquivo é
+apagado quando a requisição termina, o mapeamento continua válido); como não há
+caminho, a renderização usa uma cópia em bytes, feita uma vez por documento.
+"""
+
+import io
+import os
+import mmap
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Optional, Union
+
+NOME_PADRAO = 'documento.pdf'
+
+
+class DocumentoPDF:
+    """
+    Conteúdo de um PDF: bytes em memória ou mmap de um arquivo local
+    O SHA-256 é calculado uma vez e reaproveitado pelo cache e pelo renderizador
+    """
+
+    def __init__(self, dados: Union[bytes, mmap.mmap], nome: str = NOME_PADRAO, caminho: Optional[str] = None):
+        self.dados = dados
+        self.nome = nome
+        self.caminho = caminho
+        self._sha256: Optional[str] = None
+        self._copia: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tamanho(self) -> int:
+        return len(self.dados)
+
+    @property
+    def sha256(self) -> str:
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.dados).hexdigest()
+        return self._sha256
+
+    def origem(self) -> Union[str, bytes]:
+        """Caminho (se houver) ou bytes: o que pypdfium2 e o pool de processos recebem"""
+        return self.caminho if self.caminho is not None else self.conteudo()
+
+    def fluxo(self) -> Union[str, BinaryIO]:
+        """Caminho ou um BytesIO novo (pdfplumber, seguro para várias threads)"""
+        return self.caminho if self.caminho is not None else io.BytesIO(self.conteudo())
+
+    def conteudo(self) -> bytes:
+        """Bytes do PDF (mmap sem caminho é copiado na primeira chamada)"""
+        if isinstance(self.dados, bytes):
+            return self.dados
+        with self._lock:
+            if self._copia is None:
+                self._copia = self.dados[:]
+            return self._copia
+
+    def fechar(self):
+        if isinstance(self.dados, mmap.mmap):
+            self.dados.close()
+
+    def __enter__(self) -> 'DocumentoPDF':
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def __repr__(self) -> str:
+        return f"DocumentoPDF({self.nome!r}, {self.tamanho} bytes)"
+
+
+EntradaPDF = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO, DocumentoPDF, Any]
+
+
+def abrir_documento(origem: EntradaPDF, nome: Optional[str] = None) -> DocumentoPDF:
+    """
+    DocumentoPDF para a origem (o próprio objeto, se já for um)
+    - caminho: mmap do arquivo
+    - bytes/bytearray/memoryview: usados em memória
+    - upload do Flask (FileStorage): o stream do upload, com o nome do arquivo enviado
+    - BytesIO: o buffer interno (getvalue não copia)
+    - arquivo em disco (ex: upload grande, ver app.RequisicaoUpload): mmap pelo descritor
+    - demais objetos de arquivo: lidos a partir da posição atual
+    """
+    if isinstance(origem, DocumentoPDF):
+        return origem
+    if isinstance(origem, (str, os.PathLike)):
+        caminho = os.fspath(origem)
+        return _mapear(caminho, nome or Path(caminho).name)
+    if isinstance(origem, bytes):
+        return DocumentoPDF(origem, nome or NOME_PADRAO)
+    if isinstance(origem, (bytearray, memoryview)):
+        return DocumentoPDF(bytes(origem), nome or NOME_PADRAO)
+    if hasattr(origem, 'stream') and hasattr(origem, 'filename'):
+        return abrir_documento(origem.stream, nome or origem.filename)
+
+    nome = nome or _nome_do_arquivo(origem)
+    if isinstance(origem, io.BytesIO):
+        return DocumentoPDF(origem.getvalue(), nome)
+    try:
+        descritor = origem.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return DocumentoPDF(origem.read(), nome)
+    if hasattr(origem, 'flush'):
+        origem.flush()
+    return DocumentoPDF(_mapear_descritor(descritor), nome)
+
+
+@contextmanager
+def usar_documento(origem: EntradaPDF, nome: Optional[str] = None) -> Iterator[DocumentoPDF]:
+    """abrir_documento; fecha ao sair apenas o que foi aberto aqui"""
+    documento = abrir_documento(origem, nome)
+    try:
+        yield documento
+    finally:
+        if documento is not origem:
+            documento.fechar()
+
+
+def _mapear(caminho: str, nome: str) -> DocumentoPDF:
+    with open(caminho, 'rb') as arquivo:
+        return DocumentoPDF(_mapear_descritor(arquivo.fileno()), nome, caminho)
+
+
+def _mapear_descritor(descritor: int) -> Union[bytes, mmap.mmap]:
+    """mmap somente leitura; o mmap duplica o descritor e segue válido após o arquivo ser fechado"""
+    if os.fstat(descritor).st_size == 0:
+        # mmap não aceita arquivo vazio
+        return b''
+    return mmap.mmap(descritor, 0, access=mmap.ACCESS_READ)
+
+
+def _nome_do_arquivo(origem: Any) -> str:
+    nome = getattr(origem, 'name', None)
+    return Path(nome).name if isinstance(nome, str) and nome else NOME_PADRAO
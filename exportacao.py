@@ -0,0 +1,148 @@
+"""
+Exportação de notas em colunas: CSV, JSONL, Arrow (Feather) e Parquet
+As notas viram um dict de colunas (uma lista por campo) em uma passada por coluna:
+a conversão de cada campo (Decimal para texto, listas para JSON) é decidida uma vez
+pelo tipo do dataclass, não a cada valor, e a tabela Arrow sai direto das colunas.
+
+Mesmo formato de linha_comando analyze: dados_tributarios achatado, Decimal como
+texto (sem perda de precisão), listas e dicts como JSON; o JSONL mantém o formato
+de nota_para_dict.
+
+Uso:
+    from exportacao import exportar
+    exportar(notas, 'notas.csv')                       # ou .jsonl, .arrow, .parquet
+    exportar(notas, 'notas.csv', arquivo=nomes)        # colunas extras, uma por nota
+"""
+
+import csv
+import json
+import operator
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO, Union, get_origin
+
+from analisador_claude_api import DadosTributarios, NotaFiscal, campos_do_dataclass, nota_para_dict
+
+FORMATOS_EXPORTACAO = ('jsonl', 'csv', 'arrow', 'parquet')
+
+# Colunas das saídas tabulares: campos da NotaFiscal com dados_tributarios achatado
+COLUNAS_NOTA = [nome for nome, _ in campos_do_dataclass(NotaFiscal) if nome != 'dados_tributarios'] + \
+    [nome for nome, _ in campos_do_dataclass(DadosTributarios)]
+COLUNAS_ORIGEM = ['arquivo', 'sha256', 'nota_indice']
+COLUNAS = COLUNAS_ORIGEM + COLUNAS_NOTA
+
+_codificar_json = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _tipo_do_campo(tipo: Any) -> Any:
+    """Optional[X] -> X; List[...]/Dict[...] -> list/dict"""
+    if get_origin(tipo) is Union:
+        tipo = tipo.__args__[0]
+    return get_origin(tipo) or tipo
+
+
+def _montar_leitores() -> List[tuple]:
+    """(coluna, leitor do valor na NotaFiscal, tipo do campo) para cada coluna da nota"""
+    tipos = {f.name: _tipo_do_campo(f.type) for cls in (NotaFiscal, DadosTributarios)
+             for f in cls.__dataclass_fields__.values()}
+    tributarios = {nome for nome, _ in campos_do_dataclass(DadosTributarios)}
+    return [(coluna, operator.attrgetter(f"dados_tributarios.{coluna}" if coluna in tributarios else coluna),
+             tipos[coluna]) for coluna in COLUNAS_NOTA]
+
+
+_LEITORES = _montar_leitores()
+
+
+def colunas_das_notas(notas: Sequence[NotaFiscal], **extras: Sequence[Any]) -> Dict[str, List[Any]]:
+    """
+    Notas -> {coluna: valores}, na ordem de COLUNAS
+    extras: colunas de origem (arquivo, sha256, nota_indice...), uma entrada por nota
+    """
+    colunas = {coluna: list(valores) for coluna, valores in extras.items()}
+    for coluna, leitor, tipo in _LEITORES:
+        valores = list(map(leitor, notas))
+        if tipo in (list, dict):
+            valores = [None if valor is None else _codificar_json(valor) for valor in valores]
+        elif tipo not in (str, bool, int, float):
+            # Decimal (e o que mais não for tipo nativo do CSV/Arrow) vai como texto
+            valores = [None if valor is None else str(valor) for valor in valores]
+        colunas[coluna] = valores
+    return colunas
+
+
+def registros_das_notas(notas: Sequence[NotaFiscal], **extras: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Registros do JSONL: colunas extras seguidas de nota_para_dict (dados_tributarios aninhado)"""
+    if not extras:
+        return [nota_para_dict(nota) for nota in notas]
+    nomes = list(extras)
+    return [{**dict(zip(nomes, origem)), **nota_para_dict(nota)}
+            for nota, origem in zip(notas, zip(*extras.values()))]
+
+
+def escrever_csv(colunas: Dict[str, List[Any]], arquivo: TextIO, cabecalho: bool = True):
+    """Grava as colunas como linhas CSV (arquivo aberto com newline='')"""
+    escritor = csv.writer(arquivo)
+    if cabecalho:
+        escritor.writerow(colunas)
+    escritor.writerows(zip(*colunas.values()))
+
+
+def escrever_jsonl(registros: Iterable[Dict[str, Any]], arquivo: TextIO):
+    """Um registro por linha, em uma única escrita"""
+    arquivo.write(''.join(f"{_codificar_json(registro)}\n" for registro in registros))
+
+
+def _importar_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("Módulo pyarrow não instalado. Instale com: pip install pyarrow")
+    return pyarrow
+
+
+def esquema_arrow(colunas: Iterable[str]):
+    """Tipos pelos campos do dataclass; Decimal fica como texto, sem perda de precisão"""
+    pa = _importar_pyarrow()
+    tipos = {'nota_indice': pa.int64()}
+    for coluna, _, tipo in _LEITORES:
+        tipos[coluna] = {bool: pa.bool_(), int: pa.int64(), float: pa.float64()}.get(tipo, pa.string())
+    return pa.schema([(coluna, tipos.get(coluna, pa.string())) for coluna in colunas])
+
+
+def tabela_arrow(colunas: Dict[str, List[Any]]):
+    """pyarrow.Table direto das colunas (sem passar por um dict por linha)"""
+    pa = _importar_pyarrow()
+    return pa.Table.from_pydict(colunas, schema=esquema_arrow(colunas))
+
+
+def formato_do_destino(destino: Path) -> str:
+    formato = {'feather': 'arrow'}.get(destino.suffix.lstrip('.').lower(), destino.suffix.lstrip('.').lower())
+    if formato not in FORMATOS_EXPORTACAO:
+        raise ValueError(f"Formato de exportação não reconhecido: {destino.name} "
+                         f"(use .jsonl, .csv, .arrow ou .parquet)")
+    return formato
+
+
+def exportar(notas: Sequence[NotaFiscal], destino: Union[str, Path], formato: Optional[str] = None,
+             **extras: Sequence[Any]) -> int:
+    """
+    Grava as notas em destino (formato pela extensão, se não informado); devolve quantas foram gravadas
+    extras: colunas adicionais, uma entrada por nota (ex: arquivo=[...], sha256=[...])
+    Arrow e Parquet requerem pyarrow
+    """
+    destino = Path(destino)
+    formato = formato or formato_do_destino(destino)
+    if formato == 'jsonl':
+        with open(destino, 'w', encoding='utf-8') as arquivo:
+            escrever_jsonl(registros_das_notas(notas, **extras), arquivo)
+    elif formato == 'csv':
+        with open(destino, 'w', encoding='utf-8', newline='') as arquivo:
+            escrever_csv(colunas_das_notas(notas, **extras), arquivo)
+    else:
+        tabela = tabela_arrow(colunas_das_notas(notas, **extras))
+        if formato == 'arrow':
+            import pyarrow.feather
+            pyarrow.feather.write_feather(tabela, str(destino))
+        else:
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(tabela, str(destino))
+    return len(notas)
@@ -0,0 +1,280 @@
+"""
+Extração determinística de NFS-e pela camada de texto do PDF
+PDFs gerados digitalmente pelas prefeituras já trazem o texto; para os layouts
+conhecidos os campos são lidos por expressões regulares, sem renderizar imagem
+nem chamar a Claude API. Resultados com confiança baixa voltam para o Claude.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import BinaryIO, Dict, List, Optional, Tuple, Any, Union
+
+# Texto menor que isso indica PDF escaneado (sem camada de texto útil)
+MIN_CARACTERES_TEXTO = 200
+
+# Confiança mínima para aceitar o resultado sem chamar o Claude
+CONFIANCA_MINIMA_PADRAO = 85.0
+
+RE_CNPJ = re.compile(r'\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}|\d{3}\.\d{3}\.\d{3}-\d{2}')
+RE_DATA = r'(\d{2}/\d{2}/\d{4})'
+RE_VALOR = r'(\d{1,3}(?:\.\d{3})*,\d{2})'
+RE_TOKEN_TABELA = re.compile(r'-|\d{1,3}(?:\.\d{3})*,\d{2,4}\s*%?')
+RE_UNIDADE_COLUNA = re.compile(r'\((?:R\$|%)\)')
+
+
+@dataclass
+class LayoutMunicipal:
+    """Layout de NFS-e de uma prefeitura e os rótulos que ela usa"""
+    nome: str
+    municipio: str
+    estado: str
+    identificadores: List[str]
+    numero: List[str]
+    data_emissao: List[str]
+    codigo_verificacao: List[str]
+    valor_total: List[str]
+    inicio_prestador: str = r'PRESTADOR DE SERVI[ÇC]OS'
+    inicio_tomador: str = r'TOMADOR DE SERVI[ÇC]OS'
+    fim_tomador: str = r'INTERMEDI[ÁA]RIO|DISCRIMINA[ÇC][ÃA]O|VALOR TOTAL|VALOR DA NOTA'
+    rotulos_nome: List[str] = field(default_factory=lambda: [
+        r'Nome\s*/\s*Raz[ãa]o Social\s*:?\s*(.+)',
+        r'Raz[ãa]o Social\s*:?\s*(.+)',
+    ])
+
+
+LAYOUTS = [
+    LayoutMunicipal(
+        nome='São Paulo',
+        municipio='São Paulo',
+        estado='SP',
+        identificadores=[r'PREFEITURA DO MUNIC[ÍI]PIO DE S[ÃA]O PAULO'],
+        numero=[r'N[úu]mero da Nota\s*:?\s*(\d+)'],
+        data_emissao=[r'Data e Hora de Emiss[ãa]o\s*:?\s*' + RE_DATA],
+        codigo_verificacao=[r'C[óo]digo de Verifica[çc][ãa]o\s*:?\s*([A-Z0-9-]{4,})'],
+        valor_total=[r'VALOR TOTAL DO SERVI[ÇC]O\s*=?\s*R\$\s*' + RE_VALOR],
+    ),
+    LayoutMunicipal(
+        nome='Rio de Janeiro',
+        municipio='Rio de Janeiro',
+        estado='RJ',
+        identificadores=[r'PREFEITURA DA CIDADE DO RIO DE JANEIRO', r'NOTA CARIOCA'],
+        numero=[r'N[úu]mero da Nota\s*:?\s*(\d+)'],
+        data_emissao=[r'Data e Hora de Emiss[ãa]o\s*:?\s*' + RE_DATA],
+        codigo_verificacao=[r'C[óo]digo de Verifica[çc][ãa]o\s*:?\s*([A-Z0-9-]{4,})'],
+        valor_total=[r'VALOR DA NOTA\s*=?\s*R\$\s*' + RE_VALOR,
+                     r'VALOR TOTAL DA NOTA\s*=?\s*R\$\s*' + RE_VALOR],
+    ),
+    LayoutMunicipal(
+        nome='Belo Horizonte',
+        municipio='Belo Horizonte',
+        estado='MG',
+        identificadores=[r'PREFEITURA (?:MUNICIPAL )?DE BELO HORIZONTE'],
+        numero=[r'N[ºo°]\s*(?:da Nota)?\s*:?\s*(\d{4,}/?\d*)', r'N[úu]mero da Nota\s*:?\s*(\d+)'],
+        data_emissao=[r'Emitida em\s*:?\s*' + RE_DATA, r'Data (?:e Hora )?de Emiss[ãa]o\s*:?\s*' + RE_DATA],
+        codigo_verificacao=[r'C[óo]digo de Verifica[çc][ãa]o\s*:?\s*([A-Za-z0-9-]{4,})'],
+        valor_total=[r'Valor Total da Nota\s*:?\s*R\$\s*' + RE_VALOR,
+                     r'VALOR TOTAL DA NOTA\s*=?\s*R\$\s*' + RE_VALOR],
+        inicio_prestador=r'Prestador de Servi[çc]os',
+        inicio_tomador=r'Tomador de Servi[çc]os',
+        fim_tomador=r'Discrimina[çc][ãa]o dos Servi[çc]os|Valor Total',
+    ),
+]
+
+# Rótulos de impostos (comuns a todos os layouts): campo -> padrões do rótulo
+ROTULOS_ISS = {
+    'base_calculo': r'Base de C[áa]lculo(?:\s*\(R\$\))?',
+    'aliquota': r'Al[íi]quota(?:\s*\(%\))?',
+    'valor': r'Valor do ISS(?:\s*\(R\$\))?',
+}
+ROTULOS_RETENCOES = {
+    'inss': r'INSS(?:\s*\(R\$\))?',
+    'irrf': r'IR(?:RF)?(?:\s*\(R\$\))?',
+    'csll': r'CSLL(?:\s*\(R\$\))?',
+    'cofins': r'COFINS(?:\s*\(R\$\))?',
+    'pis': r'PIS(?:/PASEP)?(?:\s*\(R\$\))?',
+}
+
+# Peso de cada campo no cálculo da confiança (soma 100)
+PESOS_CONFIANCA = {
+    'numero': 20,
+    'data_emissao': 10,
+    'codigo_verificacao': 5,
+    'prestador_nome': 10,
+    'prestador_cnpj': 15,
+    'tomador_nome': 10,
+    'valor_total': 20,
+    'iss': 10,
+}
+
+
+def valor_br_para_decimal(valor: Optional[str]) -> Optional[str]:
+    """'1.234,56' -> '1234.56' ('-' e vazio viram None)"""
+    if not valor:
+        return None
+    valor = valor.replace('%', '').strip()
+    if valor in ('-', ''):
+        return None
+    return valor.replace('.', '').replace(',', '.')
+
+
+def _buscar(texto: str, padroes: List[str]) -> Optional[str]:
+    for padrao in padroes:
+        m = re.search(padrao, texto, re.IGNORECASE)
+        if m:
+            return m.group(1).strip()
+    return None
+
+
+def _rotulo_isolado(rotulo: str) -> str:
+    """Rótulo como palavra inteira (evita 'IR' dentro de 'IRPJ', por exemplo)"""
+    return r'(?<![A-Za-z])(?:' + rotulo + r')(?![A-Za-z])'
+
+
+def _valores_rotulados(texto: str, rotulos: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """
+    Lê valores de impostos em dois formatos comuns nas NFS-e:
+    - tabela: linha só com os rótulos e a linha seguinte com os valores na mesma ordem
+    - em linha: "Rótulo: 1.234,56"
+    """
+    linhas = texto.splitlines()
+    resultado: Dict[str, Optional[str]] = {}
+
+    for i, linha in enumerate(linhas[:-1]):
+        posicoes = []
+        for campo, rotulo in rotulos.items():
+            m = re.search(_rotulo_isolado(rotulo), linha, re.IGNORECASE)
+            if m:
+                posicoes.append((m.start(), campo))
+        if len(posicoes) < 2:
+            continue
+        tokens = RE_TOKEN_TABELA.findall(linhas[i + 1])
+        # Cabeçalhos com unidade "(R$)"/"(%)" permitem localizar a coluna de cada rótulo
+        # mesmo com colunas que não interessam (ex: "Deduções", "Crédito")
+        unidades = [m.start() for m in RE_UNIDADE_COLUNA.finditer(linha)]
+        if len(unidades) == len(tokens):
+            colunas = {campo: sum(1 for u in unidades if u < inicio) for inicio, campo in posicoes}
+        elif len(posicoes) == len(tokens):
+            colunas = {campo: indice for indice, (_, campo) in enumerate(sorted(posicoes))}
+        else:
+            continue
+        for campo, coluna in colunas.items():
+            resultado.setdefault(campo, valor_br_para_decimal(tokens[coluna]))
+
+    for campo, rotulo in rotulos.items():
+        if campo in resultado:
+            continue
+        m = re.search(_rotulo_isolado(rotulo) + r'\s*[:=]?\s*(?:R\$\s*)?(\d{1,3}(?:\.\d{3})*,\d{2,4})',
+                      texto, re.IGNORECASE)
+        if m:
+            resultado[campo] = valor_br_para_decimal(m.group(1))
+    return resultado
+
+
+def _secao(texto: str, inicio: str, fim: str) -> str:
+    m_inicio = re.search(inicio, texto, re.IGNORECASE)
+    if not m_inicio:
+        return ''
+    resto = texto[m_inicio.end():]
+    m_fim = re.search(fim, resto, re.IGNORECASE)
+    return resto[:m_fim.start()] if m_fim else resto
+
+
+def _parte(secao: str, layout: LayoutMunicipal) -> Dict[str, Optional[str]]:
+    """Nome e CNPJ de prestador/tomador a partir da seção correspondente"""
+    nome = None
+    for padrao in layout.rotulos_nome:
+        m = re.search(padrao, secao, re.IGNORECASE)
+        if m:
+            # Corta rótulos seguintes na mesma linha (ex: "... CPF/CNPJ: ...")
+            nome = re.split(r'\s+(?:CPF/CNPJ|CNPJ|Inscri[çc][ãa]o)\b', m.group(1))[0].strip()
+            break
+    m_cnpj = RE_CNPJ.search(secao)
+    return {'nome': nome, 'cnpj': m_cnpj.group(0) if m_cnpj else None}
+
+
+def identificar_layout(texto: str) -> Optional[LayoutMunicipal]:
+    """Retorna o layout municipal reconhecido no texto, se houver"""
+    for layout in LAYOUTS:
+        if any(re.search(p, texto, re.IGNORECASE) for p in layout.identificadores):
+            return layout
+    return None
+
+
+def calcular_confianca(dados: Dict[str, Any]) -> float:
+    """
+    Confiança (0-100) pela presença dos campos essenciais,
+    penalizada quando base de cálculo × alíquota não bate com o ISS
+    """
+    iss = dados.get('impostos', {}).get('iss', {})
+    presentes = {
+        'numero': dados.get('numero'),
+        'data_emissao': dados.get('data_emissao'),
+        'codigo_verificacao': dados.get('codigo_verificacao'),
+        'prestador_nome': dados.get('prestador', {}).get('nome'),
+        'prestador_cnpj': dados.get('prestador', {}).get('cnpj'),
+        'tomador_nome': dados.get('tomador', {}).get('nome'),
+        'valor_total': dados.get('valor_total'),
+        'iss': iss.get('aliquota') is not None or iss.get('valor') is not None,
+    }
+    confianca = float(sum(peso for campo, peso in PESOS_CONFIANCA.items() if presentes[campo]))
+
+    try:
+        if iss.get('base_calculo') and iss.get('aliquota') and iss.get('valor'):
+            calculado = float(iss['base_calculo']) * float(iss['aliquota']) / 100
+            if abs(calculado - float(iss['valor'])) > 0.05:
+                confianca -= 30
+    except ValueError:
+        confianca -= 30
+    return max(confianca, 0.0)
+
+
+def extrair_campos(texto: str) -> Optional[Tuple[Dict[str, Any], float, LayoutMunicipal]]:
+    """
+    Extrai os campos de uma NFS-e de layout conhecido
+    Retorna (dados no formato de ESQUEMA_NOTA, confiança, layout) ou None
+    """
+    if len(texto.strip()) < MIN_CARACTERES_TEXTO:
+        return None
+    layout = identificar_layout(texto)
+    if layout is None:
+        return None
+
+    prestador = _parte(_secao(texto, layout.inicio_prestador, layout.inicio_tomador), layout)
+    tomador = _parte(_secao(texto, layout.inicio_tomador, layout.fim_tomador), layout)
+    iss = _valores_rotulados(texto, ROTULOS_ISS)
+    retencoes = _valores_rotulados(texto, ROTULOS_RETENCOES)
+    iss_retido = _buscar(texto, [r'ISS Retido(?:\s*\(R\$\))?\s*:?\s*' + RE_VALOR])
+
+    valor_total = valor_br_para_decimal(_buscar(texto, layout.valor_total))
+    dados = {
+        'numero': _buscar(texto, layout.numero),
+        'data_emissao': _buscar(texto, layout.data_emissao),
+        'vencimento': None,
+        'codigo_verificacao': _buscar(texto, layout.codigo_verificacao),
+        'prestador': prestador,
+        'tomador': tomador,
+        'municipio': layout.municipio,
+        'estado': layout.estado,
+        'valor_total': valor_total,
+        'valor_servicos': valor_total,
+        'discriminacao': None,
+        'impostos': {
+            'iss': {
+                'valor': iss.get('valor'),
+                'aliquota': iss.get('aliquota'),
+                'base_calculo': iss.get('base_calculo'),
+            },
+            'retencoes': {**retencoes, 'iss_retido': valor_br_para_decimal(iss_retido)},
+        },
+    }
+    return dados, calcular_confianca(dados), layout
+
+
+def extrair_texto_pdf(pdf_path: Union[str, BinaryIO], pagina: int = 0) -> str:
+    """Texto da página com pdfplumber ('' se o PDF não tiver camada de texto); aceita caminho ou stream"""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        if pagina >= len(pdf.pages):
+            return ''
+        return pdf.pages[pagina].extract_text() or ''
@@ -0,0 +1,262 @@
+"""
+Fila de jobs de análise de NFS-e
+O upload é gravado e respondido na hora; threads em segundo plano fazem a análise.
+A fila fica em SQLite, então jobs pendentes sobrevivem a reinícios do servidor.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Optional, Any
+
+from armazem_notas import DADOS_DIR_PADRAO
+
+# Configuração padrão (pode ser sobrescrita pelo .env)
+# Jobs pendentes precisam sobreviver a reinícios: mesmo diretório de dados do armazém, fora do /tmp
+JOBS_DIR_PADRAO = DADOS_DIR_PADRAO / 'jobs'
+JOBS_TRABALHADORES_PADRAO = 2
+JOBS_TIMEOUT_PADRAO = 600          # job "processando" há mais tempo que isso volta para a fila
+JOBS_MAX_TENTATIVAS_PADRAO = 3
+JOBS_ESPERA_PADRAO = 30            # espera antes de tentar de novo após erro temporário (dobra a cada tentativa)
+JOBS_RETENCAO_PADRAO = 24 * 3600   # jobs finalizados são removidos após 1 dia
+
+# Status possíveis
+PENDENTE = 'pendente'
+PROCESSANDO = 'processando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+
+
+class FilaJobs:
+    """
+    Fila persistente com trabalhadores em threads
+
+    processar(caminho_pdf, usar_cache) -> dict é chamado para cada job;
+    o dict retornado é gravado como resultado. Exceções marcam o job como erro, exceto as
+    temporárias (atributo temporario, como ErroAnalise com a API sobrecarregada): o job volta
+    para a fila depois de retry_after (ou da espera exponencial), até max_tentativas.
+    Vários processos (workers do gunicorn) podem compartilhar o mesmo diretório.
+    """
+
+    def __init__(self, processar: Callable[[str, bool], Dict[str, Any]],
+                 diretorio: Optional[Path] = None,
+                 trabalhadores: int = JOBS_TRABALHADORES_PADRAO,
+                 timeout: int = JOBS_TIMEOUT_PADRAO,
+                 max_tentativas: int = JOBS_MAX_TENTATIVAS_PADRAO,
+                 retencao: int = JOBS_RETENCAO_PADRAO,
+                 espera: float = JOBS_ESPERA_PADRAO):
+        self.processar = processar
+        self.diretorio = Path(diretorio or JOBS_DIR_PADRAO)
+        self.dir_arquivos = self.diretorio / 'arquivos'
+        self.dir_arquivos.mkdir(parents=True, exist_ok=True)
+        self.caminho_db = self.diretorio / 'jobs.sqlite3'
+        self.trabalhadores = trabalhadores
+        self.timeout = timeout
+        self.max_tentativas = max_tentativas
+        self.retencao = retencao
+        self.espera = espera
+
+        self._local = threading.local()
+        self._novo_job = threading.Event()
+        self._parar = threading.Event()
+        self._threads = []
+        self._iniciar_lock = threading.Lock()
+
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    arquivo TEXT NOT NULL,
+                    caminho TEXT NOT NULL,
+                    usar_cache INTEGER NOT NULL DEFAULT 1,
+                    resultado TEXT,
+                    erro TEXT,
+                    tentativas INTEGER NOT NULL DEFAULT 0,
+                    criado_em REAL NOT NULL,
+                    disponivel_em REAL,
+                    iniciado_em REAL,
+                    concluido_em REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, criado_em)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão SQLite por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.caminho_db), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def iniciar(self):
+        """Inicia as threads trabalhadoras (idempotente; chamar depois do fork do gunicorn)"""
+        with self._iniciar_lock:
+            if self._threads:
+                return
+            for i in range(self.trabalhadores):
+                thread = threading.Thread(target=self._loop, name=f'nf-job-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def parar(self):
+        """Sinaliza as threads para encerrar após o job atual"""
+        self._parar.set()
+        self._novo_job.set()
+
+    def enfileirar(self, nome_arquivo: str, conteudo: bytes, usar_cache: bool = True) -> str:
+        """Grava o PDF (bytes ou buffer, ex: mmap do upload) e cria o job; retorna o ID"""
+        job_id = uuid.uuid4().hex
+        caminho = self.dir_arquivos / f"{job_id}.pdf"
+        caminho.write_bytes(conteudo)
+
+        conn = self._conexao()
+        conn.execute(
+            "INSERT INTO jobs (id, status, arquivo, caminho, usar_cache, criado_em) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, PENDENTE, nome_arquivo, str(caminho), int(usar_cache), time.time())
+        )
+        self._novo_job.set()
+        return job_id
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status e resultado do job, ou None se não existir"""
+        row = self._conexao().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = {
+            'job_id': row['id'],
+            'status': row['status'],
+            'arquivo': row['arquivo'],
+            'tentativas': row['tentativas'],
+            'criado_em': row['criado_em'],
+            'iniciado_em': row['iniciado_em'],
+            'concluido_em': row['concluido_em'],
+        }
+        if row['status'] == PENDENTE:
+            job['posicao'] = self._conexao().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND criado_em <= ?", (PENDENTE, row['criado_em'])
+            ).fetchone()[0]
+        if row['resultado'] is not None:
+            job['resultado'] = json.loads(row['resultado'])
+        if row['erro'] is not None:
+            job['erro'] = row['erro']
+        return job
+
+    def _reservar_proximo(self) -> Optional[sqlite3.Row]:
+        """
+        Marca o próximo job como "processando" de forma atômica entre processos
+        Jobs presos em "processando" além do timeout (worker morto) são retomados;
+        jobs reagendados após erro temporário esperam até disponivel_em
+        """
+        conn = self._conexao()
+        agora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE (status = ? AND (disponivel_em IS NULL OR disponivel_em <= ?)) "
+                "OR (status = ? AND iniciado_em < ?) ORDER BY criado_em LIMIT 1",
+                (PENDENTE, agora, PROCESSANDO, agora - self.timeout)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, iniciado_em = ?, tentativas = tentativas + 1 WHERE id = ?",
+                    (PROCESSANDO, agora, row['id'])
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _finalizar(self, job_id: str, caminho: str, resultado: Optional[Dict] = None,
+                   erro: Optional[str] = None, status: str = CONCLUIDO):
+        self._conexao().execute(
+            "UPDATE jobs SET status = ?, resultado = ?, erro = ?, concluido_em = ? WHERE id = ?",
+            (status, json.dumps(resultado, ensure_ascii=False) if resultado is not None else None,
+             erro, time.time(), job_id)
+        )
+        Path(caminho).unlink(missing_ok=True)
+
+    def _reagendar(self, job_id: str, erro: str, espera: float):
+        """Devolve o job à fila após erro temporário; o PDF fica para a próxima tentativa"""
+        self._conexao().execute(
+            "UPDATE jobs SET status = ?, erro = ?, iniciado_em = NULL, disponivel_em = ? WHERE id = ?",
+            (PENDENTE, erro, time.time() + espera, job_id)
+        )
+
+    def _limpar_antigos(self):
+        """Remove jobs finalizados além do período de retenção"""
+        self._conexao().execute(
+            "DELETE FROM jobs WHERE status IN (?, ?) AND concluido_em < ?",
+            (CONCLUIDO, ERRO, time.time() - self.retencao)
+        )
+
+    def _loop(self):
+        ultima_limpeza = 0.0
+        while not self._parar.is_set():
+            try:
+                if time.time() - ultima_limpeza > 3600:
+                    self._limpar_antigos()
+                    ultima_limpeza = time.time()
+                row = self._reservar_proximo()
+                if row is None:
+                    # Espera novo job neste processo ou consulta de novo (outros processos / reinício)
+                    self._novo_job.wait(timeout=2)
+                    self._novo_job.clear()
+                    continue
+                self._executar(row)
+            except Exception as e:
+                # Ex: "database is locked" entre workers; a thread continua e o job
+                # que ficou em "processando" é retomado depois do timeout
+                print(f"Erro na fila de jobs: {e}")
+                self._parar.wait(1)
+
+    def _executar(self, row: sqlite3.Row):
+        tentativa = row['tentativas'] + 1
+        if row['tentativas'] >= self.max_tentativas:
+            self._finalizar(row['id'], row['caminho'], status=ERRO,
+                            erro=row['erro'] or 'Job abandonado após excesso de tentativas')
+            return
+
+        try:
+            resultado = self.processar(row['caminho'], bool(row['usar_cache']))
+        except Exception as e:
+            if getattr(e, 'temporario', False) and tentativa < self.max_tentativas:
+                espera = getattr(e, 'retry_after', None) or self.espera * 2 ** (tentativa - 1)
+                print(f"Erro temporário no job {row['id']} (tentativa {tentativa}), nova tentativa em {espera:.0f}s: {e}")
+                self._reagendar(row['id'], str(e), espera)
+            else:
+                print(f"Erro ao processar job {row['id']}: {e}")
+                self._finalizar(row['id'], row['caminho'], status=ERRO, erro=str(e))
+            return
+        self._finalizar(row['id'], row['caminho'], resultado=resultado)
+
+_fila_padrao: Optional[FilaJobs] = None
+_fila_padrao_lock = threading.Lock()
+
+
+def obter_fila(processar: Callable[[str, bool], Dict[str, Any]]) -> FilaJobs:
+    """
+    Fila compartilhada pelo processo, já com as threads iniciadas
+    Configuração: NF_JOBS_DIR, NF_JOBS_TRABALHADORES, NF_JOBS_TIMEOUT, NF_JOBS_RETENCAO, NF_JOBS_ESPERA
+    """
+    global _fila_padrao
+    with _fila_padrao_lock:
+        if _fila_padrao is None:
+            _fila_padrao = FilaJobs(
+                processar,
+                diretorio=os.getenv('NF_JOBS_DIR') or None,
+                trabalhadores=int(os.getenv('NF_JOBS_TRABALHADORES', JOBS_TRABALHADORES_PADRAO)),
+                timeout=int(os.getenv('NF_JOBS_TIMEOUT', JOBS_TIMEOUT_PADRAO)),
+                retencao=int(os.getenv('NF_JOBS_RETENCAO', JOBS_RETENCAO_PADRAO)),
+                espera=float(os.getenv('NF_JOBS_ESPERA', JOBS_ESPERA_PADRAO)),
+            )
+    _fila_padrao.iniciar()
+    return _fila_padrao
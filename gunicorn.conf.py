@@ -0,0 +1,49 @@
+"""
+Configuração do gunicorn
+    gunicorn -c gunicorn.conf.py app:app
+
+preload_app: o master importa o app uma vez e, antes do primeiro fork, o analisador e as
+dependências pesadas (anthropic, httpx, pypdfium2, PIL, pdfplumber); os workers nascem já
+com tudo importado, inclusive os que substituem um worker reciclado (max_requests).
+
+post_fork: cada worker cria o cliente da API, as conexões SQLite e o pool de renderização
+antes de atender a primeira requisição. Nada disso sobrevive ao fork, por isso não é feito no master.
+
+NF_AQUECER=false desliga as duas etapas (tudo volta a acontecer na primeira requisição).
+"""
+
+import os
+
+bind = os.getenv('NF_GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('NF_GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('NF_GUNICORN_THREADS', 4))
+timeout = 120
+preload_app = True
+
+# Reciclagem de workers (0 desativa); a variação evita que todos reiniciem juntos
+max_requests = int(os.getenv('NF_GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+AQUECER = os.getenv('NF_AQUECER', 'true').lower() in ('1', 'true', 'sim')
+
+
+def when_ready(server):
+    """No master, depois do preload e antes do primeiro fork: só importações"""
+    if not AQUECER:
+        return
+    import analisadores
+    try:
+        analisadores.carregar()
+    except (ImportError, ValueError) as e:
+        server.log.warning(f"Analisador não carregado no master: {e}")
+    tempos = analisadores.importar_dependencias()
+    server.log.info("Dependências importadas no master: "
+                    + ', '.join(f"{nome} {ms:.0f} ms" for nome, ms in tempos.items()))
+
+
+def post_fork(server, worker):
+    """Em cada worker, antes da primeira requisição"""
+    if AQUECER:
+        import analisadores
+        analisadores.aquecer()
@@ -0,0 +1,478 @@
+"""
+Análise de diretórios de NFS-e pela linha de comando
+Percorre um diretório (e subpastas), analisa os PDFs em paralelo e grava as
+notas à medida que cada arquivo termina, em JSONL, CSV ou Parquet. A memória
+não cresce com o tamanho do acervo: só os arquivos em andamento ficam em memória.
+
+Retomada: um manifesto (JSONL ao lado da saída) guarda o SHA-256 de cada PDF
+concluído e a configuração da análise (modelo, versão do prompt, modo e estratégia);
+rodar de novo o mesmo comando pula esses arquivos (e cópias do mesmo PDF com outro
+nome) e tenta outra vez os que deram erro ou não tiveram nenhuma nota legível.
+Mudar a configuração refaz tudo.
+
+--lote-api N: em vez de uma chamada por arquivo, envia grupos de N arquivos pela
+Message Batches API (metade do preço, resultados em minutos a horas; ver lotes_api).
+
+Uso:
+    python -m analisador_claude_api analyze /dados/notas --workers 8 --out notas.jsonl
+    python -m analisador_claude_api analyze /dados/notas --out notas.csv --rpm 40 --estrategia pdf
+    python -m analisador_claude_api analyze /dados/notas --out notas.parquet   # requer pyarrow
+    python -m analisador_claude_api analyze /dados/acervo --out acervo.jsonl --lote-api 2000
+
+relatorio: totais de retenções e verificações de consistência sobre o armazém de notas
+(ver relatorios.py), em CSV na saída padrão ou no arquivo de --out (.csv ou .jsonl):
+    python -m analisador_claude_api relatorio retencoes --agrupar municipio --de 2024-01-01 --out iss.csv
+    python -m analisador_claude_api relatorio verificacoes --tolerancia 5 --out divergencias.jsonl
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from dotenv import load_dotenv
+
+import metricas
+from agendador import (
+    API_ESPERA_MAX_PADRAO, API_RPM_PADRAO, API_TENTATIVAS_PADRAO, API_TPM_PADRAO, PRIORIDADE_LOTE,
+    Agendador, prioridade,
+)
+from analisador_claude_api import (
+    ESTRATEGIAS_ENTRADA, MODELO_CLAUDE, MODOS_EXTRACAO, VERSAO_PROMPT, AnalisadorClaudeAPI, NotaFiscal,
+)
+from armazem_notas import obter_armazem
+from documento_pdf import usar_documento
+import relatorios
+from exportacao import COLUNAS, colunas_das_notas, escrever_csv, escrever_jsonl, registros_das_notas, tabela_arrow
+
+FORMATOS_SAIDA = ('jsonl', 'csv', 'parquet')
+WORKERS_PADRAO = 4
+LINHAS_POR_PARTE_PARQUET = 5000
+
+
+def listar_pdfs(diretorio: Path) -> Iterator[Path]:
+    """PDFs do diretório e subpastas, em ordem estável, sem montar a lista inteira"""
+    for raiz, pastas, arquivos in os.walk(diretorio):
+        pastas.sort()
+        for nome in sorted(arquivos):
+            if nome.lower().endswith('.pdf'):
+                yield Path(raiz) / nome
+
+
+def colunas_de_origem(arquivo: str, sha256: str, notas: List[NotaFiscal]) -> Dict[str, List[Any]]:
+    """Colunas arquivo, sha256 e nota_indice das notas de um PDF (ver exportacao.COLUNAS_ORIGEM)"""
+    return {'arquivo': [arquivo] * len(notas), 'sha256': [sha256] * len(notas), 'nota_indice': range(len(notas))}
+
+
+class EscritorJSONL:
+    """Uma nota por linha (mesmo formato de nota_para_dict, Decimal como texto)"""
+
+    def __init__(self, caminho: Path):
+        self._arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def escrever(self, arquivo: str, sha256: str, notas: List[NotaFiscal]) -> bool:
+        """Grava as notas do PDF; True quando já estão no disco (o manifesto pode registrá-las)"""
+        escrever_jsonl(registros_das_notas(notas, **colunas_de_origem(arquivo, sha256, notas)), self._arquivo)
+        self._arquivo.flush()
+        return True
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class EscritorCSV:
+    """CSV com as COLUNAS fixas; o cabeçalho só é escrito em arquivo novo"""
+
+    def __init__(self, caminho: Path):
+        novo = not caminho.exists() or caminho.stat().st_size == 0
+        self._arquivo = open(caminho, 'a', encoding='utf-8', newline='')
+        if novo:
+            csv.writer(self._arquivo).writerow(COLUNAS)
+
+    def escrever(self, arquivo: str, sha256: str, notas: List[NotaFiscal]) -> bool:
+        escrever_csv(colunas_das_notas(notas, **colunas_de_origem(arquivo, sha256, notas)), self._arquivo,
+                     cabecalho=False)
+        self._arquivo.flush()
+        return True
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+class EscritorParquet:
+    """
+    Diretório de partes Parquet (parte-00000.parquet, ...), lido como um único dataset
+    Cada parte é gravada inteira (arquivo temporário + rename) a cada LINHAS_POR_PARTE_PARQUET
+    notas: um Parquet interrompido no meio não seria legível, uma parte que faltou é refeita
+    """
+
+    def __init__(self, caminho: Path, linhas_por_parte: int = LINHAS_POR_PARTE_PARQUET):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Módulo pyarrow não instalado. Instale com: pip install pyarrow")
+        self._pq = pyarrow.parquet
+        self._diretorio = caminho
+        self._diretorio.mkdir(parents=True, exist_ok=True)
+        partes = [int(parte.stem.split('-')[1]) for parte in self._diretorio.glob('parte-*.parquet')]
+        self._proxima_parte = max(partes, default=-1) + 1
+        self._linhas_por_parte = linhas_por_parte
+        self._colunas: Dict[str, List[Any]] = {coluna: [] for coluna in COLUNAS}
+        self._linhas = 0
+
+    def escrever(self, arquivo: str, sha256: str, notas: List[NotaFiscal]) -> bool:
+        for coluna, valores in colunas_das_notas(notas, **colunas_de_origem(arquivo, sha256, notas)).items():
+            self._colunas[coluna].extend(valores)
+        self._linhas += len(notas)
+        if self._linhas < self._linhas_por_parte:
+            return False
+        self._gravar_parte()
+        return True
+
+    def _gravar_parte(self):
+        if not self._linhas:
+            return
+        destino = self._diretorio / f"parte-{self._proxima_parte:05d}.parquet"
+        temporario = destino.with_suffix('.tmp')
+        self._pq.write_table(tabela_arrow(self._colunas), temporario)
+        os.replace(temporario, destino)
+        self._proxima_parte += 1
+        self._colunas = {coluna: [] for coluna in COLUNAS}
+        self._linhas = 0
+
+    def fechar(self):
+        self._gravar_parte()
+
+
+ESCRITORES = {'jsonl': EscritorJSONL, 'csv': EscritorCSV, 'parquet': EscritorParquet}
+
+
+class Manifesto:
+    """
+    Registro, por SHA-256, dos PDFs já processados (JSONL, só recebe linhas novas)
+    A última linha de cada hash vale: 'ok' é pulado na próxima execução, 'erro' e 'vazio' são
+    refeitos; um 'ok' gravado com outra configuração (modo, estratégia, versão do prompt) também
+    """
+
+    def __init__(self, caminho: Path, configuracao: str = ''):
+        self.caminho = caminho
+        self.configuracao = configuracao
+        self.concluidos: Set[str] = set()
+        if caminho.exists():
+            with open(caminho, encoding='utf-8') as arquivo:
+                for linha in arquivo:
+                    try:
+                        entrada = json.loads(linha)
+                    except ValueError:
+                        # Linha truncada por uma interrupção
+                        continue
+                    if entrada.get('status') == 'ok' and entrada.get('configuracao') == configuracao:
+                        self.concluidos.add(entrada['sha256'])
+                    else:
+                        self.concluidos.discard(entrada.get('sha256'))
+        self._arquivo = open(caminho, 'a', encoding='utf-8')
+
+    def registrar(self, entradas: List[Dict[str, Any]]):
+        for entrada in entradas:
+            self._arquivo.write(json.dumps(entrada, ensure_ascii=False) + '\n')
+            if entrada['status'] == 'ok' and entrada.get('configuracao') == self.configuracao:
+                self.concluidos.add(entrada['sha256'])
+        self._arquivo.flush()
+
+    def fechar(self):
+        self._arquivo.close()
+
+
+def nota_legivel(nota: NotaFiscal) -> bool:
+    """Nota com algum dado de fato extraído (não o resultado de um layout não reconhecido)"""
+    return nota.confianca_extracao > 0 and nota.estado != 'DESCONHECIDO'
+
+
+def formato_da_saida(saida: Path) -> str:
+    formato = saida.suffix.lstrip('.').lower()
+    if formato not in FORMATOS_SAIDA:
+        raise ValueError(f"Formato de saída não reconhecido: {saida.name} (use .jsonl, .csv ou .parquet)")
+    return formato
+
+
+class ProcessadorDiretorio:
+    """Análise concorrente de um diretório, com saída incremental e manifesto para retomada"""
+
+    def __init__(self, analisador: AnalisadorClaudeAPI, workers: int = WORKERS_PADRAO, lote_api: int = 0,
+                 **opcoes):
+        """
+        analisador: AnalisadorClaudeAPI usado por todas as threads (limites de taxa e novas
+        tentativas ficam no agendador do analisador; as chamadas entram com prioridade de lote)
+        workers: arquivos analisados ao mesmo tempo
+        lote_api: > 0 analisa grupos desse tamanho pela Message Batches API (analisar_em_lote)
+        opcoes: repassadas a analisar_documento / analisar_em_lote (usar_cache, modo, estrategia)
+        """
+        self.analisador = analisador
+        self.workers = max(1, workers)
+        self.lote_api = max(0, lote_api)
+        self.opcoes = opcoes
+        # Vai em cada entrada do manifesto: resultados de outra configuração não contam como concluídos
+        self.configuracao = ':'.join((
+            MODELO_CLAUDE, VERSAO_PROMPT, opcoes.get('modo') or analisador.modo_extracao,
+            opcoes.get('estrategia') or analisador.estrategia_entrada,
+        ))
+        # Hashes em andamento ou concluídos nesta execução (cópias do mesmo PDF são puladas)
+        self._vistos: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def processar(self, diretorio: Path, saida: Path, formato: Optional[str] = None,
+                  manifesto: Optional[Path] = None) -> Dict[str, Any]:
+        """Analisa os PDFs ainda não concluídos e devolve o resumo da execução"""
+        formato = formato or formato_da_saida(saida)
+        manifesto = Manifesto(manifesto or saida.with_name(saida.name + '.manifesto.jsonl'), self.configuracao)
+        escritor = ESCRITORES[formato](saida)
+        resumo = {'arquivos': 0, 'notas': 0, 'pulados': 0, 'vazios': 0, 'erros': 0}
+        # Entradas do manifesto cujas notas ainda estão no buffer do escritor (Parquet)
+        entradas_pendentes: List[Dict[str, Any]] = []
+        inicio = time.perf_counter()
+
+        def gravar(resultados):
+            for resultado in resultados:
+                status = resultado['status']
+                if status == 'pulado':
+                    resumo['pulados'] += 1
+                    continue
+                entrada = resultado['entrada']
+                if status == 'ok':
+                    resumo['arquivos'] += 1
+                    resumo['notas'] += len(resultado['notas'])
+                    entradas_pendentes.append(entrada)
+                    if escritor.escrever(entrada['arquivo'], entrada['sha256'], resultado['notas']):
+                        manifesto.registrar(entradas_pendentes)
+                        entradas_pendentes.clear()
+                    print(f"✅ {entrada['arquivo']}: {entrada['notas']} nota(s)")
+                elif status == 'vazio':
+                    # Nada legível: não vai para a saída e é tentado de novo na próxima execução
+                    resumo['vazios'] += 1
+                    manifesto.registrar([entrada])
+                    print(f"⚠️ {entrada['arquivo']}: nenhuma nota legível")
+                    with self._lock:
+                        self._vistos.discard(entrada['sha256'])
+                else:
+                    resumo['erros'] += 1
+                    manifesto.registrar([entrada])
+                    print(f"❌ {entrada['arquivo']}: {entrada['erro']}")
+                    with self._lock:
+                        self._vistos.discard(entrada['sha256'])
+
+        pool = ThreadPoolExecutor(self.workers, thread_name_prefix='nf-cli')
+        pendentes = set()
+        try:
+            if self.lote_api:
+                gravar(self._analisar_em_grupos(diretorio, manifesto.concluidos))
+            else:
+                for caminho in listar_pdfs(diretorio):
+                    pendentes.add(pool.submit(
+                        self._analisar_arquivo, caminho, caminho.relative_to(diretorio).as_posix(),
+                        manifesto.concluidos
+                    ))
+                    # Poucos arquivos na fila: a listagem e os resultados não acumulam em memória
+                    if len(pendentes) >= self.workers * 2:
+                        concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                        gravar(futuro.result() for futuro in concluidas)
+            while pendentes:
+                concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                gravar(futuro.result() for futuro in concluidas)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            escritor.fechar()
+            manifesto.registrar(entradas_pendentes)
+            manifesto.fechar()
+
+        resumo['segundos'] = round(time.perf_counter() - inicio, 1)
+        return resumo
+
+    def _analisar_arquivo(self, caminho: Path, arquivo: str, concluidos: Set[str]) -> Dict[str, Any]:
+        """Roda em uma thread do pool: hash, verificação no manifesto e análise"""
+        with usar_documento(caminho) as documento:
+            sha256 = documento.sha256
+            with self._lock:
+                # Já concluído em outra execução ou o mesmo PDF com outro nome nesta
+                if sha256 in concluidos or sha256 in self._vistos:
+                    return {'status': 'pulado'}
+                self._vistos.add(sha256)
+
+            token = metricas.iniciar_contexto(arquivo=arquivo)
+            try:
+                with prioridade(PRIORIDADE_LOTE):
+                    notas = self.analisador.analisar_documento(documento, **self.opcoes)
+                erro = None
+            except Exception as e:
+                notas, erro = None, str(e) or e.__class__.__name__
+            registro = metricas.finalizar_contexto(token, log=False) or {}
+        return self._resultado(arquivo, sha256, notas, erro, registro, self.configuracao)
+
+    def _analisar_em_grupos(self, diretorio: Path, concluidos: Set[str]) -> Iterator[Dict[str, Any]]:
+        """Modo lote_api: junta grupos de arquivos novos e analisa cada grupo pela Message Batches API"""
+        grupo = []
+        for caminho in listar_pdfs(diretorio):
+            with usar_documento(caminho) as documento:
+                sha256 = documento.sha256
+            if sha256 in concluidos or sha256 in self._vistos:
+                yield {'status': 'pulado'}
+                continue
+            self._vistos.add(sha256)
+            grupo.append((caminho, caminho.relative_to(diretorio).as_posix(), sha256))
+            if len(grupo) >= self.lote_api:
+                yield from self._analisar_grupo(grupo)
+                grupo = []
+        if grupo:
+            yield from self._analisar_grupo(grupo)
+
+    def _analisar_grupo(self, grupo: List[tuple]) -> Iterator[Dict[str, Any]]:
+        print(f"📦 Enviando {len(grupo)} arquivo(s) pela Message Batches API")
+        try:
+            resultados = self.analisador.analisar_em_lote([caminho for caminho, _, _ in grupo], **self.opcoes)
+        except Exception as e:
+            resultados = [e] * len(grupo)
+        for (_, arquivo, sha256), resultado in zip(grupo, resultados):
+            if isinstance(resultado, Exception):
+                yield self._resultado(arquivo, sha256, None, str(resultado) or resultado.__class__.__name__, {},
+                                      self.configuracao)
+            else:
+                yield self._resultado(arquivo, sha256, resultado, None, {}, self.configuracao)
+
+    @staticmethod
+    def _resultado(arquivo: str, sha256: str, notas: Optional[List[NotaFiscal]], erro: Optional[str],
+                   registro: Dict[str, Any], configuracao: str = '') -> Dict[str, Any]:
+        """
+        Entrada do manifesto e notas de um arquivo
+        Sem nenhuma nota legível (layout não reconhecido, confiança 0, estado DESCONHECIDO) o status
+        é 'vazio': o arquivo não é dado como concluído
+        """
+        if erro is None and not any(nota_legivel(nota) for nota in notas):
+            status = 'vazio'
+        else:
+            status = 'ok' if erro is None else 'erro'
+        entrada = {'sha256': sha256, 'arquivo': arquivo, 'status': status, 'configuracao': configuracao,
+                   'ts': time.strftime('%Y-%m-%dT%H:%M:%S')}
+        for campo in ('tokens_entrada', 'tokens_saida', 'tokens_economizados', 'chamadas_api', 'espera_agendador_ms',
+                      'duracao_ms'):
+            if campo in registro:
+                entrada[campo] = registro[campo]
+        if erro is not None:
+            entrada['erro'] = erro
+            return {'status': 'erro', 'entrada': entrada}
+        entrada['notas'] = len(notas)
+        if status == 'vazio':
+            return {'status': 'vazio', 'entrada': entrada}
+        return {'status': 'ok', 'entrada': entrada, 'notas': notas}
+
+
+def comando_analyze(args) -> int:
+    diretorio = Path(args.diretorio)
+    if not diretorio.is_dir():
+        print(f"Diretório não encontrado: {diretorio}", file=sys.stderr)
+        return 2
+    saida = Path(args.out)
+    formato = args.formato or formato_da_saida(saida)
+
+    opcoes = {'cache': None} if args.sem_cache else {}
+    agendador = Agendador(rpm=args.rpm, tpm=args.tpm, tentativas=args.tentativas,
+                          espera_maxima=float(os.getenv('NF_API_ESPERA_MAX', API_ESPERA_MAX_PADRAO)))
+    analisador = AnalisadorClaudeAPI(modo_extracao=args.modo, estrategia_entrada=args.estrategia,
+                                     agendador=agendador, **opcoes)
+    processador = ProcessadorDiretorio(analisador, workers=args.workers, lote_api=args.lote_api)
+    execucao = (f"Message Batches API, grupos de {processador.lote_api}" if processador.lote_api
+                else f"{processador.workers} workers")
+    print(f"Analisando {diretorio} -> {saida} ({formato}) | {execucao} | "
+          f"{args.rpm or 'sem limite de'} req/min, {args.tpm or 'sem limite de'} tokens/min")
+    try:
+        resumo = processador.processar(diretorio, saida, formato,
+                                       Path(args.manifesto) if args.manifesto else None)
+    except KeyboardInterrupt:
+        print("\nInterrompido: o que já foi gravado fica no manifesto, rode de novo para continuar")
+        return 130
+    finally:
+        analisador.renderizador.encerrar()
+        analisador.client.close()
+
+    print(f"Concluído em {resumo['segundos']}s: {resumo['arquivos']} arquivo(s), {resumo['notas']} nota(s), "
+          f"{resumo['pulados']} já processado(s), {resumo['vazios']} sem nota legível, {resumo['erros']} com erro")
+    return 1 if resumo['erros'] or resumo['vazios'] else 0
+
+
+def comando_relatorio(args) -> int:
+    armazem = obter_armazem()
+    if armazem is None:
+        print("Armazém de notas desativado (NF_ARMAZEM_DESATIVADO)", file=sys.stderr)
+        return 2
+    filtros = {'prestador_cnpj': args.prestador_cnpj, 'tomador_cnpj': args.tomador_cnpj,
+               'municipio': args.municipio, 'data_inicio': args.de, 'data_fim': args.ate}
+    try:
+        if args.relatorio == 'retencoes':
+            registros = relatorios.totais_retencoes(armazem, args.agrupar, not args.sem_mes, **filtros)
+        else:
+            resumo = relatorios.resumo_verificacoes(armazem, args.tolerancia, **filtros)
+            print(f"{resumo['notas']} nota(s) verificada(s), tolerância de {resumo['tolerancia_centavos']} centavo(s): "
+                  + ', '.join(f"{nome} {quantidade}" for nome, quantidade in resumo['divergencias'].items()),
+                  file=sys.stderr)
+            registros = relatorios.divergencias(armazem, args.tolerancia, args.verificacao, **filtros)
+        saida = Path(args.out) if args.out else None
+        linhas = relatorios.linhas_jsonl if saida and saida.suffix.lower() == '.jsonl' else relatorios.linhas_csv
+        if saida is None:
+            sys.stdout.writelines(linhas(registros))
+        else:
+            with open(saida, 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(linhas(registros))
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog='python -m analisador_claude_api', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    comandos = parser.add_subparsers(dest='comando', required=True)
+
+    analyze = comandos.add_parser('analyze', help='analisa os PDFs de um diretório')
+    analyze.add_argument('diretorio', help='diretório com os PDFs (inclui subpastas)')
+    analyze.add_argument('--out', required=True, help='arquivo de saída: .jsonl, .csv ou .parquet (diretório de partes)')
+    analyze.add_argument('--formato', choices=FORMATOS_SAIDA, default=None, help='formato (padrão: pela extensão de --out)')
+    analyze.add_argument('--workers', type=int, default=WORKERS_PADRAO, help='arquivos analisados ao mesmo tempo')
+    analyze.add_argument('--lote-api', type=int, default=0, metavar='N',
+                         help='envia grupos de N arquivos pela Message Batches API (metade do preço, '
+                              'resultados em minutos a horas)')
+    analyze.add_argument('--rpm', type=float, default=float(os.getenv('NF_API_RPM', API_RPM_PADRAO)),
+                         help='máximo de chamadas à API por minuto (0 = sem limite)')
+    analyze.add_argument('--tpm', type=float, default=float(os.getenv('NF_API_TPM', API_TPM_PADRAO)),
+                         help='máximo de tokens de entrada por minuto (0 = sem limite)')
+    analyze.add_argument('--tentativas', type=int, default=int(os.getenv('NF_API_TENTATIVAS', API_TENTATIVAS_PADRAO)),
+                         help='tentativas por chamada à API com erro transitório (429, 529, 5xx, rede)')
+    analyze.add_argument('--manifesto', default=None, help='manifesto de retomada (padrão: <out>.manifesto.jsonl)')
+    analyze.add_argument('--modo', choices=MODOS_EXTRACAO, default=None)
+    analyze.add_argument('--estrategia', choices=ESTRATEGIAS_ENTRADA, default=None)
+    analyze.add_argument('--sem-cache', action='store_true', help='não consulta nem grava o cache de resultados')
+    analyze.set_defaults(executar=comando_analyze)
+
+    relatorio = comandos.add_parser('relatorio', help='relatórios de retenções sobre o armazém de notas')
+    relatorio.add_argument('relatorio', choices=('retencoes', 'verificacoes'))
+    relatorio.add_argument('--out', default=None, help='arquivo .csv ou .jsonl (padrão: CSV na saída padrão)')
+    relatorio.add_argument('--agrupar', choices=list(relatorios.AGRUPAMENTOS), default='prestador')
+    relatorio.add_argument('--sem-mes', action='store_true', help='totais do período, sem separar por mês')
+    relatorio.add_argument('--tolerancia', type=int, default=relatorios.TOLERANCIA_CENTAVOS_PADRAO,
+                           help='diferença aceita nas verificações, em centavos')
+    relatorio.add_argument('--verificacao', action='append', choices=list(relatorios.VERIFICACOES), default=None,
+                           help='limita às verificações indicadas (pode repetir)')
+    relatorio.add_argument('--prestador-cnpj', default=None)
+    relatorio.add_argument('--tomador-cnpj', default=None)
+    relatorio.add_argument('--municipio', default=None)
+    relatorio.add_argument('--de', default=None, help='data de emissão inicial (AAAA-MM-DD ou DD/MM/AAAA)')
+    relatorio.add_argument('--ate', default=None, help='data de emissão final')
+    relatorio.set_defaults(executar=comando_relatorio)
+
+    args = parser.parse_args(argv)
+    return args.executar(args)
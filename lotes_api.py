@@ -0,0 +1,132 @@
+"""
+Envio de requisições pela Message Batches API da Anthropic
+Para reprocessamentos sem pressa: muitas requisições em um único envio, com metade
+do preço por token e limites de taxa próprios. O lote é processado em minutos ou
+horas (até 24h); os resultados voltam identificados pelo custom_id de cada requisição.
+
+Usado por AnalisadorClaudeAPI.analisar_em_lote; benchmarks/cliente_falso.py tem um
+substituto local de client.beta.messages.batches para testes.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import metricas
+from agendador import PRIORIDADE_LOTE, Agendador, ErroAPI, prioridade
+
+# Limites da API: 100.000 requisições e 256 MB por lote (com folga)
+LOTE_API_MAX_REQUISICOES = 10000
+LOTE_API_MAX_BYTES = 200 * 1024 * 1024
+LOTE_API_INTERVALO_PADRAO = 30.0
+
+# Erros de requisição individual que valem outro envio mais tarde
+ERROS_TEMPORARIOS = ('api_error', 'overloaded_error', 'rate_limit_error')
+
+
+def _lotes(client: Any):
+    return client.beta.messages.batches
+
+
+class EnvioLotes:
+    """
+    Acumula requisições e envia um lote sempre que os limites de quantidade ou tamanho
+    seriam ultrapassados: a memória guarda no máximo um lote por vez
+    """
+
+    def __init__(self, client: Any, agendador: Agendador, max_requisicoes: int = LOTE_API_MAX_REQUISICOES,
+                 max_bytes: int = LOTE_API_MAX_BYTES):
+        self.client = client
+        self.agendador = agendador
+        self.max_requisicoes = max_requisicoes
+        self.max_bytes = max_bytes
+        self.ids: List[str] = []
+        # custom_id -> exceção, para as requisições de lotes que a API recusou
+        self.falhas: Dict[str, Exception] = {}
+        self._requisicoes: List[Dict[str, Any]] = []
+        self._bytes = 0
+        self._betas: set = set()
+
+    def adicionar(self, custom_id: str, parametros: Dict[str, Any]):
+        """Parâmetros de messages.create (os de montar_requisicao); extra_headers vira beta do lote"""
+        parametros = dict(parametros)
+        cabecalhos = parametros.pop('extra_headers', None) or {}
+        if cabecalhos.get('anthropic-beta'):
+            self._betas.update(cabecalhos['anthropic-beta'].split(','))
+        requisicao = {'custom_id': custom_id, 'params': parametros}
+        tamanho = len(json.dumps(requisicao))
+        if self._requisicoes and (len(self._requisicoes) >= self.max_requisicoes
+                                  or self._bytes + tamanho > self.max_bytes):
+            self.enviar()
+        self._requisicoes.append(requisicao)
+        self._bytes += tamanho
+
+    def enviar(self):
+        """Envia as requisições acumuladas; se a API recusar o lote, as requisições vão para falhas"""
+        if not self._requisicoes:
+            return
+        opcoes = {'betas': sorted(self._betas)} if self._betas else {}
+        requisicoes, megabytes = self._requisicoes, self._bytes / 1024 / 1024
+        self._requisicoes, self._bytes, self._betas = [], 0, set()
+        try:
+            with prioridade(PRIORIDADE_LOTE):
+                lote = self.agendador.executar(lambda: _lotes(self.client).create(requests=requisicoes, **opcoes))
+        except Exception as e:
+            print(f"❌ Falha ao enviar lote de {len(requisicoes)} requisições: {e}")
+            self.falhas.update((requisicao['custom_id'], e) for requisicao in requisicoes)
+            return
+        print(f"📦 Lote {lote.id} enviado: {len(requisicoes)} requisições, {megabytes:.1f} MB")
+        metricas.LOTE_API_REQUISICOES.inc(len(requisicoes), resultado='enviada')
+        self.ids.append(lote.id)
+
+
+def aguardar_lotes(client: Any, agendador: Agendador, ids: List[str],
+                   intervalo: float = LOTE_API_INTERVALO_PADRAO, espera_maxima: Optional[float] = None):
+    """
+    Consulta os lotes a cada `intervalo` segundos até todos terminarem (processing_status 'ended')
+    espera_maxima: desiste com ErroAPI temporário depois desse tempo (None = sem limite); os lotes
+    seguem na API e podem ser consultados depois pelos ids
+    """
+    inicio = time.monotonic()
+    pendentes = list(ids)
+    while pendentes:
+        for lote_id in list(pendentes):
+            with prioridade(PRIORIDADE_LOTE):
+                lote = agendador.executar(lambda: _lotes(client).retrieve(lote_id))
+            if lote.processing_status == 'ended':
+                pendentes.remove(lote_id)
+                continue
+            contagem = lote.request_counts
+            feitas = contagem.succeeded + contagem.errored + contagem.canceled + contagem.expired
+            print(f"⏳ Lote {lote_id}: {feitas}/{feitas + contagem.processing} requisições concluídas")
+        if not pendentes:
+            break
+        if espera_maxima is not None and time.monotonic() - inicio + intervalo > espera_maxima:
+            raise ErroAPI(f"Lotes ainda em processamento após {espera_maxima:g}s: {', '.join(pendentes)}",
+                          temporario=True)
+        time.sleep(intervalo)
+
+
+def resultados_lotes(client: Any, agendador: Agendador, ids: List[str]) -> Iterator[Tuple[str, Any, Optional[ErroAPI]]]:
+    """(custom_id, mensagem, None) para cada requisição bem-sucedida; (custom_id, None, ErroAPI) para as demais"""
+    for lote_id in ids:
+        with prioridade(PRIORIDADE_LOTE):
+            itens = agendador.executar(lambda: _lotes(client).results(lote_id))
+        # Os resultados vêm em JSONL, lidos sob demanda
+        for item in itens:
+            resultado = item.result
+            metricas.LOTE_API_REQUISICOES.inc(resultado=resultado.type)
+            if resultado.type == 'succeeded':
+                yield item.custom_id, resultado.message, None
+            else:
+                yield item.custom_id, None, erro_do_resultado(resultado)
+
+
+def erro_do_resultado(resultado: Any) -> ErroAPI:
+    """ErroAPI de uma requisição do lote que não teve sucesso (errored, canceled, expired)"""
+    if resultado.type != 'errored':
+        return ErroAPI(f"Requisição do lote {'cancelada' if resultado.type == 'canceled' else 'expirada'}",
+                       temporario=True)
+    erro = getattr(resultado.error, 'error', resultado.error)
+    tipo = getattr(erro, 'type', 'desconhecido')
+    return ErroAPI(f"{tipo}: {getattr(erro, 'message', '')}", temporario=tipo in ERROS_TEMPORARIOS)
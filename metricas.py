@@ -0,0 +1,316 @@
+"""
+Métricas de desempenho da análise de NFS-e
+Contadores e histogramas no formato texto do Prometheus (GET /metrics) e uma
+linha de log JSON por requisição com os tempos de cada etapa.
+
+As métricas são por processo: com vários workers do gunicorn, cada coleta
+mostra o worker que atendeu a requisição.
+"""
+
+import json
+import time
+import bisect
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Limites dos histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BUCKETS_BYTES = (1e3, 5e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+BUCKETS_TOKENS = (0, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Preço do token no cache de prompt em relação ao token de entrada comum
+PRECO_CACHE_LEITURA = 0.1
+PRECO_CACHE_GRAVACAO = 1.25
+
+
+def _rotulos_texto(nomes: Tuple[str, ...], valores: Tuple[str, ...], extra: str = '') -> str:
+    pares = [f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _escapar(valor: Any) -> str:
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Contador:
+    """Valor que só aumenta, por combinação de rótulos"""
+    tipo = 'counter'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, valor: float = 1, **rotulos):
+        chave = tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0) + valor
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            itens = sorted(self._valores.items())
+        return [f"{self.nome}{_rotulos_texto(self.rotulos, chave)} {_numero(valor)}" for chave, valor in itens]
+
+
+class Histograma:
+    """Distribuição de valores em buckets cumulativos, por combinação de rótulos"""
+    tipo = 'histogram'
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **rotulos):
+        chave = tuple(str(rotulos.get(nome, '')) for nome in self.rotulos)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                # [contagem por bucket (+Inf no fim), soma]
+                serie = self._series[chave] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def exportar(self) -> List[str]:
+        with self._lock:
+            itens = sorted((chave, (list(contagens), soma)) for chave, (contagens, soma) in self._series.items())
+        linhas = []
+        for chave, (contagens, soma) in itens:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (float('inf'),), contagens):
+                acumulado += contagem
+                le = '+Inf' if limite == float('inf') else _numero(limite)
+                rotulos = _rotulos_texto(self.rotulos, chave, 'le="%s"' % le)
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_rotulos_texto(self.rotulos, chave)} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{_rotulos_texto(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+class Registro:
+    """Conjunto de métricas do processo e coletores chamados a cada exportação"""
+
+    def __init__(self):
+        self._metricas: Dict[str, Any] = {}
+        self._coletores: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]] = []
+        self._lock = threading.Lock()
+
+    def contador(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Tuple[str, ...] = (),
+                   buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def _registrar(self, metrica):
+        with self._lock:
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def coletor(self, funcao: Callable):
+        """
+        Registra função chamada na exportação; devolve [(nome, tipo, ajuda, [(rótulos, valor)])]
+        Usado para valores que já são contados em outro lugar (ex: estatísticas do cache)
+        """
+        self._coletores.append(funcao)
+        return funcao
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus (text/plain; version=0.0.4)"""
+        linhas = []
+        with self._lock:
+            metricas = list(self._metricas.values())
+        for metrica in metricas:
+            linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            linhas.extend(metrica.exportar())
+        for coletor in self._coletores:
+            try:
+                familias = list(coletor())
+            except Exception as e:
+                print(f"Erro no coletor de métricas {coletor.__name__}: {e}")
+                continue
+            for nome, tipo, ajuda, amostras in familias:
+                linhas.append(f"# HELP {nome} {ajuda}")
+                linhas.append(f"# TYPE {nome} {tipo}")
+                for rotulos, valor in amostras:
+                    nomes = tuple(rotulos)
+                    linhas.append(f"{nome}{_rotulos_texto(nomes, tuple(rotulos[n] for n in nomes))} {_numero(valor)}")
+        return '\n'.join(linhas) + '\n'
+
+
+REGISTRO = Registro()
+
+# Métricas do pipeline
+ETAPA_DURACAO = REGISTRO.histograma(
+    'nf_etapa_duracao_segundos', 'Duração de cada etapa da análise', ('etapa',))
+PAYLOAD_BYTES = REGISTRO.histograma(
+    'nf_payload_bytes', 'Tamanho do conteúdo da nota enviado à API', ('estrategia',), BUCKETS_BYTES)
+API_REQUISICOES = REGISTRO.contador(
+    'nf_api_requisicoes_total', 'Chamadas à Claude API por resultado', ('resultado',))
+TOKENS = REGISTRO.contador(
+    'nf_api_tokens_total', 'Tokens informados em usage pela Claude API', ('tipo',))
+TOKENS_ECONOMIZADOS = REGISTRO.histograma(
+    'nf_api_tokens_economizados', 'Tokens de entrada economizados por chamada pelo cache de prompt '
+    '(equivalente a preço cheio; negativo quando a chamada grava o cache)', (), BUCKETS_TOKENS)
+EXTRACOES = REGISTRO.contador(
+    'nf_extracoes_total', 'Notas resolvidas por caminho (texto, cache, armazem, claude, erro)', ('caminho',))
+FALLBACKS = REGISTRO.contador(
+    'nf_fallback_total', 'Caminhos alternativos tomados no pipeline', ('tipo',))
+API_NOVAS_TENTATIVAS = REGISTRO.contador(
+    'nf_api_novas_tentativas_total', 'Novas tentativas de chamadas à API por status do erro', ('status',))
+AGENDADOR_ESPERA = REGISTRO.histograma(
+    'nf_agendador_espera_segundos', 'Espera na fila do agendador antes da chamada à API', ('prioridade',))
+LOTE_API_REQUISICOES = REGISTRO.contador(
+    'nf_lote_api_requisicoes_total', 'Requisições da Message Batches API por resultado (enviada, succeeded, errored...)',
+    ('resultado',))
+NOTAS_ARMAZENADAS = REGISTRO.contador(
+    'nf_notas_armazenadas_total', 'Notas gravadas no armazém: nova ou duplicada (já conhecida, de outro PDF)',
+    ('resultado',))
+RENDERIZACOES = REGISTRO.contador(
+    'nf_renderizacoes_total', 'Páginas renderizadas por motor e origem', ('motor', 'origem'))
+HTTP_REQUISICOES = REGISTRO.contador(
+    'nf_http_requisicoes_total', 'Requisições HTTP por rota e status', ('rota', 'metodo', 'status'))
+HTTP_DURACAO = REGISTRO.histograma(
+    'nf_http_duracao_segundos', 'Duração das requisições HTTP', ('rota',))
+
+# Campos da requisição atual (linha de log JSON); o dict é compartilhado pelas
+# threads que trabalham para a mesma requisição, por isso as somas usam _lock_contexto
+_contexto: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('nf_metricas', default=None)
+_lock_contexto = threading.Lock()
+
+
+def somar(campo: str, valor: float):
+    """Acumula valor no campo da requisição atual (ex: ms por etapa, tokens)"""
+    dados = _contexto.get()
+    if dados is not None:
+        with _lock_contexto:
+            dados[campo] = round(dados.get(campo, 0) + valor, 3)
+
+
+def anotar(campo: str, valor: Any):
+    """Grava valor no campo da requisição atual (o último vence)"""
+    dados = _contexto.get()
+    if dados is not None:
+        with _lock_contexto:
+            dados[campo] = valor
+
+
+@contextmanager
+def cronometrar(etapa: str):
+    """Observa a duração da etapa no histograma e soma '<etapa>_ms' no log da requisição"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_etapa(etapa, time.perf_counter() - inicio)
+
+
+def registrar_etapa(etapa: str, segundos: float):
+    ETAPA_DURACAO.observar(segundos, etapa=etapa)
+    somar(f"{etapa}_ms", segundos * 1000)
+
+
+def registrar_uso(response: Any):
+    """
+    Tokens de entrada/saída do usage da resposta e, com cache de prompt, os tokens lidos/gravados
+    no cache e a economia da chamada (leitura custa 10% da entrada, gravação 125%)
+    """
+    uso = getattr(response, 'usage', None)
+    if uso is None:
+        return
+    for tipo, atributo in (('entrada', 'input_tokens'), ('saida', 'output_tokens')):
+        valor = getattr(uso, atributo, None) or 0
+        TOKENS.inc(valor, tipo=tipo)
+        somar(f"tokens_{tipo}", valor)
+    
+    leitura = getattr(uso, 'cache_read_input_tokens', None) or 0
+    gravacao = getattr(uso, 'cache_creation_input_tokens', None) or 0
+    if not (leitura or gravacao):
+        return
+    for tipo, valor in (('cache_leitura', leitura), ('cache_gravacao', gravacao)):
+        if valor:
+            TOKENS.inc(valor, tipo=tipo)
+            somar(f"tokens_{tipo}", valor)
+    economia = round(leitura * (1 - PRECO_CACHE_LEITURA) - gravacao * (PRECO_CACHE_GRAVACAO - 1))
+    TOKENS_ECONOMIZADOS.observar(economia)
+    somar('tokens_economizados', economia)
+
+
+def registrar_payload(estrategia: str, bytes_payload: int):
+    PAYLOAD_BYTES.observar(bytes_payload, estrategia=estrategia)
+    somar('bytes_payload', bytes_payload)
+    anotar('estrategia_entrada', estrategia)
+
+
+def registrar_caminho(caminho: str):
+    """Como a nota foi resolvida: texto, cache, armazem, claude ou erro"""
+    EXTRACOES.inc(caminho=caminho)
+    somar(f"notas_{caminho}", 1)
+
+
+@contextmanager
+def medir_chamada_api():
+    """Latência e resultado (ok/erro) de uma chamada à Claude API"""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        API_REQUISICOES.inc(resultado='erro')
+        raise
+    else:
+        API_REQUISICOES.inc(resultado='ok')
+    finally:
+        registrar_etapa('api', time.perf_counter() - inicio)
+        somar('chamadas_api', 1)
+
+
+def iniciar_contexto(**campos) -> contextvars.Token:
+    """Abre o registro da requisição/job atual"""
+    return _contexto.set({**campos, '_inicio': time.perf_counter()})
+
+
+def finalizar_contexto(token: contextvars.Token, log: bool = True, **campos) -> Optional[Dict[str, Any]]:
+    """Fecha o registro, imprime a linha de log JSON (se log) e devolve os campos"""
+    dados = _contexto.get()
+    try:
+        _contexto.reset(token)
+    except ValueError:
+        # Token criado em outro contexto (ex: view assíncrona em outra thread)
+        _contexto.set(None)
+    if dados is None:
+        return None
+    with _lock_contexto:
+        registro = {k: v for k, v in dados.items() if not k.startswith('_')}
+    registro.update(campos)
+    registro['duracao_ms'] = round((time.perf_counter() - dados['_inicio']) * 1000, 1)
+    registro = {'ts': time.strftime('%Y-%m-%dT%H:%M:%S'), **registro}
+    if log:
+        print(json.dumps(registro, ensure_ascii=False, default=str), flush=True)
+    return registro
+
+
+def valores_contexto() -> List[Tuple[contextvars.ContextVar, Any]]:
+    """Variáveis de contexto atuais, para repassar a corrotinas em outro event loop"""
+    return list(contextvars.copy_context().items())
+
+
+async def com_contexto(corrotina, valores: List[Tuple[contextvars.ContextVar, Any]]):
+    """Executa a corrotina com as variáveis de contexto de quem a agendou"""
+    for variavel, valor in valores:
+        variavel.set(valor)
+    return await corrotina
@@ -0,0 +1,155 @@
+"""
+Relatórios tributários sobre o armazém de notas
+Totais (mensais, por padrão) de ISS e retenções (ISS, PIS, COFINS, CSLL, INSS, IRRF)
+por prestador, tomador ou município, e verificações de consistência dos valores extraídos.
+
+As somas rodam no próprio SQLite (GROUP BY sobre as colunas em centavos do armazém):
+exatas, sem trazer as notas para o Python, com memória proporcional ao número de
+grupos e não ao histórico. As verificações percorrem as notas sob demanda.
+
+Uso:
+    python -m analisador_claude_api relatorio retencoes --agrupar municipio --de 2024-01-01 --out iss.csv
+    python -m analisador_claude_api relatorio verificacoes --tolerancia 5
+"""
+
+import io
+import csv
+import json
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from armazem_notas import ArmazemNotas
+
+# Agrupamento -> (expressão do GROUP BY, colunas descritivas do grupo)
+AGRUPAMENTOS = {
+    'prestador': ('prestador_cnpj', ('prestador_cnpj', 'MAX(prestador) AS prestador')),
+    'tomador': ('tomador_cnpj', ('tomador_cnpj', 'MAX(tomador) AS tomador')),
+    'municipio': ('municipio COLLATE NOCASE', ('MAX(municipio) AS municipio', 'MAX(estado) AS estado')),
+}
+
+# Valores somados em cada grupo: nome no relatório -> coluna em centavos do armazém
+VALORES = {
+    'valor_total': 'valor_total_centavos',
+    'base_calculo': 'base_calculo_centavos',
+    'valor_iss': 'valor_iss_centavos',
+    'retencao_iss': 'retencao_iss_centavos',
+    'retencao_pis': 'retencao_pis_centavos',
+    'retencao_cofins': 'retencao_cofins_centavos',
+    'retencao_csll': 'retencao_csll_centavos',
+    'retencao_inss': 'retencao_inss_centavos',
+    'retencao_irrf': 'retencao_irrf_centavos',
+}
+RETENCOES = [nome for nome in VALORES if nome.startswith('retencao_')]
+_SOMA_RETENCOES = ' + '.join(f"COALESCE({VALORES[nome]}, 0)" for nome in RETENCOES)
+
+TOLERANCIA_CENTAVOS_PADRAO = 1
+
+# Verificação -> (descrição, valor esperado, valor encontrado), em centavos; a nota só entra
+# na verificação se os dois valores existirem
+VERIFICACOES = {
+    'iss_calculado': ("ISS diferente de base de cálculo × alíquota",
+                      "ROUND(base_calculo_centavos * aliquota_iss / 100)", "valor_iss_centavos"),
+    'retencao_iss': ("ISS retido maior que o ISS da nota",
+                     "valor_iss_centavos", "retencao_iss_centavos"),
+    'valor_liquido': ("Valor líquido diferente de valor total − retenções (pode ser desconto)",
+                      f"valor_total_centavos - ({_SOMA_RETENCOES})", "valor_liquido_centavos"),
+}
+
+
+def reais(centavos: Optional[int]) -> str:
+    """123456 -> '1234.56' (mesmo formato de nota_para_dict); None conta como zero"""
+    centavos = int(centavos or 0)
+    sinal = '-' if centavos < 0 else ''
+    inteiro, resto = divmod(abs(centavos), 100)
+    return f"{sinal}{inteiro}.{resto:02d}"
+
+
+def _com_condicao(onde: str, condicao: str) -> str:
+    return f"{onde} AND {condicao}" if onde else f"WHERE {condicao}"
+
+
+def _divergente(verificacao: str, tolerancia: int) -> str:
+    """Condição SQL da verificação (tolerância em centavos embutida: é sempre int)"""
+    _, esperado, encontrado = VERIFICACOES[verificacao]
+    if verificacao == 'retencao_iss':
+        return f"({encontrado} IS NOT NULL AND {esperado} IS NOT NULL AND {encontrado} > {esperado} + {tolerancia})"
+    return (f"({encontrado} IS NOT NULL AND {esperado} IS NOT NULL "
+            f"AND ABS(({esperado}) - {encontrado}) > {tolerancia})")
+
+
+def totais_retencoes(armazem: ArmazemNotas, agrupar: str = 'prestador', por_mes: bool = True,
+                     **filtros) -> Iterator[Dict[str, Any]]:
+    """
+    Uma linha por grupo (e mês de emissão, com por_mes): quantidade de notas, somas dos VALORES
+    e total_retencoes, em reais (texto com 2 casas)
+    filtros: os de ArmazemNotas.consultar (prestador_cnpj, municipio, data_inicio, data_fim...)
+    Levanta ValueError para agrupamento ou filtros inválidos
+    """
+    if agrupar not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento inválido: {agrupar} (use {', '.join(AGRUPAMENTOS)})")
+    chave, descricao = AGRUPAMENTOS[agrupar]
+    onde, parametros = armazem.filtros_sql(**filtros)
+    grupo = f"substr(data_emissao, 1, 7), {chave}" if por_mes else chave
+    colunas = [*(["substr(data_emissao, 1, 7) AS mes"] if por_mes else []), *descricao,
+               "COUNT(*) AS notas", f"SUM(({_SOMA_RETENCOES}) > 0) AS notas_com_retencao",
+               *(f"SUM({coluna}) AS {nome}" for nome, coluna in VALORES.items())]
+    sql = f"SELECT {', '.join(colunas)} FROM notas {onde} GROUP BY {grupo} ORDER BY {grupo}"
+
+    for linha in armazem.executar(sql, parametros):
+        registro = dict(linha)
+        registro['total_retencoes'] = reais(sum(registro[nome] or 0 for nome in RETENCOES))
+        for nome in VALORES:
+            registro[nome] = reais(registro[nome])
+        yield registro
+
+
+def resumo_verificacoes(armazem: ArmazemNotas, tolerancia: int = TOLERANCIA_CENTAVOS_PADRAO,
+                        **filtros) -> Dict[str, Any]:
+    """Notas examinadas e quantas divergem em cada verificação (uma consulta)"""
+    onde, parametros = armazem.filtros_sql(**filtros)
+    somas = ', '.join(f"SUM({_divergente(nome, int(tolerancia))}) AS {nome}" for nome in VERIFICACOES)
+    linha = next(armazem.executar(f"SELECT COUNT(*) AS notas, {somas} FROM notas {onde}", parametros))
+    return {'notas': linha['notas'], 'tolerancia_centavos': int(tolerancia),
+            'divergencias': {nome: linha[nome] or 0 for nome in VERIFICACOES}}
+
+
+def divergencias(armazem: ArmazemNotas, tolerancia: int = TOLERANCIA_CENTAVOS_PADRAO,
+                 verificacoes: Optional[Iterable[str]] = None, **filtros) -> Iterator[Dict[str, Any]]:
+    """
+    Notas que falham em alguma verificação (uma linha por nota e verificação), lidas sob demanda
+    tolerancia: diferença aceita, em centavos (arredondamento da prefeitura)
+    """
+    verificacoes = list(verificacoes or VERIFICACOES)
+    for nome in verificacoes:
+        if nome not in VERIFICACOES:
+            raise ValueError(f"Verificação inválida: {nome} (use {', '.join(VERIFICACOES)})")
+    onde, parametros = armazem.filtros_sql(**filtros)
+    for nome in verificacoes:
+        descricao, esperado, encontrado = VERIFICACOES[nome]
+        sql = (f"SELECT id, arquivo, numero, prestador_cnpj, prestador, data_emissao, "
+               f"({esperado}) AS esperado, {encontrado} AS encontrado FROM notas "
+               f"{_com_condicao(onde, _divergente(nome, int(tolerancia)))} ORDER BY data_emissao, id")
+        for linha in armazem.executar(sql, parametros):
+            registro = dict(linha)
+            registro['diferenca'] = reais(registro['encontrado'] - registro['esperado'])
+            registro['esperado'] = reais(registro['esperado'])
+            registro['encontrado'] = reais(registro['encontrado'])
+            yield {'verificacao': nome, 'descricao': descricao, **registro}
+
+
+def linhas_csv(registros: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """CSV em pedaços de texto (cabeçalho pelas chaves do primeiro registro), para gravar ou transmitir"""
+    buffer = io.StringIO()
+    escritor = None
+    for registro in registros:
+        if escritor is None:
+            escritor = csv.DictWriter(buffer, fieldnames=list(registro))
+            escritor.writeheader()
+        escritor.writerow(registro)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def linhas_jsonl(registros: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for registro in registros:
+        yield json.dumps(registro, ensure_ascii=False) + '\n'
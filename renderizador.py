@@ -0,0 +1,301 @@
+"""
+Renderização de páginas de PDF em imagem
+Roda em um pool de processos (fora do GIL dos workers web), usa pypdfium2 como
+renderizador principal e guarda as imagens geradas por hash do arquivo
+"""
+
+import io
+import os
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, Optional, Any, Union
+
+import metricas
+from documento_pdf import DocumentoPDF, EntradaPDF, usar_documento
+
+# Configuração padrão (pode ser sobrescrita pelo .env)
+RENDER_PROCESSOS_PADRAO = 2
+RENDER_CACHE_MB_PADRAO = 64
+
+# Formatos de saída:
+# - png: página colorida em PNG (usado pela estratégia imagem)
+# - compacta: tons de cinza, JPEG ou PNG posterizado, o que for menor (estratégia imagem_compacta)
+FORMATOS_RENDER = ('png', 'compacta')
+
+# PDFium (usado pelo pypdfium2 e pelo pdfplumber) não é thread-safe:
+# vale para a renderização dentro do próprio processo (NF_RENDER_PROCESSOS=0)
+_RENDER_LOCK = threading.Lock()
+
+
+@dataclass
+class PaginaRenderizada:
+    """Imagem de uma página, pronta para enviar à API"""
+    dados: bytes
+    media_type: str
+    pagina: int = 0
+    ms_renderizacao: float = 0.0  # tempo de renderização + codificação
+    do_cache: bool = False
+    motor: str = 'pypdfium2'  # 'pdfplumber' quando o pypdfium2 não abriu o arquivo
+
+
+def renderizar_pagina(pdf: Union[str, bytes], pagina: int = 0, dpi: int = 200,
+                      formato: str = 'png', qualidade: int = 70) -> PaginaRenderizada:
+    """
+    Renderiza uma página do PDF (caminho ou bytes)
+    Executada nos processos do pool; sem estado, para poder ser serializada
+    """
+    inicio = time.perf_counter()
+    pil_image, motor = _rasterizar(pdf, pagina, dpi, grayscale=(formato == 'compacta'))
+
+    if formato == 'compacta':
+        from PIL import ImageOps
+
+        pil_image = pil_image.convert('L')
+        jpeg_buffer = io.BytesIO()
+        pil_image.save(jpeg_buffer, format='JPEG', quality=qualidade, optimize=True)
+        # 16 níveis de cinza bastam para texto e comprimem bem melhor em PNG
+        # (PNG ganha em NFS-e digitais, JPEG em documentos escaneados)
+        png_buffer = io.BytesIO()
+        ImageOps.posterize(pil_image, 4).save(png_buffer, format='PNG')
+        if png_buffer.tell() < jpeg_buffer.tell():
+            dados, media_type = png_buffer.getvalue(), 'image/png'
+        else:
+            dados, media_type = jpeg_buffer.getvalue(), 'image/jpeg'
+    else:
+        buffer = io.BytesIO()
+        pil_image.save(buffer, format='PNG')
+        dados, media_type = buffer.getvalue(), 'image/png'
+
+    ms = (time.perf_counter() - inicio) * 1000
+    return PaginaRenderizada(dados=dados, media_type=media_type, pagina=pagina, ms_renderizacao=ms, motor=motor)
+
+
+def _rasterizar(pdf: Union[str, bytes], pagina: int, dpi: int, grayscale: bool):
+    """pypdfium2 direto; pdfplumber só se o pypdfium2 não abrir o arquivo. Retorna (imagem, motor)"""
+    try:
+        import pypdfium2 as pdfium
+
+        documento = pdfium.PdfDocument(pdf)
+        try:
+            bitmap = documento[pagina].render(scale=dpi / 72, grayscale=grayscale)
+            return bitmap.to_pil(), 'pypdfium2'
+        finally:
+            documento.close()
+    except Exception as e:
+        print(f"Erro ao renderizar com pypdfium2: {e}")
+        import pdfplumber
+
+        origem = io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+        with pdfplumber.open(origem) as documento:
+            return documento.pages[pagina].to_image(resolution=dpi).original, 'pdfplumber'
+
+
+def preparar_processo() -> int:
+    """Importa pypdfium2 e PIL (a primeira página renderizada não paga a importação); devolve o pid"""
+    import pypdfium2  # noqa: F401
+    from PIL import ImageOps  # noqa: F401
+    return os.getpid()
+
+
+def contar_paginas(pdf: Union[str, bytes, DocumentoPDF]) -> int:
+    """Número de páginas do PDF (caminho, bytes ou DocumentoPDF)"""
+    if isinstance(pdf, DocumentoPDF):
+        pdf = pdf.origem()
+    with _RENDER_LOCK:
+        try:
+            import pypdfium2 as pdfium
+
+            documento = pdfium.PdfDocument(pdf)
+            try:
+                return len(documento)
+            finally:
+                documento.close()
+        except Exception as e:
+            print(f"Erro ao contar páginas com pypdfium2: {e}")
+            import pdfplumber
+
+            origem = io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+            with pdfplumber.open(origem) as documento:
+                return len(documento.pages)
+
+
+class Renderizador:
+    """
+    Estágio de renderização compartilhado pelo processo
+    - processos > 0: renderiza em um ProcessPoolExecutor (spawn, seguro com threads do gunicorn)
+    - processos = 0: renderiza na thread chamadora, serializado por _RENDER_LOCK
+    Páginas já renderizadas ficam em um LRU em memória limitado por bytes
+    """
+
+    def __init__(self, processos: int = RENDER_PROCESSOS_PADRAO,
+                 max_cache_bytes: int = RENDER_CACHE_MB_PADRAO * 1024 * 1024):
+        self.processos = processos
+        self.max_cache_bytes = max_cache_bytes
+
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._cache: "OrderedDict[tuple, PaginaRenderizada]" = OrderedDict()
+        self._cache_bytes = 0
+        self._em_andamento: Dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+        # Contadores de uso
+        self.renderizacoes = 0
+        self.hits = 0
+        self.ms_total = 0.0
+        self.ms_maximo = 0.0
+
+    def _obter_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+            return self._pool
+
+    def _executar(self, *args) -> PaginaRenderizada:
+        if self.processos <= 0:
+            with _RENDER_LOCK:
+                return renderizar_pagina(*args)
+        try:
+            return self._obter_pool().submit(renderizar_pagina, *args).result()
+        except BrokenProcessPool:
+            # Processo do pool morreu (ex: OOM): recria o pool e tenta uma vez
+            with self._lock:
+                self._pool = None
+            return self._obter_pool().submit(renderizar_pagina, *args).result()
+
+    def renderizar(self, pdf: EntradaPDF, pagina: int = 0, dpi: int = 200,
+                   formato: str = 'png', qualidade: int = 70) -> PaginaRenderizada:
+        """
+        Imagem da página; reaproveita a renderização anterior do mesmo arquivo/parâmetros
+        pdf: caminho, bytes, objeto de arquivo ou DocumentoPDF (ver documento_pdf.abrir_documento)
+        """
+        if formato not in FORMATOS_RENDER:
+            raise ValueError(f"Formato de renderização inválido: {formato} (use {', '.join(FORMATOS_RENDER)})")
+
+        with usar_documento(pdf) as documento:
+            return self._renderizar(documento, pagina, dpi, formato, qualidade)
+
+    def _renderizar(self, documento: DocumentoPDF, pagina: int, dpi: int,
+                    formato: str, qualidade: int) -> PaginaRenderizada:
+        chave = (documento.sha256, pagina, dpi, formato, qualidade if formato == 'compacta' else None)
+        with self._lock:
+            resultado = self._cache.get(chave)
+            if resultado is not None:
+                self._cache.move_to_end(chave)
+                self.hits += 1
+                metricas.RENDERIZACOES.inc(motor=resultado.motor, origem='cache')
+                metricas.somar('paginas_do_cache', 1)
+                return PaginaRenderizada(resultado.dados, resultado.media_type, pagina,
+                                         resultado.ms_renderizacao, do_cache=True, motor=resultado.motor)
+            # Mesma página já sendo renderizada por outra thread: espera por ela
+            futuro = self._em_andamento.get(chave)
+            dono = futuro is None
+            if dono:
+                futuro = self._em_andamento[chave] = Future()
+
+        if not dono:
+            resultado = futuro.result()
+            with self._lock:
+                self.hits += 1
+            metricas.RENDERIZACOES.inc(motor=resultado.motor, origem='cache')
+            metricas.somar('paginas_do_cache', 1)
+            return PaginaRenderizada(resultado.dados, resultado.media_type, pagina,
+                                     resultado.ms_renderizacao, do_cache=True, motor=resultado.motor)
+
+        try:
+            # Caminho quando houver (o processo abre o arquivo); bytes vão serializados ao pool
+            resultado = self._executar(documento.origem(), pagina, dpi, formato, qualidade)
+        except Exception as e:
+            with self._lock:
+                del self._em_andamento[chave]
+            futuro.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._em_andamento[chave]
+            self.renderizacoes += 1
+            self.ms_total += resultado.ms_renderizacao
+            self.ms_maximo = max(self.ms_maximo, resultado.ms_renderizacao)
+            if len(resultado.dados) <= self.max_cache_bytes and chave not in self._cache:
+                self._cache[chave] = resultado
+                self._cache_bytes += len(resultado.dados)
+                while self._cache_bytes > self.max_cache_bytes:
+                    _, removida = self._cache.popitem(last=False)
+                    self._cache_bytes -= len(removida.dados)
+        futuro.set_result(resultado)
+
+        metricas.RENDERIZACOES.inc(motor=resultado.motor, origem='processo' if self.processos > 0 else 'thread')
+        metricas.anotar('motor_renderizacao', resultado.motor)
+        metricas.registrar_etapa('renderizacao', resultado.ms_renderizacao / 1000)
+        if resultado.motor != 'pypdfium2':
+            metricas.FALLBACKS.inc(tipo=f'renderizacao_{resultado.motor}')
+        return resultado
+
+    def aquecer(self) -> int:
+        """
+        Sobe os processos do pool já com as bibliotecas importadas; devolve quantos responderam
+        Chame depois do fork (post_fork do gunicorn): o pool não sobrevive ao fork
+        """
+        if self.processos <= 0:
+            preparar_processo()
+            return 0
+        pool = self._obter_pool()
+        # Tarefas enviadas juntas, antes de haver processo ocioso: cada uma sobe um processo
+        futuros = [pool.submit(preparar_processo) for _ in range(self.processos)]
+        return len({futuro.result() for futuro in futuros})
+
+    def estatisticas(self) -> Dict[str, Any]:
+        """Contadores de renderização e do cache de páginas"""
+        with self._lock:
+            total = self.renderizacoes + self.hits
+            return {
+                'processos': self.processos,
+                'renderizacoes': self.renderizacoes,
+                'hits_cache': self.hits,
+                'taxa_acerto': round(self.hits / total, 4) if total else 0.0,
+                'ms_medio_por_pagina': round(self.ms_total / self.renderizacoes, 1) if self.renderizacoes else 0.0,
+                'ms_maximo_por_pagina': round(self.ms_maximo, 1),
+                'paginas_em_cache': len(self._cache),
+                'bytes_em_cache': self._cache_bytes,
+            }
+
+    def limpar(self):
+        """Esvazia o cache de páginas"""
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    def encerrar(self):
+        """Encerra os processos do pool"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Instância compartilhada pelo processo
+_renderizador_padrao: Optional[Renderizador] = None
+_renderizador_padrao_lock = threading.Lock()
+
+
+def obter_renderizador() -> Renderizador:
+    """
+    Renderizador compartilhado pelo processo, configurado pelo ambiente:
+    NF_RENDER_PROCESSOS (0 renderiza na própria thread), NF_RENDER_CACHE_MB
+    O pool de processos só é criado na primeira renderização (após o fork do gunicorn)
+    """
+    global _renderizador_padrao
+    with _renderizador_padrao_lock:
+        if _renderizador_padrao is None:
+            _renderizador_padrao = Renderizador(
+                processos=int(os.getenv('NF_RENDER_PROCESSOS', RENDER_PROCESSOS_PADRAO)),
+                max_cache_bytes=int(os.getenv('NF_RENDER_CACHE_MB', RENDER_CACHE_MB_PADRAO)) * 1024 * 1024,
+            )
+        return _renderizador_padrao
@@ -14,9 +14,19 @@ const errorMessage = document.getElementById('errorMessage');
 const errorText = document.getElementById('errorText');
 const newAnalysisBtn = document.getElementById('newAnalysisBtn');
 const exportBtn = document.getElementById('exportBtn');
+const batchSection = document.getElementById('batchSection');
+const batchProgress = document.getElementById('batchProgress');
+const batchList = document.getElementById('batchList');
+const newBatchBtn = document.getElementById('newBatchBtn');
+const exportBatchBtn = document.getElementById('exportBatchBtn');
 
-// File variable
+// Tamanho máximo por PDF (NF_ARQUIVO_MAX_MB no servidor)
+const MAX_MB = Number(document.body.dataset.maxMb) || 16;
+
+// File variables
 let selectedFile = null;
+let selectedFiles = [];
+let batchResults = [];
 
 // Loading messages rotation
 const loadingMessages = [
@@ -44,6 +54,8 @@ removeBtn.addEventListener('click', removeFile);
 analyzeBtn.addEventListener('click', analyzeFile);
 newAnalysisBtn.addEventListener('click', resetInterface);
 exportBtn.addEventListener('click', exportResults);
+newBatchBtn.addEventListener('click', resetInterface);
+exportBatchBtn.addEventListener('click', exportBatchResults);
 
 // Drag and Drop
 uploadArea.addEventListener('dragover', (e) => {
@@ -61,7 +73,7 @@ uploadArea.addEventListener('drop', (e) => {
     
     const files = e.dataTransfer.files;
     if (files.length > 0) {
-        handleFile(files[0]);
+        handleFiles(files);
     }
 });
 
@@ -74,12 +86,41 @@ uploadArea.addEventListener('click', (e) => {
 
 // Functions
 function handleFileSelect(e) {
-    const file = e.target.files[0];
-    if (file) {
-        handleFile(file);
+    if (e.target.files.length > 0) {
+        handleFiles(e.target.files);
     }
 }
 
+function isZip(file) {
+    return file.name.toLowerCase().endsWith('.zip');
+}
+
+function handleFiles(files) {
+    files = Array.from(files);
+    
+    // Single PDF keeps the original flow
+    if (files.length === 1 && !isZip(files[0])) {
+        handleFile(files[0]);
+        return;
+    }
+    
+    // Validate file types (PDFs or ZIP archives)
+    if (files.some(file => !file.type.includes('pdf') && !isZip(file))) {
+        showError('Por favor, selecione apenas arquivos PDF ou ZIP');
+        return;
+    }
+    
+    // Validate file size (MAX_MB per PDF)
+    if (files.some(file => !isZip(file) && file.size > MAX_MB * 1024 * 1024)) {
+        showError(`Arquivo muito grande. Tamanho máximo: ${MAX_MB}MB por PDF`);
+        return;
+    }
+    
+    selectedFile = null;
+    selectedFiles = files;
+    displayFile({ name: files.length === 1 ? files[0].name : `${files.length} arquivos selecionados` });
+}
+
 function handleFile(file) {
     // Validate file type
     if (!file.type.includes('pdf')) {
@@ -87,13 +128,14 @@ function handleFile(file) {
         return;
     }
     
-    // Validate file size (16MB max)
-    if (file.size > 16 * 1024 * 1024) {
-        showError('Arquivo muito grande. Tamanho máximo: 16MB');
+    // Validate file size (MAX_MB)
+    if (file.size > MAX_MB * 1024 * 1024) {
+        showError(`Arquivo muito grande. Tamanho máximo: ${MAX_MB}MB`);
         return;
     }
     
     selectedFile = file;
+    selectedFiles = [];
     displayFile(file);
 }
 
@@ -112,6 +154,7 @@ function displayFile(file) {
 
 function removeFile() {
     selectedFile = null;
+    selectedFiles = [];
     fileInput.value = '';
     fileInfo.style.display = 'none';
     uploadArea.classList.remove('has-file');
@@ -156,6 +199,11 @@ function stopLoadingMessages() {
 }
 
 function analyzeFile() {
+    if (selectedFiles.length > 0) {
+        analyzeBatch();
+        return;
+    }
+    
     if (!selectedFile) {
         showError('Por favor, selecione um arquivo PDF');
         return;
@@ -172,18 +220,31 @@ function analyzeFile() {
     const formData = new FormData();
     formData.append('pdf', selectedFile);
     
-    // Send to server
-    fetch('/analyze', {
+    // Send to server: the job is queued and polled until it finishes
+    fetch('/jobs', {
         method: 'POST',
         body: formData
     })
     .then(response => response.json())
+    .then(data => {
+        if (!data.job_id) {
+            throw new Error(data.error || 'Erro ao enviar o arquivo');
+        }
+        return pollJob(data.url);
+    })
     .then(data => {
         stopLoadingMessages();
         loading.style.display = 'none';
         
         if (data.success) {
-            displayResults(data.data);
+            const nota = data.data;
+            if (data.total_notas > 1) {
+                nota.observacoes = [
+                    `PDF com ${data.total_notas} notas fiscais: exibindo a primeira (use a análise em lote para ver todas)`,
+                    ...(nota.observacoes || [])
+                ];
+            }
+            displayResults(nota);
         } else {
             showError(data.error || 'Erro ao analisar o arquivo');
         }
@@ -195,6 +256,137 @@ function analyzeFile() {
     });
 }
 
+function pollJob(url) {
+    // Resolves with the final job payload (concluido or erro)
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(url)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status === 'concluido' || data.status === 'erro' || data.success === false) {
+                        resolve(data);
+                    } else {
+                        setTimeout(check, 1500);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+
+function analyzeBatch() {
+    // Hide upload section and show batch progress
+    document.querySelector('.upload-section').style.display = 'none';
+    batchSection.style.display = 'block';
+    batchList.innerHTML = '';
+    batchResults = [];
+    
+    const formData = new FormData();
+    selectedFiles.forEach(file => formData.append('pdfs', file));
+    
+    let total = 0;
+    batchProgress.textContent = 'Enviando arquivos...';
+    
+    // Results arrive as NDJSON, one line per finished file
+    fetch('/analyze/batch', {
+        method: 'POST',
+        body: formData
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.json().then(data => {
+                throw new Error(data.error || 'Erro ao analisar os arquivos');
+            });
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const item = JSON.parse(line);
+            
+            if (item.indice === undefined) {
+                // Start / end events
+                total = item.total;
+                batchProgress.textContent = item.sucesso === undefined
+                    ? `0 de ${total} arquivos analisados...`
+                    : `Concluído: ${item.sucesso} de ${total} arquivos analisados com sucesso`;
+                return;
+            }
+            
+            batchResults.push(item);
+            appendBatchItem(item);
+            if (batchResults.length < total) {
+                batchProgress.textContent = `${batchResults.length} de ${total} arquivos analisados...`;
+            }
+        };
+        
+        const read = () => reader.read().then(({ done, value }) => {
+            if (done) {
+                handleLine(buffer);
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+            return read();
+        });
+        
+        return read();
+    })
+    .catch(error => {
+        batchSection.style.display = 'none';
+        showError('Erro de conexão: ' + error.message);
+    });
+}
+
+function notasDoItem(item) {
+    // A PDF may contain several notas; older responses only have 'data'
+    return item.notas || (item.data ? [item.data] : []);
+}
+
+function appendBatchItem(item) {
+    if (!item.success) {
+        appendBatchRow(item.arquivo, item.error, null);
+        return;
+    }
+    const notas = notasDoItem(item);
+    notas.forEach((nota, i) => {
+        const label = notas.length > 1 ? `${item.arquivo} (${i + 1}/${notas.length})` : item.arquivo;
+        appendBatchRow(label, `Nº ${nota.numero} · ${nota.prestador} · ${nota.valor_total}`, nota);
+    });
+}
+
+function appendBatchRow(labelText, valueText, nota) {
+    const row = document.createElement('div');
+    row.className = 'info-item batch-item' + (nota ? '' : ' batch-error');
+    
+    const label = document.createElement('span');
+    label.className = 'info-label';
+    label.textContent = labelText;
+    
+    const value = document.createElement('span');
+    value.className = 'info-value';
+    value.textContent = valueText;
+    
+    row.appendChild(label);
+    row.appendChild(value);
+    
+    // Click shows the full analysis of that nota
+    if (nota) {
+        row.addEventListener('click', () => {
+            batchSection.style.display = 'none';
+            displayResults(nota);
+        });
+    }
+    
+    batchList.appendChild(row);
+}
+
 function displayResults(data) {
     resultsSection.style.display = 'block';
     
@@ -306,6 +498,8 @@ function showError(message) {
 function resetInterface() {
     // Reset everything
     selectedFile = null;
+    selectedFiles = [];
+    batchResults = [];
     fileInput.value = '';
     removeFile();
     
@@ -315,6 +509,7 @@ function resetInterface() {
     // Hide other sections
     loading.style.display = 'none';
     resultsSection.style.display = 'none';
+    batchSection.style.display = 'none';
     errorMessage.style.display = 'none';
     
     // Clear observations
@@ -390,6 +585,34 @@ Análise gerada em: ${new Date().toLocaleString('pt-BR')}
     }, 2000);
 }
 
+function exportBatchResults() {
+    if (batchResults.length === 0) return;
+    
+    const escapeCsv = (value) => `"${String(value ?? '').replace(/"/g, '""')}"`;
+    const header = ['Arquivo', 'Número', 'Estado', 'Município', 'Data Emissão', 'Prestador', 'Tomador',
+                    'Valor Total', 'Tributado', 'Valor ISS', 'Alíquota ISS', 'Erro'];
+    const rows = batchResults
+        .sort((a, b) => a.indice - b.indice)
+        .flatMap(item => {
+            const notas = item.success ? notasDoItem(item) : [{}];
+            return notas.map(d => [item.arquivo, d.numero, d.estado, d.municipio, d.data_emissao, d.prestador,
+                                   d.tomador, d.valor_total, item.success ? (d.tributado ? 'Sim' : 'Não') : '',
+                                   d.valor_iss, d.aliquota_iss, item.error]);
+        });
+    const content = [header, ...rows].map(row => row.map(escapeCsv).join(';')).join('\n');
+    
+    // Create and download file (BOM for Excel)
+    const blob = new Blob(['\ufeff' + content], { type: 'text/csv;charset=utf-8' });
+    const url = URL.createObjectURL(blob);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = `analise_lote_${Date.now()}.csv`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
+    URL.revokeObjectURL(url);
+}
+
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', () => {
     // Page initialized
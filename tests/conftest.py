@@ -0,0 +1,27 @@
+"""
+Configuração comum dos testes
+Rodar da raiz do projeto:
+    python -m pytest -q
+
+A API nunca é chamada: os testes que passam pelo analisador usam benchmarks/cliente_falso.py.
+Cache, armazém e fila de jobs ficam em diretórios temporários.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RAIZ))
+
+_TEMPORARIO = tempfile.mkdtemp(prefix='nf_testes_')
+os.environ.update({
+    'ANTHROPIC_API_KEY': 'chave-falsa',
+    'NF_ANALISADOR': 'claude_api',
+    'NF_RENDER_PROCESSOS': '0',
+    'NF_AQUECER_NA_IMPORTACAO': '0',
+    'NF_CACHE_DIR': os.path.join(_TEMPORARIO, 'cache'),
+    'NF_ARMAZEM_DIR': os.path.join(_TEMPORARIO, 'armazem'),
+    'NF_JOBS_DIR': os.path.join(_TEMPORARIO, 'jobs'),
+})
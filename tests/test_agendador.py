@@ -0,0 +1,121 @@
+"""Agendador das chamadas à API: novas tentativas, prioridade e balde de fichas"""
+
+import time
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from agendador import (PRIORIDADE_LOTE, Agendador, BaldeFichas, ErroAPI, LimiteTaxaExcedido, estimar_tokens,
+                       prioridade)
+
+
+class ErroHTTP(Exception):
+    """Como os erros de status do SDK: status_code e a resposta com os cabeçalhos"""
+
+    def __init__(self, status, cabecalhos=None):
+        super().__init__(f"HTTP {status}")
+        self.status_code = status
+        self.response = SimpleNamespace(headers=cabecalhos or {})
+
+
+def falhar(*erros, resposta='ok'):
+    """chamada() que levanta os erros em ordem e depois devolve a resposta"""
+    pendentes = list(erros)
+    chamadas = []
+
+    def chamada():
+        chamadas.append(time.monotonic())
+        if pendentes:
+            raise pendentes.pop(0)
+        return resposta
+    return chamada, chamadas
+
+
+def test_erro_transitorio_tenta_de_novo_com_espera_crescente():
+    agendador = Agendador(rpm=0, tpm=0, tentativas=4, espera_base=0.02)
+    chamada, chamadas = falhar(ErroHTTP(500), ErroHTTP(503), ErroHTTP(502))
+    assert agendador.executar(chamada) == 'ok'
+    intervalos = [depois - antes for antes, depois in zip(chamadas, chamadas[1:])]
+    # Metade fixa da espera exponencial: 0.01, 0.02, 0.04
+    assert len(chamadas) == 4
+    assert all(intervalo >= minimo for intervalo, minimo in zip(intervalos, (0.01, 0.02, 0.04)))
+
+
+def test_retry_after_da_api_e_respeitado_e_pausa_o_processo():
+    agendador = Agendador(rpm=0, tpm=0, espera_base=5)
+    chamada, chamadas = falhar(ErroHTTP(429, {'retry-after-ms': '50'}))
+    assert agendador.executar(chamada) == 'ok'
+    assert 0.05 <= chamadas[1] - chamadas[0] < 1
+
+
+def test_erro_definitivo_nao_tenta_de_novo():
+    agendador = Agendador(rpm=0, tpm=0, espera_base=0.01)
+    chamada, chamadas = falhar(ErroHTTP(400))
+    with pytest.raises(ErroAPI) as erro:
+        agendador.executar(chamada)
+    assert len(chamadas) == 1
+    assert erro.value.status == 400 and not erro.value.temporario
+
+
+def test_limite_persistente_vira_limite_taxa_excedido():
+    agendador = Agendador(rpm=0, tpm=0, tentativas=2, espera_base=0.01)
+    chamada, chamadas = falhar(ErroHTTP(529), ErroHTTP(529))
+    with pytest.raises(LimiteTaxaExcedido) as erro:
+        agendador.executar(chamada)
+    assert len(chamadas) == 2
+    assert erro.value.temporario and erro.value.tentativas == 2
+
+
+def test_interativa_passa_a_frente_do_lote():
+    agendador = Agendador(rpm=0, tpm=0)
+    agendador._pausa_ate = time.monotonic() + 0.3
+    ordem = []
+
+    def chamar(nome, valor):
+        with prioridade(valor):
+            agendador.executar(lambda: ordem.append(nome))
+
+    lote = threading.Thread(target=chamar, args=('lote', PRIORIDADE_LOTE))
+    lote.start()
+    time.sleep(0.1)
+    interativa = threading.Thread(target=chamar, args=('interativa', 0))
+    interativa.start()
+    lote.join(5)
+    interativa.join(5)
+    assert ordem == ['interativa', 'lote']
+
+
+def test_balde_de_fichas():
+    balde = BaldeFichas(60)  # uma ficha por segundo
+    agora = balde._atualizado
+    assert balde.espera(60, agora) == 0
+    balde.consumir(60)
+    assert balde.espera(30, agora) == pytest.approx(30)
+    assert balde.espera(30, agora + 10) == pytest.approx(20)
+    # Pedido maior que o balde espera o balde cheio, não para sempre
+    assert balde.espera(600, agora + 10) == pytest.approx(50)
+    assert BaldeFichas(0).espera(10 ** 6, agora) == 0
+
+
+def test_tokens_acima_do_limite_esperam_a_janela():
+    agendador = Agendador(rpm=0, tpm=6000, espera_maxima=0.2)
+    agendador.executar(lambda: 'ok', custo=6000)
+    inicio = time.monotonic()
+    with pytest.raises(LimiteTaxaExcedido):
+        agendador.executar(lambda: 'ok', custo=3000)
+    assert time.monotonic() - inicio >= 0.2
+
+
+def test_usage_real_corrige_o_balde_de_tokens():
+    agendador = Agendador(rpm=0, tpm=10000)
+    resposta = SimpleNamespace(usage=SimpleNamespace(input_tokens=4000))
+    agendador.executar(lambda: resposta, custo=1000)
+    assert agendador.estatisticas()['tokens_disponiveis'] == pytest.approx(6000, abs=5)
+
+
+def test_estimar_tokens_conta_imagem_e_texto():
+    parametros = {'system': [{'type': 'text', 'text': 'x' * 400}],
+                  'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': 'y' * 80},
+                                                            {'type': 'image', 'source': {'data': 'z' * 10 ** 6}}]}]}
+    assert estimar_tokens(parametros) == 100 + 20 + 1600
@@ -0,0 +1,30 @@
+"""Contagem de tokens da API falsa (usada pelas métricas e pelo balde de tokens do agendador)"""
+
+import base64
+
+from benchmarks.api_falsa import TOKENS_POR_PAGINA, montar_mensagem, tokens_de_entrada
+from benchmarks.corpus import pdf_texto
+
+
+def pedido(bloco, cache=False):
+    sistema = [{'type': 'text', 'text': 'i' * 4000, **({'cache_control': {'type': 'ephemeral'}} if cache else {})}]
+    return {'system': sistema, 'messages': [{'role': 'user', 'content': [{'type': 'text', 'text': 'p' * 400}, bloco]}]}
+
+
+def test_imagem_conta_por_pagina_e_nao_pelo_base64():
+    imagem = {'type': 'image', 'source': {'type': 'base64', 'media_type': 'image/png', 'data': 'A' * 400_000}}
+    tokens = tokens_de_entrada(pedido(imagem))
+    assert TOKENS_POR_PAGINA + 100 < tokens < TOKENS_POR_PAGINA + 1200
+
+
+def test_pdf_conta_as_paginas():
+    dados = base64.b64encode(pdf_texto([['pagina'] for _ in range(3)])).decode()
+    documento = {'type': 'document', 'source': {'type': 'base64', 'media_type': 'application/pdf', 'data': dados}}
+    assert tokens_de_entrada(pedido(documento)) >= 3 * TOKENS_POR_PAGINA
+
+
+def test_prefixo_em_cache_fica_fora_de_input_tokens():
+    texto = {'type': 'text', 'text': ''}
+    uso = montar_mensagem(pedido(texto, cache=True), {'numero': '1'})['usage']
+    assert uso['input_tokens'] == 100
+    assert uso['cache_creation_input_tokens'] + uso['cache_read_input_tokens'] > 1000
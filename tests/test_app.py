@@ -0,0 +1,56 @@
+"""Rotas de análise do app Flask"""
+
+import io
+import dataclasses
+
+import pytest
+
+import analisadores
+import app
+from analisador_claude_api import NotaFiscal
+
+
+class AnalisadorLocal:
+    """Analisador sem versão assíncrona: guarda as opções de cada chamada"""
+
+    def __init__(self):
+        self.opcoes = []
+
+    def analisar_documento(self, pdf, **opcoes):
+        self.opcoes.append(opcoes)
+        return [NotaFiscal(numero='4550')]
+
+
+@pytest.fixture
+def analisador_local(monkeypatch):
+    analisador = AnalisadorLocal()
+    carregado = dataclasses.replace(analisadores.carregar(), obter_analisador=lambda: analisador,
+                                    obter_analisador_async=None, executar_async=None)
+    monkeypatch.setattr(analisadores, 'carregar', lambda: carregado)
+    return analisador
+
+
+def test_analyze_async_repassa_opcoes_ao_analisador_local(analisador_local):
+    resposta = app.app.test_client().post(
+        '/analyze/async',
+        data={'pdf': (io.BytesIO(b'%PDF-1.4 falso'), 'nota.pdf'), 'sem_cache': '1', 'modo': 'texto',
+              'estrategia': 'pdf'},
+        content_type='multipart/form-data',
+    )
+    assert resposta.status_code == 200, resposta.get_data(as_text=True)
+    assert resposta.get_json()['data']['numero'] == '4550'
+    assert analisador_local.opcoes == [{'usar_cache': False, 'modo': 'texto', 'estrategia': 'pdf'}]
+
+
+@pytest.mark.parametrize('rota', ['/analyze', '/analyze/async', '/jobs'])
+def test_arquivo_acima_do_limite_e_recusado_antes_de_ler_o_corpo(monkeypatch, rota):
+    monkeypatch.setattr(app, 'MAX_TAMANHO_ARQUIVO', 1024)
+    lidos = []
+    monkeypatch.setattr(app.RequisicaoUpload, '_get_file_stream', lambda *args, **kwargs: lidos.append(args))
+
+    resposta = app.app.test_client().post(
+        rota, data={'pdf': (io.BytesIO(b'%PDF-1.4' + b'0' * 4096), 'nota.pdf')}, content_type='multipart/form-data',
+    )
+    assert resposta.status_code == 413
+    assert 'Arquivo muito grande' in resposta.get_json()['error']
+    assert lidos == []
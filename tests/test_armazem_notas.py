@@ -0,0 +1,44 @@
+"""Armazém de notas: identidade da nota (chave_da_nota) e detecção de duplicatas"""
+
+from armazem_notas import ArmazemNotas, chave_da_nota
+
+
+def nota(numero='00004550', cnpj='12.345.678/0001-90', codigo='ab12-cd34', valor='1500.00'):
+    return {'numero': numero, 'prestador_cnpj': cnpj, 'codigo_verificacao': codigo,
+            'prestador': 'WEWORK SERVICOS DE ESCRITORIO LTDA', 'data_emissao': '05/08/2024',
+            'valor_total': valor, 'dados_tributarios': {}}
+
+
+def test_chave_ignora_pontuacao_e_zeros():
+    assert chave_da_nota('12.345.678/0001-90', '00004550', 'ab12-cd34') == '12345678000190|4550|AB12CD34'
+    assert chave_da_nota('12345678000190', '4550', 'AB12CD34') == chave_da_nota('12.345.678/0001-90', '4.550', 'ab12cd34')
+
+
+def test_sem_cnpj_ou_numero_nao_tem_chave():
+    assert chave_da_nota(None, '4550') is None
+    assert chave_da_nota('12.345.678/0001-90', 'DESCONHECIDO') is None
+
+
+def test_mesma_nota_em_outro_pdf_e_duplicada(tmp_path):
+    armazem = ArmazemNotas(tmp_path)
+    assert armazem.guardar('a' * 64, 'original.pdf', [nota()]) == {'novas': 1, 'duplicadas': 0}
+    assert armazem.guardar('b' * 64, 'baixado_de_novo.pdf', [nota(numero='4550', valor='1600.00')]) == \
+        {'novas': 0, 'duplicadas': 1}
+
+    assert armazem.estatisticas()['notas'] == 1
+    assert armazem.buscar_por_chave('12345678000190', '4550', 'AB12CD34')['valor_total'] == '1600.00'
+
+
+def test_reanalise_do_mesmo_pdf_nao_e_duplicada(tmp_path):
+    armazem = ArmazemNotas(tmp_path)
+    armazem.guardar('a' * 64, 'nota.pdf', [nota()])
+    assert armazem.guardar('a' * 64, 'nota.pdf', [nota()]) == {'novas': 0, 'duplicadas': 0}
+
+
+def test_nota_sem_chave_nao_registra_o_pdf(tmp_path):
+    armazem = ArmazemNotas(tmp_path)
+    armazem.guardar('c' * 64, 'incompleta.pdf', [nota(numero='DESCONHECIDO')])
+    armazem.guardar('c' * 64, 'incompleta.pdf', [nota(numero='DESCONHECIDO')])
+    assert armazem.notas_do_pdf('c' * 64) is None
+    assert armazem.estatisticas()['notas'] == 1
+
@@ -0,0 +1,88 @@
+"""Cache de resultados: LRU em memória, limite do disco por acesso e expiração por TTL"""
+
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import cache_resultados
+from analisador_claude_api import AnalisadorClaudeAPI
+from benchmarks.cliente_falso import ClienteFalso
+from benchmarks.corpus import dados_nota, pdf_escaneado, linhas_nota
+from cache_resultados import CacheResultados
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    """time.time() do cache controlado pelo teste"""
+    agora = SimpleNamespace(valor=1_000_000.0)
+    monkeypatch.setattr(cache_resultados, 'time', SimpleNamespace(time=lambda: agora.valor))
+    return agora
+
+
+def test_lru_em_memoria_descarta_a_menos_usada(tmp_path, relogio):
+    cache = CacheResultados(tmp_path, max_memoria=2)
+    for chave in ('a', 'b'):
+        cache.guardar(chave, {'chave': chave})
+    cache.obter('a')
+    cache.guardar('c', {'chave': 'c'})
+
+    assert list(cache._memoria) == ['a', 'c']
+    # Fora da memória, mas ainda no disco
+    assert cache.obter('b') == {'chave': 'b'}
+    assert cache.estatisticas()['hits_disco'] == 1
+
+
+def test_disco_remove_as_menos_acessadas(tmp_path, relogio):
+    cache = CacheResultados(tmp_path, max_entradas=2, max_memoria=0)
+    cache.guardar('a', {})
+    relogio.valor += 1
+    cache.guardar('b', {})
+    relogio.valor += 1
+    cache.obter('a')
+    relogio.valor += 1
+    cache.guardar('c', {})
+
+    assert cache.obter('b') is None
+    assert cache.obter('a') == {} and cache.obter('c') == {}
+    assert cache.estatisticas()['remocoes'] == 1
+
+
+def test_entrada_expira_pelo_ttl(tmp_path, relogio):
+    cache = CacheResultados(tmp_path, ttl=60)
+    cache.guardar('a', {'valor': 1})
+    relogio.valor += 60
+    assert cache.obter('a') == {'valor': 1}
+    relogio.valor += 1
+    assert cache.obter('a') is None
+
+    # Também no disco (outro processo, memória vazia)
+    assert CacheResultados(tmp_path, ttl=60).obter('a') is None
+
+
+def test_pdf_repetido_nao_chama_a_api(tmp_path):
+    dados = dados_nota(random.Random(2), 'escaneado')
+    pdf = pdf_escaneado(linhas_nota(dados, 'escaneado'))
+    cliente = ClienteFalso([dados])
+    analisador = AnalisadorClaudeAPI(client=cliente, cache=CacheResultados(tmp_path))
+
+    primeira = analisador.analisar(pdf)
+    segunda = analisador.analisar(pdf)
+    assert cliente.requisicoes == 1
+    assert segunda.numero == primeira.numero == dados['numero']
+
+    analisador.analisar(pdf, usar_cache=False)
+    assert cliente.requisicoes == 2
+
+
+def test_acerto_no_cache_nao_le_a_camada_de_texto(tmp_path, monkeypatch):
+    dados = dados_nota(random.Random(2), 'escaneado')
+    pdf = pdf_escaneado(linhas_nota(dados, 'escaneado'))
+    analisador = AnalisadorClaudeAPI(client=ClienteFalso([dados]), cache=CacheResultados(tmp_path), armazem=None)
+    analisador.analisar(pdf)
+
+    leituras = []
+    original = analisador.extrair_por_texto
+    monkeypatch.setattr(analisador, 'extrair_por_texto', lambda documento: leituras.append(1) or original(documento))
+    assert analisador.analisar(pdf).numero == dados['numero']
+    assert leituras == []
@@ -0,0 +1,41 @@
+"""Extração pela camada de texto (modo texto) com campos que o layout não encontrou"""
+
+import random
+
+from analisador_claude_api import AnalisadorClaudeAPI
+from benchmarks.cliente_falso import ClienteFalso
+from benchmarks.corpus import dados_nota, linhas_nota, pdf_texto
+from extrator_texto import extrair_campos
+
+# Rótulos que o layout de São Paulo procura para número e data de emissão
+SEM_NUMERO_E_DATA = ('Número da Nota', 'Data e Hora de Emissão')
+
+
+def texto_sem_numero_e_data():
+    dados = dados_nota(random.Random(1), 'sao_paulo')
+    linhas = linhas_nota(dados, 'sao_paulo')
+    for rotulo in SEM_NUMERO_E_DATA:
+        indice = linhas.index(rotulo)
+        del linhas[indice:indice + 2]
+    return linhas
+
+
+def test_campos_ausentes_ficam_none():
+    dados, confianca, layout = extrair_campos('\n'.join(texto_sem_numero_e_data()))
+    assert layout.nome == 'São Paulo'
+    assert dados['numero'] is None and dados['data_emissao'] is None
+    assert confianca < 85
+
+
+def test_modo_texto_usa_padroes_da_nota(tmp_path):
+    import app
+
+    pdf = tmp_path / 'nota.pdf'
+    pdf.write_bytes(pdf_texto([texto_sem_numero_e_data()]))
+    cliente = ClienteFalso()
+    nota = AnalisadorClaudeAPI(client=cliente).analisar(str(pdf), usar_cache=False, modo='texto')
+
+    assert cliente.requisicoes == 0
+    assert nota.numero == 'DESCONHECIDO' and nota.data_emissao == 'DESCONHECIDO'
+    assert nota.estado == 'SP'
+    assert app.montar_dados_nota(nota)['numero'] == 'DESCONHECIDO'
@@ -0,0 +1,143 @@
+"""Fila de jobs: retomada de jobs abandonados (worker morto no meio do processamento)"""
+
+import time
+import sqlite3
+
+from fila_jobs import CONCLUIDO, ERRO, PENDENTE, PROCESSANDO, FilaJobs
+
+
+def aguardar(fila, job_id, segundos=10):
+    limite = time.time() + segundos
+    while time.time() < limite:
+        job = fila.obter(job_id)
+        if job['status'] in (CONCLUIDO, ERRO):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} não terminou: {job}")
+
+
+def abandonar_job(diretorio):
+    """Enfileira um job e o reserva sem concluir, como um worker que morreu"""
+    fila = FilaJobs(lambda caminho, usar_cache: {}, diretorio=diretorio)
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    assert fila._reservar_proximo()['id'] == job_id
+    assert fila.obter(job_id)['status'] == PROCESSANDO
+    return job_id
+
+
+def test_job_abandonado_e_retomado(tmp_path):
+    job_id = abandonar_job(tmp_path)
+    processados = []
+
+    def processar(caminho, usar_cache):
+        processados.append(caminho)
+        return {'ok': True}
+
+    # Outro processo, com timeout 0: o job "processando" já passou do prazo
+    fila = FilaJobs(processar, diretorio=tmp_path, timeout=0)
+    fila.iniciar()
+    try:
+        job = aguardar(fila, job_id)
+    finally:
+        fila.parar()
+    assert job['status'] == CONCLUIDO and job['resultado'] == {'ok': True}
+    assert job['tentativas'] == 2
+    assert len(processados) == 1
+
+
+def test_job_em_andamento_nao_e_retomado_antes_do_timeout(tmp_path):
+    abandonar_job(tmp_path)
+    fila = FilaJobs(lambda caminho, usar_cache: {}, diretorio=tmp_path, timeout=600)
+    assert fila._reservar_proximo() is None
+
+
+def test_job_abandonado_demais_vira_erro(tmp_path):
+    job_id = abandonar_job(tmp_path)
+    fila = FilaJobs(lambda caminho, usar_cache: {'ok': True}, diretorio=tmp_path, timeout=0, max_tentativas=1)
+    fila.iniciar()
+    try:
+        job = aguardar(fila, job_id)
+    finally:
+        fila.parar()
+    assert job['status'] == ERRO
+    assert 'tentativas' in job['erro']
+
+
+
+class ErroTemporario(Exception):
+    """Como ErroAnalise com a API sobrecarregada (429/529)"""
+    temporario = True
+
+    def __init__(self, retry_after=None):
+        super().__init__('API sobrecarregada')
+        self.retry_after = retry_after
+
+
+def falhar(*erros):
+    pendentes = list(erros)
+
+    def processar(caminho, usar_cache):
+        if pendentes:
+            raise pendentes.pop(0)
+        return {'ok': True}
+    return processar
+
+
+def test_erro_temporario_volta_para_a_fila_apos_retry_after(tmp_path):
+    fila = FilaJobs(falhar(ErroTemporario(retry_after=60)), diretorio=tmp_path)
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    fila._executar(fila._reservar_proximo())
+
+    job = fila.obter(job_id)
+    assert job['status'] == PENDENTE and job['erro'] == 'API sobrecarregada'
+    # Ainda dentro do retry_after
+    assert fila._reservar_proximo() is None
+
+
+def test_erro_temporario_tenta_de_novo_ate_concluir(tmp_path):
+    fila = FilaJobs(falhar(ErroTemporario(), ErroTemporario()), diretorio=tmp_path, espera=0)
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    for _ in range(3):
+        fila._executar(fila._reservar_proximo())
+    job = fila.obter(job_id)
+    assert job['status'] == CONCLUIDO and job['tentativas'] == 3
+
+
+def test_erro_temporario_na_ultima_tentativa_vira_erro(tmp_path):
+    fila = FilaJobs(falhar(ErroTemporario(), ErroTemporario()), diretorio=tmp_path, espera=0, max_tentativas=2)
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    for _ in range(2):
+        fila._executar(fila._reservar_proximo())
+    assert fila.obter(job_id)['status'] == ERRO
+    assert fila._reservar_proximo() is None
+
+
+def test_erro_definitivo_nao_tenta_de_novo(tmp_path):
+    fila = FilaJobs(falhar(ValueError('PDF inválido')), diretorio=tmp_path, espera=0)
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    fila._executar(fila._reservar_proximo())
+    job = fila.obter(job_id)
+    assert job['status'] == ERRO and job['erro'] == 'PDF inválido' and job['tentativas'] == 1
+
+
+def test_trabalhador_sobrevive_a_erro_do_sqlite(tmp_path):
+    fila = FilaJobs(falhar(), diretorio=tmp_path, timeout=0)
+    finalizar = fila._finalizar
+    falhas = []
+
+    def finalizar_com_banco_travado(*args, **kwargs):
+        if not falhas:
+            falhas.append(1)
+            raise sqlite3.OperationalError('database is locked')
+        return finalizar(*args, **kwargs)
+
+    fila._finalizar = finalizar_com_banco_travado
+    job_id = fila.enfileirar('nota.pdf', b'%PDF-1.4 falso')
+    fila.trabalhadores = 1
+    fila.iniciar()
+    try:
+        job = aguardar(fila, job_id)
+        assert fila._threads[0].is_alive()
+    finally:
+        fila.parar()
+    assert falhas and job['status'] == CONCLUIDO
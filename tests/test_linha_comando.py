@@ -0,0 +1,46 @@
+"""Manifesto da análise de diretórios: o que conta como concluído na retomada"""
+
+import json
+import random
+
+from analisador_claude_api import AnalisadorClaudeAPI
+from benchmarks.cliente_falso import ClienteFalso
+from benchmarks.corpus import dados_nota, linhas_nota, pdf_texto
+from linha_comando import ProcessadorDiretorio
+
+
+def processar(diretorio, saida, modo='texto'):
+    analisador = AnalisadorClaudeAPI(client=ClienteFalso(), cache=None, armazem=None)
+    return ProcessadorDiretorio(analisador, workers=2, modo=modo, usar_cache=False).processar(diretorio, saida)
+
+
+def acervo(tmp_path):
+    diretorio = tmp_path / 'notas'
+    diretorio.mkdir()
+    dados = dados_nota(random.Random(3), 'sao_paulo')
+    (diretorio / 'legivel.pdf').write_bytes(pdf_texto([linhas_nota(dados, 'sao_paulo')]))
+    (diretorio / 'ilegivel.pdf').write_bytes(pdf_texto([['Documento sem layout conhecido', 'Valor 10,00']]))
+    return diretorio
+
+
+def test_arquivo_sem_nota_legivel_e_refeito(tmp_path):
+    diretorio, saida = acervo(tmp_path), tmp_path / 'notas.jsonl'
+
+    resumo = processar(diretorio, saida)
+    assert (resumo['arquivos'], resumo['vazios'], resumo['erros']) == (1, 1, 0)
+    entradas = [json.loads(linha) for linha in saida.with_name('notas.jsonl.manifesto.jsonl').read_text().splitlines()]
+    assert {entrada['arquivo']: entrada['status'] for entrada in entradas} == {
+        'legivel.pdf': 'ok', 'ilegivel.pdf': 'vazio'}
+    assert len(saida.read_text().splitlines()) == 1
+
+    resumo = processar(diretorio, saida)
+    assert (resumo['arquivos'], resumo['pulados'], resumo['vazios']) == (0, 1, 1)
+
+
+def test_outra_configuracao_refaz_os_concluidos(tmp_path):
+    diretorio, saida = acervo(tmp_path), tmp_path / 'notas.jsonl'
+    processar(diretorio, saida)
+
+    # legivel.pdf foi concluído no modo texto; no modo auto é analisado de novo (ilegivel.pdf vai à API)
+    resumo = processar(diretorio, saida, modo='auto')
+    assert resumo['pulados'] == 0 and resumo['arquivos'] == 2
@@ -0,0 +1,46 @@
+"""nota_de_resposta: campos null do esquema da ferramenta (ESQUEMA_NOTA)"""
+
+from analisador_claude_api import nota_de_resposta
+from armazem_notas import ArmazemNotas
+
+
+def resposta_com_nulos():
+    return {
+        'numero': None, 'data_emissao': None, 'municipio': None, 'estado': None,
+        'prestador': {'nome': None, 'cnpj': None},
+        'tomador': {'nome': None, 'cnpj': None},
+        'valor_total': None, 'valor_servicos': None,
+    }
+
+
+def test_nulos_viram_desconhecido():
+    nota = nota_de_resposta(resposta_com_nulos())
+    for campo in ('numero', 'data_emissao', 'municipio', 'estado', 'prestador', 'tomador'):
+        assert getattr(nota, campo) == 'DESCONHECIDO', campo
+
+
+def test_numero_inteiro_vira_texto():
+    assert nota_de_resposta({'numero': 1234}).numero == '1234'
+
+
+def test_dados_da_api_com_nulos():
+    import app
+
+    dados = app.montar_dados_nota(nota_de_resposta(resposta_com_nulos()))
+    assert dados['numero'] == 'DESCONHECIDO'
+
+
+def test_armazem_nao_indexa_desconhecido():
+    from analisador_claude_api import nota_para_dict
+    linha = ArmazemNotas._colunas(nota_para_dict(nota_de_resposta(resposta_com_nulos())))
+    assert linha['estado'] is None and linha['municipio'] is None
+
+
+def test_nota_fiscal_sem_dict_por_instancia():
+    import pickle
+    from analisador_claude_api import NotaFiscal, nota_de_dict, nota_para_dict
+
+    nota = nota_de_resposta({'numero': '10', 'estado': 'SP', 'impostos': {'iss': {'valor': 5}}})
+    assert not hasattr(nota, '__dict__') and not hasattr(nota.dados_tributarios, '__dict__')
+    assert NotaFiscal().paginas is not NotaFiscal().paginas
+    assert pickle.loads(pickle.dumps(nota)) == nota == nota_de_dict(nota_para_dict(nota))
@@ -0,0 +1,93 @@
+"""Documentos de várias páginas: agrupamento das páginas em notas e mescla dos dados parciais"""
+
+import random
+import asyncio
+
+from analisador_claude_api import AnalisadorClaudeAPI, AsyncAnalisadorClaudeAPI, agrupar_paginas, mesclar_dados
+from benchmarks.cliente_falso import ClienteFalso, ClienteFalsoAsync
+from benchmarks.corpus import dados_nota, linhas_nota, pdf_texto
+
+
+def pagina(indice, dados):
+    return {'pagina': indice, 'dados': dados}
+
+
+def paginas_dos_grupos(grupos):
+    return [[item['pagina'] for item in grupo] for grupo in grupos]
+
+
+def test_numero_novo_comeca_outra_nota():
+    grupos = agrupar_paginas([
+        pagina(0, {'numero': '00004550'}),
+        pagina(1, {'discriminacao': 'continuação'}),
+        pagina(2, {'numero': '4551'}),
+        pagina(3, {'numero': '4551', 'valor_total': 10}),
+    ])
+    assert paginas_dos_grupos(grupos) == [[0, 1], [2, 3]]
+
+
+def test_mesmo_numero_com_zeros_e_a_mesma_nota():
+    grupos = agrupar_paginas([pagina(0, {'numero': '00004550'}), pagina(1, {'numero': '4550'})])
+    assert paginas_dos_grupos(grupos) == [[0, 1]]
+
+
+def test_pagina_sem_dados_fica_sozinha():
+    grupos = agrupar_paginas([
+        pagina(0, {'numero': '10'}),
+        pagina(1, None),
+        pagina(2, {'discriminacao': 'continuação'}),
+        pagina(3, {}),
+    ])
+    assert paginas_dos_grupos(grupos) == [[0], [1], [2], [3]]
+
+
+def test_mesclar_dados():
+    mesclado = mesclar_dados([
+        {'numero': '10', 'valor_total': None, 'prestador': {'nome': 'BETA', 'cnpj': None},
+         'discriminacao': 'Consultoria'},
+        {'numero': None, 'valor_total': 1500.0, 'prestador': {'nome': 'OUTRO', 'cnpj': '23.456.789/0001-01'},
+         'discriminacao': 'Suporte'},
+    ])
+    assert mesclado['numero'] == '10'
+    assert mesclado['valor_total'] == 1500.0
+    assert mesclado['prestador'] == {'nome': 'BETA', 'cnpj': '23.456.789/0001-01'}
+    assert mesclado['discriminacao'] == 'Consultoria\nSuporte'
+
+
+def test_layout_desconhecido_nao_e_mesclado_na_nota_anterior(tmp_path):
+    rng = random.Random(3)
+    paginas = [linhas_nota(dados_nota(rng, tipo), tipo) for tipo in ('sao_paulo', 'desconhecido', 'sao_paulo')]
+    pdf = tmp_path / 'tres_notas.pdf'
+    pdf.write_bytes(pdf_texto(paginas))
+
+    cliente = ClienteFalso()
+    notas = AnalisadorClaudeAPI(client=cliente).analisar_documento(str(pdf), usar_cache=False, modo='texto')
+
+    assert cliente.requisicoes == 0
+    assert [nota.paginas for nota in notas] == [[1], [2], [3]]
+    assert notas[1].confianca_extracao == 0.0
+    assert notas[0].confianca_extracao > 0 and notas[2].confianca_extracao > 0
+
+
+def pdf_de_duas_notas(tmp_path):
+    rng = random.Random(5)
+    notas = [dados_nota(rng, 'sao_paulo') for _ in range(2)]
+    pdf = tmp_path / 'duas_notas.pdf'
+    pdf.write_bytes(pdf_texto([linhas_nota(nota, 'sao_paulo') for nota in notas]))
+    return pdf, notas
+
+
+def test_estrategia_pdf_usa_paginas_do_modelo(tmp_path):
+    pdf, notas = pdf_de_duas_notas(tmp_path)
+    resposta = [{**notas[0], 'paginas': [1]}, {**notas[1], 'paginas': [2, 7]}]
+    analisador = AnalisadorClaudeAPI(client=ClienteFalso([resposta]))
+
+    lidas = analisador.analisar_documento(str(pdf), usar_cache=False, modo='claude', estrategia='pdf')
+    assert [nota.paginas for nota in lidas] == [[1], [2]]
+
+
+def test_estrategia_pdf_sem_paginas_do_modelo_usa_as_enviadas(tmp_path):
+    pdf, notas = pdf_de_duas_notas(tmp_path)
+    analisador = AsyncAnalisadorClaudeAPI(client=ClienteFalsoAsync([notas]))
+    lidas = asyncio.run(analisador.analisar_documento(str(pdf), usar_cache=False, modo='claude', estrategia='pdf'))
+    assert [nota.paginas for nota in lidas] == [[1, 2], [1, 2]]
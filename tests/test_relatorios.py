@@ -0,0 +1,87 @@
+"""Relatórios de retenções: totais por GROUP BY e verificações com tolerância"""
+
+import pytest
+
+import relatorios
+from armazem_notas import ArmazemNotas
+
+
+def nota(numero, cnpj, data, valor_total, base=None, aliquota=None, iss=None, iss_retido=None, liquido=None,
+         **retencoes):
+    return {'numero': numero, 'prestador_cnpj': cnpj, 'prestador': f"PRESTADOR {cnpj[:2]}",
+            'municipio': 'São Paulo', 'estado': 'SP', 'data_emissao': data, 'valor_total': valor_total,
+            'valor_liquido': liquido,
+            'dados_tributarios': {'base_calculo': base, 'aliquota_iss': aliquota, 'valor_iss': iss,
+                                  'retencao_iss': iss_retido,
+                                  **{f"retencao_{nome}": valor for nome, valor in retencoes.items()}}}
+
+
+@pytest.fixture
+def armazem(tmp_path):
+    armazem = ArmazemNotas(tmp_path)
+    armazem.guardar('a' * 64, 'agosto.pdf', [
+        nota('1', '12.345.678/0001-90', '05/08/2024', '1000.00', irrf='15.00', pis='6.50'),
+        nota('2', '12.345.678/0001-90', '20/08/2024', '0.10', irrf='0.01', pis='0.02'),
+        nota('3', '23.456.789/0001-01', '10/08/2024', '500.00'),
+    ])
+    armazem.guardar('b' * 64, 'setembro.pdf', [
+        nota('4', '12.345.678/0001-90', '02/09/2024', '200.00', iss='10.00', iss_retido='10.00'),
+    ])
+    return armazem
+
+
+def test_totais_por_mes_e_prestador(armazem):
+    linhas = {(linha['mes'], linha['prestador_cnpj']): linha for linha in relatorios.totais_retencoes(armazem)}
+    assert list(linhas) == [('2024-08', '12345678000190'), ('2024-08', '23456789000101'),
+                            ('2024-09', '12345678000190')]
+
+    agosto = linhas[('2024-08', '12345678000190')]
+    assert agosto['notas'] == 2 and agosto['notas_com_retencao'] == 2
+    # Somas em centavos: 0.01 + 0.02 não vira 0.030000000000000002
+    assert agosto['valor_total'] == '1000.10'
+    assert agosto['retencao_irrf'] == '15.01' and agosto['retencao_pis'] == '6.52'
+    assert agosto['total_retencoes'] == '21.53'
+    assert linhas[('2024-08', '23456789000101')]['notas_com_retencao'] == 0
+    assert linhas[('2024-09', '12345678000190')]['retencao_iss'] == '10.00'
+
+
+def test_totais_sem_mes_com_filtro(armazem):
+    linhas = list(relatorios.totais_retencoes(armazem, por_mes=False, prestador_cnpj='12.345.678/0001-90'))
+    assert len(linhas) == 1
+    assert linhas[0]['notas'] == 3 and linhas[0]['total_retencoes'] == '31.53'
+
+
+def test_agrupamento_invalido(armazem):
+    with pytest.raises(ValueError):
+        list(relatorios.totais_retencoes(armazem, agrupar='cidade'))
+
+
+@pytest.mark.parametrize('iss, tolerancia, divergente', [
+    ('50.00', 1, False),
+    ('50.01', 1, False),   # arredondamento da prefeitura, dentro da tolerância
+    ('50.02', 1, True),
+    ('50.02', 2, False),
+])
+def test_iss_calculado_com_tolerancia(tmp_path, iss, tolerancia, divergente):
+    armazem = ArmazemNotas(tmp_path)
+    armazem.guardar('c' * 64, 'nota.pdf', [nota('9', '12.345.678/0001-90', '01/10/2024', '1000.00',
+                                                base='1000.00', aliquota='5.0', iss=iss)])
+    resumo = relatorios.resumo_verificacoes(armazem, tolerancia=tolerancia)
+    assert resumo['divergencias']['iss_calculado'] == int(divergente)
+
+    encontradas = list(relatorios.divergencias(armazem, tolerancia=tolerancia, verificacoes=['iss_calculado']))
+    assert len(encontradas) == int(divergente)
+    if divergente:
+        assert encontradas[0]['esperado'] == '50.00' and encontradas[0]['encontrado'] == iss
+
+
+def test_verificacoes_ignoram_valores_ausentes(tmp_path):
+    armazem = ArmazemNotas(tmp_path)
+    armazem.guardar('d' * 64, 'nota.pdf', [
+        nota('1', '12.345.678/0001-90', '01/10/2024', '1000.00', iss='50.00'),
+        nota('2', '12.345.678/0001-90', '01/10/2024', '1000.00', iss='10.00', iss_retido='50.00'),
+        nota('3', '12.345.678/0001-90', '01/10/2024', '1000.00', liquido='980.00', irrf='15.00'),
+    ])
+    resumo = relatorios.resumo_verificacoes(armazem)
+    assert resumo['notas'] == 3
+    assert resumo['divergencias'] == {'iss_calculado': 0, 'retencao_iss': 1, 'valor_liquido': 1}